@@ -4,6 +4,9 @@ from dotenv import load_dotenv
 import google.generativeai as genai
 import os
 import uvicorn
+from typing import Optional
+from chat_sessions import ChatSession, SessionManager
+from gemini_client import ChatService, GeminiOverloaded, GeminiTimeout, client_from_env
 
 # Load environment variables from .env file
 load_dotenv()
@@ -11,12 +14,16 @@ load_dotenv()
 # Configure the Generative AI with the API key
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-# Load Gemini Pro model and initialize a chat session
-model = genai.GenerativeModel("gemini-pro")
-chat = model.start_chat(history=[])
+# Async Gemini Pro client (bounded concurrency and queue, per-call timeout)
+llm = client_from_env("gemini-pro")
 
-# FastAPI app initialization
+# One chat history per session id, bounded by a token budget; idle sessions expire after 30 minutes
+sessions = SessionManager(max_sessions=1000, idle_ttl=1800, token_budget=3000)
+
+# FastAPI app initialization; the model status and session endpoints come from the shared router
 app = FastAPI()
+chat = ChatService(llm, sessions)
+app.include_router(chat.router)
 
 # Request models
 class BasicInfoRequest(BaseModel):
@@ -29,35 +36,35 @@ class QuestionAnswersRequest(BaseModel):
     symptoms: str
     age: int
     answers: list[str]
+    session_id: Optional[str] = None  # From /api/submit_basic_info; omit to start a new session
 
 # Function to send query to the Gemini model and retrieve a response
-def get_gemini_response(question: str) -> str:
+async def get_gemini_response(question: str, session: ChatSession) -> str:
     """
-    Sends a query to the Gemini API and retrieves the response text.
+    Sends a query to the Gemini API in the given chat session and retrieves the response text.
+    Overload and timeout errors are raised so the endpoint can answer 503/504.
     """
     try:
         # Send the question to the chat session
-        response = chat.send_message(question, stream=False)
-        
-        # Log the entire response for debugging
-        print(f"Full response from Gemini model: {response}")
-
-        # Ensure the response contains valid candidates and a proper structure
-        if response and hasattr(response, 'candidates') and len(response.candidates) > 0:
-            candidate = response.candidates[0]  # Access the first candidate
-            
-            # Check if the candidate content is valid
-            if hasattr(candidate, 'content') and isinstance(candidate.content, str):
-                return candidate.content  # Return the valid content
-            else:
-                raise ValueError(f"Invalid response structure: Missing or malformed content. Response: {response}")
-        else:
-            raise ValueError(f"No valid response received from the model. Response: {response}")
+        return await sessions.send_async(session, question, llm.generate)
+    except (GeminiOverloaded, GeminiTimeout):
+        raise
     except Exception as e:
         # Log the error and return a detailed error message
         print(f"Error in get_gemini_response: {e}")
         return f"An error occurred while processing your query: {e}"
 
+# Function to construct the personalized diagnosis prompt
+def build_diagnosis_prompt(info: QuestionAnswersRequest) -> str:
+    return (
+        f"Patient Details:\n"
+        f"Name: {info.name}\n"
+        f"Age: {info.age}\n"
+        f"Symptoms: {info.symptoms}\n"
+        f"Additional Questions and Answers: {info.answers}\n\n"
+        "Based on the above information, provide a medically accurate diagnosis "
+        "and suggest specific treatment options. Ensure the response is tailored to the details provided."
+    )
 
 # API endpoint for basic information
 @app.post("/api/submit_basic_info")
@@ -68,7 +75,7 @@ async def submit_basic_info(info: BasicInfoRequest):
     if not info.name or not info.symptoms or info.age <= 0:
         raise HTTPException(status_code=400, detail="Please provide valid name, symptoms, and age.")
 
-    return {"message": "Basic information submitted successfully."}
+    return {"message": "Basic information submitted successfully.", "session_id": sessions.get().session_id}
 
 # API endpoint for answering additional questions and generating the response
 @app.post("/api/get_diagnosis")
@@ -80,23 +87,30 @@ async def get_diagnosis(info: QuestionAnswersRequest):
         raise HTTPException(status_code=400, detail="Please provide valid information and answers to all questions.")
 
     # Construct personalized prompt for Gemini AI
-    personalized_prompt = (
-        f"Patient Details:\n"
-        f"Name: {info.name}\n"
-        f"Age: {info.age}\n"
-        f"Symptoms: {info.symptoms}\n"
-        f"Additional Questions and Answers: {info.answers}\n\n"
-        "Based on the above information, provide a medically accurate diagnosis "
-        "and suggest specific treatment options. Ensure the response is tailored to the details provided."
-    )
+    personalized_prompt = build_diagnosis_prompt(info)
 
     # Get AI response
-    response = get_gemini_response(personalized_prompt)
+    session = sessions.get(info.session_id)  # A new session if the id is unknown or expired
+    response = await chat.answer_or_http_error(get_gemini_response(personalized_prompt, session))
 
     if not response:
         raise HTTPException(status_code=500, detail="Failed to retrieve a response. Please try again.")
 
-    return {"diagnosis_and_treatment": response}
+    return {"diagnosis_and_treatment": response, "session_id": session.session_id}
+
+# Streaming variant of /api/get_diagnosis
+@app.post("/api/get_diagnosis/stream")
+async def get_diagnosis_stream(info: QuestionAnswersRequest):
+    """
+    Same input as /api/get_diagnosis; the diagnosis arrives as server-sent
+    events while it is generated ("session", then "message" events carrying
+    {"text": ...}, then "done" or "error").
+    """
+    if not info.name or not info.symptoms or info.age <= 0 or not info.answers:
+        raise HTTPException(status_code=400, detail="Please provide valid information and answers to all questions.")
+
+    session = sessions.get(info.session_id)  # A new session if the id is unknown or expired
+    return chat.event_stream_response(session, build_diagnosis_prompt(info), llm.generate_stream)
 
 # Run the FastAPI app
 if __name__ == "__main__":
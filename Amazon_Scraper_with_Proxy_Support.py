@@ -1,15 +1,20 @@
 import os
 import time
 import random
-import csv
+import argparse
+import threading
+from urllib.parse import urlsplit
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.proxy import Proxy, ProxyType
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from selectolax.parser import HTMLParser
 from tabulate import tabulate
+from proxy_pool import ProxyPool, benchmark_proxy_pool, looks_banned, parse_proxy
+from output_sinks import open_sink
 
 # User-agent list to mimic different browsers
 USER_AGENTS = [
@@ -18,107 +23,280 @@ USER_AGENTS = [
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
 ]
 
-def initialize_driver(proxy_ip, proxy_port):
-  """Initialize Selenium WebDriver with proxy."""
+# Selectors for one search result card and its fields
+CARD_SELECTOR = ".s-main-slot .s-result-item"
+FIELD_SELECTORS = {
+  "Title": "h2.a-size-base-plus span",
+  "Price": "span.a-price-whole",
+  "Buyers": "span.s-underline-text",  # Buyers Count (Assuming this element exists on the website)
+}
+IMAGE_SELECTOR = "img.s-image"
+
+# Runs in the browser and returns every card's fields in a single WebDriver round-trip
+EXTRACT_CARDS_SCRIPT = """
+const fields = arguments[0];
+return Array.from(document.querySelectorAll(arguments[1])).map(card => {
+  const data = {};
+  for (const [name, selector] of Object.entries(fields)) {
+    const el = card.querySelector(selector);
+    data[name] = el ? el.innerText.trim() : null;
+  }
+  const img = card.querySelector(arguments[2]);
+  data["Image URL"] = img ? img.getAttribute("src") : null;
+  return data;
+});
+"""
+
+class DomainRateLimiter:
+  """Spaces out requests to the same domain by a random delay between min_delay and max_delay seconds."""
+
+  def __init__(self, min_delay=3.0, max_delay=10.0):
+    self.min_delay = min_delay
+    self.max_delay = max_delay
+    self.next_allowed = {}
+    self.lock = threading.Lock()
+
+  def wait(self, url):
+    domain = urlsplit(url).hostname
+    with self.lock:
+      now = time.monotonic()
+      start = max(now, self.next_allowed.get(domain, now))
+      self.next_allowed[domain] = start + random.uniform(self.min_delay, self.max_delay)
+    if start > now:
+      time.sleep(start - now)
+
+def parse_cards_from_source(page_source):
+  """Parse every product card out of the page HTML in-process."""
+  products = []
+  for card in HTMLParser(page_source).css(CARD_SELECTOR):
+    product_data = {}
+    for name, selector in FIELD_SELECTORS.items():
+      node = card.css_first(selector)
+      product_data[name] = node.text(strip=True) if node else 'N/A'
+    image = card.css_first(IMAGE_SELECTOR)
+    product_data['Image URL'] = (image.attributes.get("src") if image else None) or 'N/A'
+    products.append(product_data)
+  return products
+
+def parse_cards_with_script(driver):
+  """Collect every product card with one execute_script call."""
+  cards = driver.execute_script(EXTRACT_CARDS_SCRIPT, FIELD_SELECTORS, CARD_SELECTOR, IMAGE_SELECTOR) or []
+  return [{name: value if value is not None else 'N/A' for name, value in card.items()} for card in cards]
+
+def parse_cards_with_elements(driver):
+  """Read each card field with its own find_element call (about five WebDriver round-trips per card)."""
+  products = []
+  for card in driver.find_elements(By.CSS_SELECTOR, CARD_SELECTOR):
+    product_data = {}
+    for name, selector in FIELD_SELECTORS.items():
+      try:
+        product_data[name] = card.find_element(By.CSS_SELECTOR, selector).text.strip()
+      except Exception:
+        product_data[name] = 'N/A'
+    try:
+      product_data['Image URL'] = card.find_element(By.CSS_SELECTOR, IMAGE_SELECTOR).get_attribute("src")
+    except Exception:
+      product_data['Image URL'] = 'N/A'
+    products.append(product_data)
+  return products
+
+CARD_PARSERS = {
+  "source": lambda driver: parse_cards_from_source(driver.page_source),
+  "script": parse_cards_with_script,
+  "elements": parse_cards_with_elements,
+}
+
+def initialize_driver(proxy_ip=None, proxy_port=None):
+  """Initialize Selenium WebDriver with proxy (direct connection when no proxy is given)."""
   options = webdriver.ChromeOptions()
   options.add_argument(f"user-agent={random.choice(USER_AGENTS)}")
   options.add_argument("--headless")  # Optional: Enable headless mode
 
   # Set proxy configuration
-  proxy = Proxy(
-      proxy_type=ProxyType.HTTP,
-      http_proxy=f"{proxy_ip}:{proxy_port}"
-  )
-  options.add_argument(proxy.add_to_launcher())
+  if proxy_ip:
+    options.add_argument(f"--proxy-server=http://{proxy_ip}:{proxy_port}")
 
   driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
   return driver
 
-def scrape_amazon_category(url, max_pages=2, proxy_ip=None, proxy_port=None):
-  """Scrape product details from an Amazon category using Selenium with proxy."""
+def quit_driver(driver):
+  try:
+    driver.quit()
+  except Exception as e:
+    print(f"Error quitting driver: {e}")
+
+def start_driver(proxy_pool, exclude=()):
+  """Start a driver behind a proxy picked from the pool; returns (driver, proxy)."""
+  if proxy_pool is None:
+    return initialize_driver(), None
+  proxy = proxy_pool.acquire(exclude=exclude)
+  print(f"Using proxy {proxy.address}")
+  return initialize_driver(proxy.host, proxy.port), proxy
+
+def report_proxy(proxy_pool, proxy, ok, latency, banned=False):
+  if proxy_pool and proxy:
+    proxy_pool.report(proxy, ok=ok, latency=latency, banned=banned)
+
+PRODUCT_FIELDS = ["Title", "Price", "Buyers", "Image URL"]
+
+def iter_category_pages(url, max_pages=2, proxy_ip=None, proxy_port=None, proxy_pool=None, rotate="worker", max_attempts=3,
+                        extraction="source", rate_limiter=None, skip=()):
+  """
+  Scrape an Amazon category using Selenium with proxy, yielding
+  (page_url, products) as each page finishes. Pages whose URL is in skip
+  are not loaded.
+
+  Proxies come from proxy_pool (or the single proxy_ip:proxy_port). With
+  rotate="page" every page gets a fresh proxy; with rotate="worker" the
+  driver keeps its proxy until a page fails. A failed or blocked page is
+  retried up to max_attempts times, each time behind a different proxy.
+
+  Cards are read with one WebDriver call per page: extraction="source"
+  parses page_source with selectolax, "script" runs one execute_script.
+  "elements" keeps the old per-field find_element calls. Page loads are
+  paced per domain by rate_limiter.
+  """
+  if proxy_pool is None and proxy_ip:
+    proxy_pool = ProxyPool([(proxy_ip, proxy_port)], base_quarantine=0)
+  rate_limiter = rate_limiter or DomainRateLimiter()
+  parse_cards = CARD_PARSERS[extraction]
   driver = None
+  proxy = None
   try:
-    driver = initialize_driver(proxy_ip, proxy_port)
-    products = []
     for page in range(1, max_pages + 1):
+      page_url = f"{url}&page={page}"
+      if page_url in skip:
+        print(f"\nSkipping page {page} (already scraped).")
+        continue
       print(f"\nScraping page {page}...")
-      try:
-        driver.get(f"{url}&page={page}")
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".s-main-slot .s-result-item"))
-        )
-        product_cards = driver.find_elements(By.CSS_SELECTOR, ".s-main-slot .s-result-item")
-        print(f"Found {len(product_cards)} products on page {page}.")
-
-        for card in product_cards:
-          product_data = {}
-          # Title
-          try:
-            product_data['Title'] = card.find_element(By.CSS_SELECTOR, "h2.a-size-base-plus span").text.strip()
-          except Exception:
-            product_data['Title'] = 'N/A'
-          # Price
-          try:
-            product_data['Price'] = card.find_element(By.CSS_SELECTOR, "span.a-price-whole").text.strip()
-          except Exception:
-            product_data['Price'] = 'N/A'
-          # Buyers Count (Assuming this element exists on the website)
+      tried = set()
+      for attempt in range(1, max_attempts + 1):
+        if driver and proxy_pool and rotate == "page" and attempt == 1 and page > 1:
+          quit_driver(driver)
+          driver = None
+        if driver is None:
+          driver, proxy = start_driver(proxy_pool, exclude=tried)
+        if proxy:
+          tried.add(proxy.address)
+        rate_limiter.wait(url)
+        start = time.perf_counter()
+        try:
+          driver.get(page_url)
+          WebDriverWait(driver, 30).until(
+              EC.presence_of_all_elements_located((By.CSS_SELECTOR, CARD_SELECTOR))
+          )
+        except Exception as e:
           try:
-            product_data['Buyers'] = card.find_element(By.CSS_SELECTOR, "span.s-underline-text").text.strip()
+            banned = looks_banned(driver.page_source)
           except Exception:
-            product_data['Buyers'] = 'N/A'
-          # Image URL
-          try:
-            product_data['Image URL'] = card.find_element(By.CSS_SELECTOR, "img.s-image").get_attribute("src")
-          except Exception:
-            product_data['Image URL'] = 'N/A'
-
-          products.append(product_data)
-          time.sleep(random.uniform(3, 10))  # Mimic human browsing
-      except TimeoutException:
-        print(f"Timeout waiting for page to load.")
-      except Exception as e:
-        print(f"Error on page {page}: {e}")
-        continue
+            banned = False  # The browser itself is gone
+          report_proxy(proxy_pool, proxy, ok=False, latency=time.perf_counter() - start, banned=banned)
+          if isinstance(e, TimeoutException):
+            print(f"Timeout waiting for page to load{' (blocked by a robot check)' if banned else ''}.")
+          else:
+            print(f"Error on page {page}: {e}")
+          # Drop the driver so the retry goes out through another proxy
+          quit_driver(driver)
+          driver = None
+          continue
+        report_proxy(proxy_pool, proxy, ok=True, latency=time.perf_counter() - start)
 
-    return products
+        page_products = parse_cards(driver)
+        print(f"Found {len(page_products)} products on page {page}.")
+        yield page_url, page_products
+        break
+      else:
+        print(f"Giving up on page {page} after {max_attempts} attempts.")
   except Exception as e:
     print(f"An error occurred during scraping: {e}")
-    return []
   finally:
     if driver:
-      try:
-        driver.quit()
-      except Exception as e:
-        print(f"Error quitting driver: {e}")
-
-def save_to_csv(data, filename="amazon_products.csv"):
-  """Save scraped data to a CSV file."""
-  if not data:
-    print("No data to save.")
-    return
-  with open(filename, mode="w", newline="", encoding="utf-8") as file:
-    fieldnames = ["Title", "Price", "Buyers", "Image URL"]
-    writer = csv.DictWriter(file, fieldnames=fieldnames)
-    writer.writeheader()
-    writer.writerows(data)
-  print(f"Saved {len(data)} products to {filename}")
+      quit_driver(driver)
+
+def scrape_amazon_category(url, max_pages=2, **kwargs):
+  """Scrape product details from an Amazon category and return them as a list."""
+  products = []
+  for _, page_products in iter_category_pages(url, max_pages=max_pages, **kwargs):
+    products.extend(page_products)
+  return products
+
+def save_products(pages, sink):
+  """Stream (page_url, products) pages into sink, checkpointing each page once it is written; returns a preview."""
+  preview = []
+  with sink:
+    for page_url, page_products in pages:
+      sink.write_many(page_products)
+      sink.mark_done(page_url)
+      preview.extend(page_products[:5 - len(preview)])
+  print(f"Saved {sink.written} products to {sink.path}")
+  return preview
+
+def load_proxy_pool(proxies, proxy_file):
+  """
+  Build a ProxyPool from --proxy values and a file with one host:port per line.
+  Raises ValueError naming the first malformed entry and where it came from.
+  """
+  entries = [("--proxy", address) for address in proxies or []]
+  if proxy_file:
+    with open(proxy_file, "r") as f:
+      entries += [(f"{proxy_file} line {number}", line) for number, line in enumerate(f.read().splitlines(), start=1)
+                  if line.strip() and not line.startswith("#")]
+  addresses = []
+  for source, entry in entries:
+    try:
+      addresses.append(parse_proxy(entry))
+    except ValueError as e:
+      raise ValueError(f"{source}: {e}") from None
+  return ProxyPool(addresses) if addresses else None
 
 def main():
   """Main function to scrape Amazon and save results."""
+  parser = argparse.ArgumentParser(description="Scrape an Amazon category through a pool of proxies.")
+  parser.add_argument("--proxy", action="append", help="Proxy as host:port; repeat for several.")
+  parser.add_argument("--proxy-file", help="File with one proxy (host:port) per line.")
+  parser.add_argument("--rotate", choices=["page", "worker"], default="worker",
+                      help="New proxy for every page, or keep one until it fails.")
+  parser.add_argument("--max-pages", type=int, default=2, help="Category pages to scrape.")
+  parser.add_argument("--extraction", choices=sorted(CARD_PARSERS), default="source",
+                      help="Read cards from page_source, with one execute_script call, or element by element.")
+  parser.add_argument("--min-delay", type=float, default=3.0, help="Minimum seconds between page loads on one domain.")
+  parser.add_argument("--max-delay", type=float, default=10.0, help="Maximum seconds between page loads on one domain.")
+  parser.add_argument("--output", default="amazon_products.csv", help="Output file: .csv, .jsonl or .parquet.")
+  parser.add_argument("--batch-size", type=int, default=100, help="Products buffered before each write.")
+  parser.add_argument("--fresh", action="store_true", help="Discard earlier output and checkpoint instead of resuming.")
+  parser.add_argument("--benchmark-proxies", action="store_true",
+                      help="Compare one proxy with the health-scored pool using local stand-in proxies.")
+  args = parser.parse_args()
+
+  if args.benchmark_proxies:
+    benchmark_proxy_pool()
+    return
+
   url = "https://www.amazon.com/s?i=specialty-aps&bbn=4954955011&rh=n%3A4954955011%2Cn%3A%25212617942011%2Cn%3A12897221&ref=nav_em__nav_desktop_sa_intl_knitning_crochet_0_2_8_7"
 
-  # Replace with your actual proxy IP and port
-  proxy_ip = "your_proxy_ip" 
-  proxy_port = "your_proxy_port" 
+  try:
+    proxy_pool = load_proxy_pool(args.proxy, args.proxy_file)
+  except (OSError, ValueError) as e:
+    print(f"Error loading proxies: {e}")
+    return
+  if proxy_pool is None:
+    print("No proxies given, connecting directly.")
 
   try:
-    products = scrape_amazon_category(url, max_pages=2, proxy_ip=proxy_ip, proxy_port=proxy_port)
+    sink = open_sink(args.output, PRODUCT_FIELDS, batch_size=args.batch_size, resume=not args.fresh)
+    if len(sink.checkpoint):
+      print(f"Resuming: {len(sink.checkpoint)} pages already saved to {args.output}")
+    pages = iter_category_pages(url, max_pages=args.max_pages, proxy_pool=proxy_pool, rotate=args.rotate,
+                                extraction=args.extraction, skip=sink.checkpoint,
+                                rate_limiter=DomainRateLimiter(args.min_delay, args.max_delay))
+    products = save_products(pages, sink)
+    if proxy_pool:
+      print("\nProxy health:")
+      print(tabulate(proxy_pool.summary(), headers="keys", tablefmt="grid"))
 
     if products:
       print("\nScraped Products:")
       print(tabulate(products[:5], headers="keys", tablefmt="grid"))
-      save_to_csv(products)
     else:
       print("No products scraped.")
   except Exception as e:
@@ -1,3 +1,11 @@
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import SimpleNamespace
 import pandas as pd
 import google.generativeai as genai
 import re  # Import regex module for cleaning numbering
@@ -5,8 +13,22 @@ import re  # Import regex module for cleaning numbering
 # Set your Gemini API key
 genai.configure(api_key="YOUR_GEMINI_API_KEY")
 
+INSIGHTS_MODEL = "gemini-1.5-flash"
+
+# One model client, created on first use and reused by every insight request
+@lru_cache(maxsize=None)
+def get_insights_model():
+    return genai.GenerativeModel(INSIGHTS_MODEL)
+
+# Function to pad or cut a list of insights to exactly three
+def three_insights(insights_list):
+    insights_list = [insight.strip() for insight in insights_list if insight and insight.strip()][:3]
+    while len(insights_list) < 3:
+        insights_list.append("No additional insight available.")
+    return insights_list
+
 # Function to generate three key insights dynamically
-def generate_three_key_insights(query, response_data):
+def generate_three_key_insights(query, response_data, model=None):
     try:
         # Generate 3 key insights from the provided data
         insight_prompt = f"""
@@ -15,7 +37,7 @@ def generate_three_key_insights(query, response_data):
         Data:
         {response_data}
         """
-        model = genai.GenerativeModel("gemini-1.5-flash")
+        model = model or get_insights_model()
         insights_response = model.generate_content(insight_prompt)
 
         # Extract the text from the response
@@ -27,27 +49,52 @@ def generate_three_key_insights(query, response_data):
         # Split insights into a list, assuming each insight is on a new line
         insights_list = insights_cleaned.split("\n")
 
-        # Filter out empty strings and generic text, limit to first 3 insights
-        insights_list = [insight.strip() for insight in insights_list if insight.strip() and not insight.lower().startswith("based on")][:3]
-
-        # If fewer than 3 insights are returned, pad with placeholder insights
-        while len(insights_list) < 3:
-            insights_list.append("No additional insight available.")
-
-        return insights_list
+        # Filter out generic text, keep the first 3 insights and pad with placeholders if fewer came back
+        return three_insights([insight for insight in insights_list if not insight.strip().lower().startswith("based on")])
     except Exception as e:
         return [f"Error generating insights: {e}"]
 
-# Function to analyze distribution dynamically
-def analyze_distribution(df, column, query):
+# Function to ask for the insights of several distributions in one structured prompt
+def generate_packed_insights(items, model=None):
+    """
+    items is a list of (query, response_data). Returns one insight list per
+    item, in order. Sections missing from the model's JSON answer are asked
+    for one by one.
+    """
+    model = model or get_insights_model()
+    sections = "\n\n".join(
+        f"### Section {i}\nQuery: {query}\nData:\n{response_data}" for i, (query, response_data) in enumerate(items, 1)
+    )
+    packed_prompt = (
+        "Based on the data in each numbered section below, provide 3 key insights for that section.\n"
+        "Answer with a JSON object that maps each section number to a list of exactly 3 insight strings, "
+        'for example {"1": ["...", "...", "..."], "2": ["...", "...", "..."]}.\n\n'
+        f"{sections}"
+    )
     try:
-        # Group data for distribution
-        distribution = df[column].value_counts(dropna=False)
-        total_count = len(df)
-        percentage_distribution = (distribution / total_count) * 100
+        response = model.generate_content(packed_prompt, generation_config={"response_mime_type": "application/json"})
+        parsed = json.loads(re.sub(r"^```(?:json)?|```$", "", response.text.strip()).strip())
+    except Exception as e:
+        print(f"Packed insight request for {len(items)} sections failed, asking one by one: {e}")
+        parsed = {}
+    results = []
+    for i, (query, response_data) in enumerate(items, 1):
+        insights = parsed.get(str(i)) if isinstance(parsed, dict) else None
+        if isinstance(insights, list) and insights:
+            results.append(three_insights([str(insight) for insight in insights]))
+        else:
+            results.append(generate_three_key_insights(query, response_data, model))
+    return results
 
-        # Prepare dynamic response with the distribution data
-        response_data = f"""
+# Function to describe the distribution of one column
+def describe_distribution(df, column):
+    # Group data for distribution
+    distribution = df[column].value_counts(dropna=False)
+    total_count = len(df)
+    percentage_distribution = (distribution / total_count) * 100
+
+    # Prepare dynamic response with the distribution data
+    return f"""
         Total Records: {total_count}
         Distribution for {column}:
         {distribution.to_string()}
@@ -56,16 +103,58 @@ def analyze_distribution(df, column, query):
         {percentage_distribution.round(2).to_string()}
         """
 
+# Function to format a distribution and its insights with clean numbering
+def format_analysis(column, response_data, key_insights):
+    insights_summary = "\n".join([f"{i+1}. {insight}" for i, insight in enumerate(key_insights)])
+    return f"Summary for {column}:\n{response_data}\n\nKey Insights:\n{insights_summary}"
+
+# Function to analyze distribution dynamically
+def analyze_distribution(df, column, query, model=None):
+    try:
+        response_data = describe_distribution(df, column)
+
         # Generate 3 key insights dynamically
-        key_insights = generate_three_key_insights(query, response_data)
+        key_insights = generate_three_key_insights(query, response_data, model)
 
-        # Format the response with clean numbering
-        insights_summary = "\n".join([f"{i+1}. {insight}" for i, insight in enumerate(key_insights)])
-        return f"Summary for {column}:\n{response_data}\n\nKey Insights:\n{insights_summary}"
+        return format_analysis(column, response_data, key_insights)
 
     except Exception as e:
         return f"Error analyzing distribution for column '{column}': {e}"
 
+# Function to analyze many (query, column) pairs in one batch
+def analyze_distributions(df, pairs, mode="concurrent", max_workers=8, pack_size=6, model=None):
+    """
+    Run analyze_distribution for every (query, column) pair, returning the
+    results in order. mode "serial" makes one LLM call after another,
+    "concurrent" makes up to max_workers calls at once, and "packed" sends
+    pack_size distributions per prompt (those prompts also run concurrently).
+    """
+    model = model or get_insights_model()
+    results = [None] * len(pairs)
+    jobs = []  # (index, query, column, response_data)
+    for index, (query, column) in enumerate(pairs):
+        try:
+            jobs.append((index, query, column, describe_distribution(df, column)))
+        except Exception as e:
+            results[index] = f"Error analyzing distribution for column '{column}': {e}"
+
+    if mode == "serial":
+        insights = [generate_three_key_insights(query, data, model) for _, query, _, data in jobs]
+    elif mode == "concurrent":
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            insights = list(executor.map(lambda job: generate_three_key_insights(job[1], job[3], model), jobs))
+    elif mode == "packed":
+        groups = [jobs[i:i + pack_size] for i in range(0, len(jobs), pack_size)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            packed = executor.map(lambda group: generate_packed_insights([(job[1], job[3]) for job in group], model), groups)
+            insights = [item for group_insights in packed for item in group_insights]
+    else:
+        raise ValueError(f"Unknown batch mode {mode!r}; use serial, concurrent or packed")
+
+    for (index, _, column, response_data), key_insights in zip(jobs, insights):
+        results[index] = format_analysis(column, response_data, key_insights)
+    return results
+
 # Function to dynamically identify relevant columns based on the query
 def identify_relevant_column(df, query):
     # Convert query to lowercase for case-insensitive matching
@@ -117,11 +206,92 @@ def process_query(query, dataset_path="Path_To_Your_Dataset"):
     except Exception as e:
         return f"Error processing query: {e}"
 
-# Example usage
-if __name__ == "__main__":
+class StandInInsightModel:
+    """
+    Offline stand-in for the Gemini model, for benchmarks: answers after
+    latency seconds plus per_section_latency for each section it is asked
+    about (longer answers take longer to generate).
+    """
+
+    def __init__(self, latency=0.8, per_section_latency=0.15):
+        self.latency = latency
+        self.per_section_latency = per_section_latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        sections = len(re.findall(r"^### Section \d+", prompt, flags=re.MULTILINE)) or 1
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency + self.per_section_latency * sections)
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            text = json.dumps({str(i): [f"Insight {n} for section {i}." for n in (1, 2, 3)] for i in range(1, sections + 1)})
+        else:
+            text = "Based on the data, here are 3 key insights:\n1. First insight.\n2. Second insight.\n3. Third insight."
+        return SimpleNamespace(text=text)
+
+def benchmark_batch(num_columns=30, rows=5000, latency=0.8, per_section_latency=0.15, max_workers=8, pack_size=6):
+    """Analyze num_columns synthetic columns against the stand-in model in each batch mode."""
+    rng = random.Random(0)
+    df = pd.DataFrame({
+        f"col_{i}": [rng.choice(["A", "B", "C", "D", None]) for _ in range(rows)] for i in range(num_columns)
+    })
+    pairs = [(f"What stands out in the distribution of col_{i}?", f"col_{i}") for i in range(num_columns)]
+    results = {}
+    for mode in ("serial", "concurrent", "packed"):
+        model = StandInInsightModel(latency, per_section_latency)
+        start = time.perf_counter()
+        analyses = analyze_distributions(df, pairs, mode=mode, max_workers=max_workers, pack_size=pack_size, model=model)
+        elapsed = time.perf_counter() - start
+        failed = sum("Error" in analysis for analysis in analyses)
+        results[mode] = {"seconds": elapsed, "llm_calls": model.calls, "failed": failed}
+    serial = results["serial"]["seconds"]
+    for mode, result in results.items():
+        print(f"{mode:<11} {num_columns} columns in {result['seconds']:.1f}s with {result['llm_calls']} LLM calls "
+              f"({serial / result['seconds']:.1f}x vs serial, {serial - result['seconds']:.1f}s saved, {result['failed']} failed)")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer questions about a dataset's distributions with Gemini insights.")
+    parser.add_argument("--dataset", default="Path_To_Your_Dataset", help="CSV file to analyze.")
+    parser.add_argument("--batch", nargs="+", metavar="QUERY", help="Analyze several queries in one batch instead of prompting.")
+    parser.add_argument("--all-columns", action="store_true", help="Analyze the distribution of every column in one batch.")
+    parser.add_argument("--mode", choices=["serial", "concurrent", "packed"], default="concurrent", help="How batch LLM calls are made.")
+    parser.add_argument("--workers", type=int, default=8, help="LLM calls in flight at once in batch mode.")
+    parser.add_argument("--pack-size", type=int, default=6, help="Distributions per prompt in packed mode.")
+    parser.add_argument("--benchmark-batch", action="store_true", help="Compare the batch modes against an offline stand-in model.")
+    args = parser.parse_args()
+
+    if args.benchmark_batch:
+        benchmark_batch(max_workers=args.workers, pack_size=args.pack_size)
+        return
+
+    if args.batch or args.all_columns:
+        try:
+            file_df = pd.read_csv(args.dataset)
+        except Exception as e:
+            print(f"Error processing query: {e}")
+            return
+        pairs = [(f"Describe the distribution of {column}", column) for column in file_df.columns] if args.all_columns else []
+        for query in args.batch or []:
+            column = identify_relevant_column(file_df, query)
+            if column:
+                pairs.append((query, column))
+            else:
+                print(f"Error: Could not detect a relevant column in the dataset based on your query: {query}")
+        start = time.perf_counter()
+        for result in analyze_distributions(file_df, pairs, mode=args.mode, max_workers=args.workers, pack_size=args.pack_size):
+            print(result)
+        print(f"Analyzed {len(pairs)} distributions in {time.perf_counter() - start:.1f}s ({args.mode})")
+        return
+
     while True:
         user_query = input("Enter your query (or type 'exit' to quit): ")
         if user_query.lower() == 'exit':
             break
-        result = process_query(user_query)
+        result = process_query(user_query, args.dataset)
         print(result)
+
+# Example usage
+if __name__ == "__main__":
+    main()
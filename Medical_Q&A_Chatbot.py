@@ -2,6 +2,9 @@ import streamlit as st
 from dotenv import load_dotenv
 import google.generativeai as genai
 import os
+from chat_sessions import render_stream, shared_sessions
+from gemini_client import SyncSdkModel
+from response_cache import cache_from_env
 
 # Load environment variables
 load_dotenv()
@@ -9,40 +12,37 @@ load_dotenv()
 # Configure the Generative AI with the API key
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-# Load Gemini Pro model and initialize a chat session
-model = genai.GenerativeModel("gemini-pro")
-chat = model.start_chat(history=[])
+# Load Gemini Pro model
+model = SyncSdkModel("gemini-pro")
 
-# Function to send query to the Gemini model and retrieve a response
-def get_gemini_response(question):
-    """
-    Sends a query to the Gemini API and retrieves the response text.
-    
-    Args:
-        question (str): User's input question.
-    
-    Returns:
-        str: The text response from the Gemini model.
-    """
-    try:
-        # Strict medical-response prompt
-        medical_prompt = (
-            "You are a highly knowledgeable medical assistant. "
-            "Answer the following question strictly with medically relevant information only. "
-            "Avoid providing unrelated or generic information.\n\n"
-            f"Question: {question}"
-        )
-        response = chat.send_message(medical_prompt, stream=False)
+# One chat session per browser session, shared store across the app; history bounded by a token budget
+def get_sessions():
+    return shared_sessions(max_sessions=500, idle_ttl=1800, token_budget=3000)
 
-        # Extract the text content from the response object
-        if response and response.candidates:
-            # Access the first candidate's content directly
-            text_response = response.candidates[0].content.parts[0].text
-            return text_response.strip()
-        else:
-            return "No valid response received from the model."
+# Strict medical-response instructions sent ahead of every question
+MEDICAL_INSTRUCTIONS = (
+    "You are a highly knowledgeable medical assistant. "
+    "Answer the following question strictly with medically relevant information only. "
+    "Avoid providing unrelated or generic information."
+)
+
+# Answers cached on model, instructions and normalized conversation, shared by every browser session
+@st.cache_resource
+def get_response_cache():
+    return cache_from_env("gemini-pro")
+
+# Function to wrap a question in the strict medical-response prompt
+def build_medical_prompt(question):
+    return f"{MEDICAL_INSTRUCTIONS}\n\nQuestion: {question}"
+
+# Function to stream the response text as the Gemini model generates it
+def stream_gemini_response(question, session):
+    try:
+        yield from get_sessions().stream(session, build_medical_prompt(question),
+                                         get_response_cache().wrap_stream_sync(model.generate_stream, MEDICAL_INSTRUCTIONS),
+                                         summary_generate=model.generate)
     except Exception as e:
-        return f"An error occurred while processing your query: {e}"
+        yield f"An error occurred while processing your query: {e}"
 
 # Streamlit App Front-End
 def main():
@@ -52,6 +52,10 @@ def main():
     st.title("Medical Chatbot")
     st.subheader("Ask me about your health concerns!")
     st.write("Enter your question below, and I'll provide a medically relevant response.")
+
+    # Server-issued session id, replaced by a new one if the session expired while the page sat idle
+    session = get_sessions().get(st.session_state.get("session_id"))
+    st.session_state.session_id = session.session_id
     
     # Input box for user question
     user_question = st.text_input("Your question:")
@@ -60,11 +64,9 @@ def main():
         if user_question.strip() == "":
             st.warning("Please enter a valid question.")
         else:
-            with st.spinner("Processing your query..."):
-                # Get the chatbot response
-                response = get_gemini_response(user_question)
-                st.success("Response:")
-                st.write(response)
+            st.success("Response:")
+            # Show the chatbot response as it is generated
+            render_stream(stream_gemini_response(user_question, session))
 
 # Run the app
 if __name__ == "__main__":
@@ -2,6 +2,8 @@ import streamlit as st
 from dotenv import load_dotenv
 import google.generativeai as genai
 import os
+from chat_sessions import render_stream, shared_sessions
+from gemini_client import SyncSdkModel
 
 # Load environment variables
 load_dotenv()
@@ -9,24 +11,19 @@ load_dotenv()
 # Configure the Generative AI with the API key
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-# Load Gemini Pro model and initialize a chat session
-model = genai.GenerativeModel("gemini-pro")
-chat = model.start_chat(history=[])
+# Load Gemini Pro model
+model = SyncSdkModel("gemini-pro")
 
-# Function to send query to the Gemini model and retrieve a response
-def get_gemini_response(question):
-    """
-    Sends a query to the Gemini API and retrieves the response text.
-    """
+# One chat session per browser session, shared store across the app; history bounded by a token budget
+def get_sessions():
+    return shared_sessions(max_sessions=500, idle_ttl=1800, token_budget=3000)
+
+# Function to stream the response text as the Gemini model generates it
+def stream_gemini_response(question, session):
     try:
-        response = chat.send_message(question, stream=False)
-        if response and response.candidates:
-            text_response = response.candidates[0].content.parts[0].text
-            return text_response.strip()
-        else:
-            return "No valid response received from the model."
+        yield from get_sessions().stream(session, question, model.generate_stream, summary_generate=model.generate)
     except Exception as e:
-        return f"An error occurred while processing your query: {e}"
+        yield f"An error occurred while processing your query: {e}"
 
 # Streamlit App Front-End
 def main():
@@ -37,6 +34,9 @@ def main():
 
     if "step" not in st.session_state:
         st.session_state.step = 1
+    # Server-issued session id, replaced by a new one if the session expired while the page sat idle
+    session = get_sessions().get(st.session_state.get("session_id"))
+    st.session_state.session_id = session.session_id
 
     if st.session_state.step == 1:
         st.write("Hello! I am your medical chatbot.")
@@ -88,23 +88,21 @@ def main():
 
     elif st.session_state.step == 5:
         st.write("Analyzing your information...")
-        with st.spinner("Please wait..."):
-            personalized_prompt = (
-                f"Patient Details:\n"
-                f"Name: {st.session_state.name}\n"
-                f"Age: {st.session_state.age}\n"
-                f"Symptoms: {st.session_state.symptoms}\n"
-                f"Additional Questions and Answers: {st.session_state.answers}\n\n"
-                "Based on the above information, provide a medically accurate diagnosis "
-                "and suggest specific treatment options. Ensure the response is tailored to the details provided."
-            )
-            response = get_gemini_response(personalized_prompt)
-
-            if response:
-                st.success("Diagnosis and Treatment:")
-                st.markdown(response)
-            else:
-                st.error("Failed to retrieve a valid response. Please try again.")
+        personalized_prompt = (
+            f"Patient Details:\n"
+            f"Name: {st.session_state.name}\n"
+            f"Age: {st.session_state.age}\n"
+            f"Symptoms: {st.session_state.symptoms}\n"
+            f"Additional Questions and Answers: {st.session_state.answers}\n\n"
+            "Based on the above information, provide a medically accurate diagnosis "
+            "and suggest specific treatment options. Ensure the response is tailored to the details provided."
+        )
+        st.success("Diagnosis and Treatment:")
+        # Show the diagnosis as it is generated
+        response = render_stream(stream_gemini_response(personalized_prompt, session))
+
+        if not response:
+            st.error("Failed to retrieve a valid response. Please try again.")
         st.session_state.step = 6
 
     elif st.session_state.step == 6:
@@ -5,8 +5,17 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selectolax.parser import HTMLParser
+from extraction_plan import plan_for
+from store_registry import StoreRegistry
+from output_sinks import ITEM_FIELDS, item_record, open_sink
+from crawl_frontier import CrawlFrontier, PermanentFailure, drain, normalize_url
 import json
+import argparse
+import queue
+import threading
+from functools import lru_cache
 from dataclasses import dataclass
 
 @dataclass
@@ -32,6 +41,14 @@ def load_stores(filename="stores.json"):
         print(f"[Error] Failed to load stores: {e}")
         return []
 
+@lru_cache(maxsize=1)
+def chromedriver_path():
+    """Resolve (and download if needed) chromedriver once per process."""
+    return ChromeDriverManager().install()
+
+# undetected_chromedriver patches the driver binary on start-up, so drivers are created one at a time
+_driver_creation_lock = threading.Lock()
+
 def create_driver():
     """Create a Selenium driver using undetected_chromedriver."""
     try:
@@ -40,66 +57,199 @@ def create_driver():
         options.add_argument("--disable-gpu")
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-blink-features=AutomationControlled")
-        driver = uc.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        with _driver_creation_lock:
+            driver = uc.Chrome(service=Service(chromedriver_path()), options=options)
         return driver
     except Exception as e:
         print(f"[Error] Failed to create driver: {e}")
         return None
 
+def fetch_page_source(driver, url, timeout=20):
+    """Load the page and return its HTML; raises TimeoutException or WebDriverException."""
+    driver.get(url)
+    WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
+    return driver.page_source
+
 def load_page_with_selenium(driver, url):
     """Load the page using Selenium and return the HTML."""
     try:
-        driver.get(url)
-        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.TAG_NAME, "body")))
-        return HTMLParser(driver.page_source)
+        return HTMLParser(fetch_page_source(driver, url))
     except Exception as e:
         print(f"[Error] Failed to load page {url}: {e}")
         return None
 
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"[Error] Failed to quit driver: {e}")
+
+class _Batch:
+    """The jobs of one DriverPool.scrape() call: their results, and how many are still open."""
+
+    def __init__(self, size, on_item):
+        self.results = [None] * size
+        self.on_item = on_item
+        self.open = size
+        self.done = threading.Event()
+        if not size:
+            self.done.set()
+
+class DriverPool:
+    """
+    A pool of headless drivers, each owned by one worker thread.
+
+    Workers and their drivers are started on the first scrape() and kept
+    across calls until close(); use the pool as a context manager. Workers
+    take (url, store) jobs from a shared queue. A worker replaces its driver
+    after max_pages_per_driver pages, or as soon as the driver crashes; a page
+    that crashed its driver is retried once on a fresh one.
+    """
+
+    def __init__(self, size=4, max_pages_per_driver=50, page_timeout=20, driver_factory=create_driver):
+        self.size = size
+        self.max_pages_per_driver = max_pages_per_driver
+        self.page_timeout = page_timeout
+        self.driver_factory = driver_factory
+        self.drivers_started = 0
+        self._lock = threading.Lock()
+        self._tasks = queue.Queue()
+        self._workers = []
+        self._closed = False
+
+    def scrape(self, jobs, on_item=None):
+        """
+        Scrape (url, store) jobs and return one Item (or None on failure) per
+        job, in job order. on_item(index, item) is called for each scraped item
+        as soon as it is parsed, one call at a time.
+        """
+        jobs = list(jobs)
+        batch = _Batch(len(jobs), on_item)
+        if jobs:
+            self._start()
+        for index, (url, store) in enumerate(jobs):
+            self._tasks.put((batch, index, url, store, 0))
+        batch.done.wait()
+        return batch.results
+
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("DriverPool is closed")
+            while len(self._workers) < self.size:
+                worker = threading.Thread(target=self._worker, name=f"browser-{len(self._workers)}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def close(self):
+        """Stop the workers and quit their drivers."""
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._tasks.put(None)
+        for worker in workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _new_driver(self):
+        driver = self.driver_factory()
+        if driver:
+            with self._lock:
+                self.drivers_started += 1
+        return driver
+
+    def _finish_job(self, batch):
+        with self._lock:
+            batch.open -= 1
+            if batch.open == 0:
+                batch.done.set()
+
+    def _worker(self):
+        driver = None
+        pages = 0
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            batch, index, url, store, attempt = task
+            retried = False
+            try:
+                if driver is None:
+                    driver = self._new_driver()
+                    pages = 0
+                    if driver is None:
+                        print(f"[Error] No driver available for URL: {url}")
+                        continue
+                try:
+                    html = HTMLParser(fetch_page_source(driver, url, timeout=self.page_timeout))
+                    batch.results[index] = parse(store, html)
+                    if batch.on_item:
+                        with self._lock:
+                            batch.on_item(index, batch.results[index])
+                except TimeoutException:
+                    print(f"[Error] Timed out loading page {url}")
+                except WebDriverException as e:
+                    # The browser died or the session is gone: start over with a new driver
+                    print(f"[Error] Driver crashed on {url}: {e.msg}")
+                    quit_driver(driver)
+                    driver = None
+                    if attempt == 0:
+                        self._tasks.put((batch, index, url, store, attempt + 1))
+                        retried = True
+                    continue
+                except Exception as e:
+                    print(f"[Error] Failed to scrape {url}: {e}")
+                pages += 1
+                if pages >= self.max_pages_per_driver:
+                    quit_driver(driver)
+                    driver = None
+            finally:
+                if not retried:
+                    self._finish_job(batch)
+        if driver:
+            quit_driver(driver)
+
 def parse(store, html):
     """Parse the product title and price from the HTML."""
     try:
-        # Extracting title
-        title_element = html.css_first(store.title)
-        title = title_element.text(strip=True) if title_element else "Title not found"
-
-        # Extracting price
-        price = "Price not found"
         if store.name == "Amazon":
-            # Amazon-specific price extraction
-            price_whole = html.css_first("span.a-price-whole")
-            price_decimal = html.css_first("span.a-price-decimal")
-            if price_whole:
-                price = price_whole.text(strip=True)
-                if price_decimal:
-                    price += "." + price_decimal.text(strip=True)
+            # Amazon splits the price into whole and decimal parts
+            fields = plan_for(store, price_decimal="span.a-price-decimal").extract(html)
+            if fields["price"] and fields["price_decimal"]:
+                fields["price"] += "." + fields["price_decimal"]
         else:
-            price_element = html.css_first(store.price)
-            price = price_element.text(strip=True) if price_element else "Price not found"
+            fields = plan_for(store).extract(html)
 
+        title = fields["title"] or "Title not found"
+        price = fields["price"] or "Price not found"
         return Item(store=store, title=title, price=price)
     except Exception as e:
         print(f"[Error] Failed to parse data for {store.name}: {e}")
         return Item(store=store, title="Title not found", price="Price not found")
 
-def store_selector(stores, url):
-    """Select the appropriate store configuration for a given URL."""
-    for store in stores:
-        if store.url in url:
-            return store
-    return None
-
 def main():
     """Main entry point for the scraper."""
+    parser = argparse.ArgumentParser(description="Scrape product titles and prices from JavaScript-rendered store pages.")
+    parser.add_argument("--workers", type=int, default=1, help="Headless browsers (one worker thread each).")
+    parser.add_argument("--pages-per-driver", type=int, default=50, help="Pages a browser loads before it is recycled.")
+    parser.add_argument("--output", help="Stream items to this .csv, .jsonl or .parquet file as they are scraped.")
+    parser.add_argument("--fresh", action="store_true", help="Discard earlier output and checkpoint instead of resuming.")
+    parser.add_argument("--frontier", metavar="DB", help="Queue the URLs in a shared SQLite crawl frontier and work through it.")
+    parser.add_argument("--host-delay", type=float, default=2.0, help="Seconds between page loads on one host (frontier mode).")
+    parser.add_argument("--batch", type=int, default=16, help="URLs claimed from the frontier at a time.")
+    args = parser.parse_args()
+
     stores = load_stores("stores.json")
     if not stores:
         print("[Error] No stores loaded. Exiting.")
         return
-
-    driver = create_driver()
-    if not driver:
-        print("[Error] Failed to initialize web driver. Exiting.")
-        return
+    registry = StoreRegistry(stores)
 
     urls = [
         "https://rab.equipment/uk/womens-khroma-converge-gore-tex-jacket?queryID=d5d922264afc1239fde27abfad462b09&objectID=68805&indexName=rab_live_uk_products&_gl=1*1bct61x*_up*MQ..*_ga*MTkwNTI1OTUxMy4xNzM1ODMxMDYw*_ga_GH01DCFF89*MTczNTgzMTA1Ny4xLjAuMTczNTgzMTA1Ny4wLjAuODg2NDQ0NDky",
@@ -108,19 +258,48 @@ def main():
         "https://www.amazon.co.uk/dp/B09THCJJYK/ref=sspa_dk_detail_0?pd_rd_i=B09THCJJYK&pd_rd_w=ejZ73&content-id=amzn1.sym.7b0d8b34-54be-4fd2-9baf-2d658b11dc53&pf_rd_p=7b0d8b34-54be-4fd2-9baf-2d658b11dc53&pf_rd_r=RGJZPQGZA7BN4ABD80DY&pd_rd_wg=UzdZ1&pd_rd_r=647efe73-92b7-4396-af0d-9afb1dc5eeb6&s=kitchen&sp_csd=d2lkZ2V0TmFtZT1zcF9kZXRhaWxfdGhlbWF0aWM&th=1"
     ]
 
-    for url in urls:
-        store = store_selector(stores, url)
-        if store:
-            html = load_page_with_selenium(driver, url)
-            if html:
-                item = parse(store, html)
-                print(item)
+    if args.frontier:
+        urls = [normalize_url(url) for url in urls]  # The frontier queues, and the sink checkpoints, normalized URLs
+    sink = open_sink(args.output, ITEM_FIELDS, resume=not args.fresh) if args.output else None
+    if sink:
+        urls = [url for url in urls if url not in sink.checkpoint]  # Already saved by an earlier run
+
+    def scrape_batch(batch):
+        """Scrape a list of URLs; returns one Item (None on failure, a PermanentFailure without a store) per URL."""
+        jobs = []
+        for url in batch:
+            store = registry.match(url)
+            if store:
+                jobs.append((url, store))
             else:
-                print(f"[Error] Failed to load page for URL: {url}")
-        else:
-            print(f"[Error] Store not found for URL: {url}")
+                print(f"[Error] Store not found for URL: {url}")
+
+        def save_item(index, item):
+            sink.write(item_record(jobs[index][0], item))
+            sink.mark_done(jobs[index][0])
 
-    driver.quit()
+        items = dict(zip([url for url, _ in jobs], pool.scrape(jobs, on_item=save_item if sink else None)))
+        return [items.get(url) if url in items else PermanentFailure("no store matches this URL") for url in batch]
+
+    def show(url, item):
+        if item:
+            print(item)
+        elif registry.match(url):
+            print(f"[Error] Failed to load page for URL: {url}")
+
+    with DriverPool(size=args.workers, max_pages_per_driver=args.pages_per_driver) as pool:
+        if args.frontier:
+            with CrawlFrontier(args.frontier, default_delay=args.host_delay) as frontier:
+                frontier.add_many(urls)
+                for url, item in drain(frontier, args.batch, scrape_batch):
+                    show(url, item)
+                print(f"Frontier: {frontier.stats()}")
+        else:
+            for url, item in zip(urls, scrape_batch(urls)):
+                show(url, item)
+    if sink:
+        sink.close()
+        print(f"Saved {sink.written} items to {sink.path}")
 
 if __name__ == "__main__":
     main()
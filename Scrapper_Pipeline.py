@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from collections import Counter
+from pathlib import Path
+from rich import print
+from extraction_plan import plan_for
+from http_cache import HttpCache
+from store_registry import StoreRegistry
+from output_sinks import ITEM_FIELDS, item_record, open_sink
+from crawl_frontier import CrawlFrontier, PermanentFailure, drain, normalize_url
+from Scrapper_StaticWebsites import Item, fetch_pages, load_stores
+
+# One entry point for every store: pages are fetched over plain HTTP first and
+# only sent to the headless browser pool when the HTTP copy is unusable. The
+# tier that worked is remembered per store, so later URLs skip the probe.
+
+HTTP = "http"
+BROWSER = "browser"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+}
+
+# Single-page-app mount points that are empty until JavaScript runs
+APP_ROOT = re.compile(r"<div[^>]+id=[\"'](?:root|app|__next|__nuxt)[\"'][^>]*>\s*</div>", re.IGNORECASE)
+
+# Function to spot pages that are only a JavaScript bootstrap
+def looks_like_js_shell(html, min_text=200):
+    body = html.body
+    if body is None:
+        return True
+    if len(body.text(strip=True)) < min_text and html.css_first("script"):
+        return True
+    noscript = html.css_first("noscript")
+    if noscript and "javascript" in noscript.text().lower() and APP_ROOT.search(body.html or ""):
+        return True
+    return False
+
+class TierMemory:
+    """
+    The fetch tier that last worked for each store, kept in a JSON file.
+
+    Stores pinned to the browser are probed over HTTP again after
+    recheck_after seconds, in case the site stopped depending on JavaScript.
+    """
+
+    def __init__(self, path="store_tiers.json", recheck_after=7 * 24 * 3600):
+        self.path = Path(path)
+        self.recheck_after = recheck_after
+        self.tiers = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    self.tiers = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[Error] Failed to read {self.path}, starting without tiers: {e}")
+
+    def get(self, store):
+        """Return HTTP, BROWSER or None when the store has to be probed."""
+        entry = self.tiers.get(store.name)
+        if entry is None:
+            return None
+        if entry["tier"] == BROWSER and time.time() - entry["updated_at"] > self.recheck_after:
+            return None
+        return entry["tier"]
+
+    def set(self, store, tier):
+        self.tiers[store.name] = {"tier": tier, "updated_at": time.time()}
+
+    def save(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.tiers, f, indent=2)
+        os.replace(tmp, self.path)
+
+def extract_item(store, html):
+    """Return an Item when every field was found, otherwise None."""
+    fields = plan_for(store).extract(html)
+    if not all(fields.values()):
+        return None
+    return Item(store=store, title=fields["title"], price=fields["price"])
+
+class ScrapePipeline:
+    """
+    HTTP-first scraping with escalation to the headless browser pool.
+
+    A page escalates when it failed to download, when a selector found
+    nothing, or when it looks like a JavaScript shell. Stores with no known
+    tier get one probe URL each over HTTP; the outcome decides where their
+    remaining URLs go. A browser pool the pipeline starts itself is kept for
+    later scrape() calls and shut down by close().
+    """
+
+    def __init__(self, stores, tiers, cache=None, concurrency=32, per_host=4, browser_workers=2,
+                 pages_per_driver=50, browser_pool=None):
+        self.registry = StoreRegistry(stores)
+        self.tiers = tiers
+        self.cache = cache
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.browser_workers = browser_workers
+        self.pages_per_driver = pages_per_driver
+        self.browser_pool = browser_pool
+        self._owns_browser_pool = browser_pool is None
+        self.stats = Counter()
+
+    def _fetch_http(self, jobs):
+        """Fetch (index, url, store) jobs over HTTP; returns {index: Item} and the jobs that need a browser."""
+        pages = asyncio.run(fetch_pages(
+            [url for _, url, _ in jobs], HEADERS, max_concurrency=self.concurrency, per_host=self.per_host,
+            cache=self.cache, ttls=[getattr(store, "cache_ttl", None) for _, _, store in jobs],
+        ))
+        items, escalate = {}, []
+        for (index, url, store), html in zip(jobs, pages):
+            self.stats["http_fetches"] += 1
+            item = None
+            if html is not None and not looks_like_js_shell(html):
+                item = extract_item(store, html)
+            if item:
+                items[index] = item
+            else:
+                escalate.append((index, url, store))
+        return items, escalate
+
+    def _fetch_browser(self, jobs):
+        """Render (index, url, store) jobs in the browser pool; returns {index: Item or None}."""
+        if not jobs:
+            return {}
+        if self.browser_pool is None:
+            # Imported here so HTTP-only crawls never need Chrome or Selenium installed
+            from Scrapper_DynamicWebsites import DriverPool
+            self.browser_pool = DriverPool(size=self.browser_workers, max_pages_per_driver=self.pages_per_driver)
+        results = self.browser_pool.scrape([(url, store) for _, url, store in jobs])
+        self.stats["browser_loads"] += len(jobs)
+        items = {}
+        for (index, _, store), item in zip(jobs, results):
+            found = item and item.title != "Title not found" and item.price != "Price not found"
+            items[index] = Item(store=store, title=item.title, price=item.price) if found else None
+        return items
+
+    def _finish(self, results, index, item, on_item):
+        results[index] = item
+        if item and on_item:
+            on_item(index, item)
+
+    def scrape(self, urls, on_item=None):
+        """
+        Scrape urls and return one Item (or None) per URL, in order; URLs that
+        match no store get a PermanentFailure. on_item(index, item) is called
+        as soon as each item is final.
+        """
+        results = [None] * len(urls)
+        probes, http_jobs, browser_jobs = [], [], []
+        probed = set()
+        for index, url in enumerate(urls):
+            store = self.registry.match(url)
+            if store is None:
+                print(f"Store not found for URL: {url}")
+                results[index] = PermanentFailure("no store matches this URL")
+                continue
+            tier = self.tiers.get(store)
+            if tier is None and store.name not in probed:
+                probed.add(store.name)
+                probes.append((index, url, store))
+            elif tier == BROWSER:
+                browser_jobs.append((index, url, store))
+            else:
+                http_jobs.append((index, url, store))
+
+        # Probe stores with no known tier, then route the rest of their URLs
+        if probes:
+            items, escalated = self._fetch_http(probes)
+            results_by_store = {}
+            for index, item in items.items():
+                self._finish(results, index, item, on_item)
+                results_by_store[item.store.name] = HTTP
+                self.tiers.set(item.store, HTTP)
+            probe_escalations = self._fetch_browser(escalated)
+            for (index, _, store) in escalated:
+                self._finish(results, index, probe_escalations[index], on_item)
+                if probe_escalations[index]:
+                    results_by_store[store.name] = BROWSER
+                    self.tiers.set(store, BROWSER)
+            still_http = []
+            for job in http_jobs:
+                if results_by_store.get(job[2].name) == BROWSER:
+                    browser_jobs.append(job)
+                else:
+                    still_http.append(job)
+            http_jobs = still_http
+            self.stats["escalations"] += len(escalated)
+
+        if http_jobs:
+            items, escalated = self._fetch_http(http_jobs)
+            for index, item in items.items():
+                self._finish(results, index, item, on_item)
+            browser_jobs.extend(escalated)
+            self.stats["escalations"] += len(escalated)
+        for index, item in self._fetch_browser(browser_jobs).items():
+            self._finish(results, index, item, on_item)
+            # One bad page does not demote a store that HTTP already works for
+            if item and self.tiers.get(item.store) is None:
+                self.tiers.set(item.store, BROWSER)
+        self.tiers.save()
+        return results
+
+    def close(self):
+        if self._owns_browser_pool and self.browser_pool is not None:
+            self.browser_pool.close()
+            self.browser_pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def report(self):
+        http, browser = self.stats["http_fetches"], self.stats["browser_loads"]
+        print(f"HTTP fetches: {http}, browser loads: {browser}, escalations: {self.stats['escalations']}")
+        for name, entry in sorted(self.tiers.tiers.items()):
+            print(f"  {name}: {entry['tier']}")
+
+def crawl_from_frontier(pipeline, frontier, batch_size, on_item=None):
+    """
+    Claim URLs from a shared frontier batch by batch and scrape them until
+    nothing is pending. Several processes can run this on the same frontier.
+    """
+    def scrape_batch(urls):
+        save = (lambda index, item: on_item(urls[index], item)) if on_item else None
+        return pipeline.scrape(urls, on_item=save)
+
+    for url, item in drain(frontier, batch_size, scrape_batch):
+        print(item if item else f"Failed to scrape {url}")
+    print(f"Frontier: {frontier.stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape store pages over HTTP, escalating to a headless browser only when needed.")
+    parser.add_argument("urls", nargs="*", help="Product URLs (defaults to the sample URLs below).")
+    parser.add_argument("--tiers-file", default="store_tiers.json", help="Where the working tier of each store is remembered.")
+    parser.add_argument("--reset-tiers", action="store_true", help="Forget remembered tiers and probe every store again.")
+    parser.add_argument("--cache", action="store_true", help="Revalidate pages through the on-disk HTTP response cache instead of always downloading them in full.")
+    parser.add_argument("--cache-dir", default="http_cache", help="Directory of the on-disk HTTP response cache.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum HTTP requests in flight.")
+    parser.add_argument("--per-host", type=int, default=4, help="Maximum HTTP requests in flight per host.")
+    parser.add_argument("--workers", type=int, default=2, help="Headless browsers for escalated pages.")
+    parser.add_argument("--pages-per-driver", type=int, default=50, help="Pages a browser loads before it is recycled.")
+    parser.add_argument("--frontier", metavar="DB", help="Queue the URLs in a shared SQLite crawl frontier and work through it.")
+    parser.add_argument("--host-delay", type=float, default=2.0, help="Seconds between requests to one host (frontier mode).")
+    parser.add_argument("--batch", type=int, default=16, help="URLs claimed from the frontier at a time.")
+    parser.add_argument("--output", help="Stream items to this .csv, .jsonl or .parquet file as they are scraped.")
+    parser.add_argument("--fresh", action="store_true", help="Discard earlier output and checkpoint instead of resuming.")
+    args = parser.parse_args()
+
+    urls = args.urls or [
+        "https://rab.equipment/uk/womens-khroma-converge-gore-tex-jacket",
+        "https://www.fjallraven.com/uk/en-gb/women/jackets/parkas/nuuk-parka-w2/?v=F86369::7323450789596",
+        "https://www.blackdiamondequipment.com/en_US/product/womens-access-down-hoody/?colorid=23425",
+        "https://www.amazon.co.uk/Magnifying-Illuminated-Cosmetic-Standing-Portable/dp/B06Y2MZH39",
+    ]
+    if args.frontier:
+        urls = [normalize_url(url) for url in urls]  # The frontier queues, and the sink checkpoints, normalized URLs
+    sink = open_sink(args.output, ITEM_FIELDS, resume=not args.fresh) if args.output else None
+    if sink:
+        urls = [url for url in urls if url not in sink.checkpoint]  # Already saved by an earlier run
+
+    def save_item(url, item):
+        sink.write(item_record(url, item))
+        sink.mark_done(url)
+
+    tiers = TierMemory(args.tiers_file)
+    if args.reset_tiers:
+        tiers.tiers = {}
+    cache = HttpCache(args.cache_dir) if args.cache else None
+    with ScrapePipeline(load_stores(), tiers, cache=cache, concurrency=args.concurrency, per_host=args.per_host,
+                        browser_workers=args.workers, pages_per_driver=args.pages_per_driver) as pipeline:
+        if args.frontier:
+            with CrawlFrontier(args.frontier, default_delay=args.host_delay) as frontier:
+                frontier.add_many(urls)
+                crawl_from_frontier(pipeline, frontier, args.batch, on_item=save_item if sink else None)
+        else:
+            on_item = (lambda index, item: save_item(urls[index], item)) if sink else None
+            for url, item in zip(urls, pipeline.scrape(urls, on_item=on_item)):
+                print(item if item else f"Failed to scrape {url}")
+    if sink:
+        sink.close()
+        print(f"Saved {sink.written} items to {sink.path}")
+    pipeline.report()
+
+if __name__ == "__main__":
+    main()
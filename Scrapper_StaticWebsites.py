@@ -1,7 +1,21 @@
 import httpx
 from selectolax.parser import HTMLParser
 import json
+import argparse
+import asyncio
+import importlib.util
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
 from rich import print
+from http_cache import HttpCache
+from extraction_plan import benchmark_extraction, debug_snippet, plan_for, should_log_snippet
+from store_registry import StoreRegistry, benchmark_store_lookup
+from crawl_frontier import CrawlFrontier, PermanentFailure, drain, normalize_url
+from output_sinks import ITEM_FIELDS, item_record, open_sink
 from dataclasses import dataclass
 
 @dataclass
@@ -10,6 +24,7 @@ class Store:
     url: str
     title: str
     price: str
+    cache_ttl: float = 0  # Seconds a cached page is trusted before it is revalidated
 
 @dataclass
 class Item:
@@ -22,45 +37,244 @@ def load_stores():
         data = json.load(f)
     return [Store(**item) for item in data]
 
-def load_page(client, url):
+def load_page(client, url, cache=None, ttl=None):
     try:
-        resp = client.get(url, timeout=30.0)  # Increase timeout to 30 seconds
+        if cache:
+            resp = cache.get(client, url, ttl=ttl, timeout=30.0)
+        else:
+            resp = client.get(url, timeout=30.0)  # Increase timeout to 30 seconds
         return HTMLParser(resp.text)
     except httpx.ReadTimeout:
         print(f"Request to {url} timed out.")
         return None
 
+async def load_page_async(client, url, global_limit, host_limits, cache=None, ttl=None):
+    """Fetch one page while holding a global slot and a slot for its host."""
+    async with global_limit, host_limits[urlsplit(url).hostname]:
+        try:
+            if cache:
+                resp = await cache.get_async(client, url, ttl=ttl, timeout=30.0)
+            else:
+                resp = await client.get(url, timeout=30.0)
+            return HTMLParser(resp.text)
+        except httpx.TimeoutException:
+            print(f"Request to {url} timed out.")
+            return None
+        except httpx.HTTPError as e:
+            print(f"Request to {url} failed: {e}")
+            return None
+
+async def fetch_pages(urls, headers, max_concurrency=32, per_host=4, http2=True, cache=None, ttls=None):
+    """
+    Fetch all URLs concurrently over one pooled AsyncClient.
+
+    At most max_concurrency requests run at once, and at most per_host against
+    any single host. Results come back in the same order as urls (None for
+    pages that failed to load). With a cache, ttls gives each URL's cache TTL.
+    """
+    ttls = ttls or [None] * len(urls)
+    global_limit = asyncio.Semaphore(max_concurrency)
+    host_limits = defaultdict(lambda: asyncio.Semaphore(per_host))
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    # HTTP/2 needs the optional h2 package (pip install httpx[http2])
+    http2 = http2 and importlib.util.find_spec("h2") is not None
+    async with httpx.AsyncClient(headers=headers, http2=http2, limits=limits, follow_redirects=True) as client:
+        return await asyncio.gather(*(
+            load_page_async(client, url, global_limit, host_limits, cache, ttl) for url, ttl in zip(urls, ttls)
+        ))
+
 def parse(store, html):
-    title_element = html.css_first(store.title) if html else None
-    price_element = html.css_first(store.price) if html else None
+    fields = plan_for(store).extract(html) if html else {"title": None, "price": None}
 
-    if title_element:
-        print(f"Found Title for {store.name}: {title_element.text(strip=True)}")
-    else:
-        print(f"Title not found for {store.name}. Raw HTML snippet: {html.text()[:500]}")
+    for field in ("title", "price"):
+        if fields[field]:
+            print(f"Found {field.capitalize()} for {store.name}: {fields[field]}")
+        elif html and should_log_snippet(store.name, field):
+            print(f"{field.capitalize()} not found for {store.name}. Raw HTML snippet: {debug_snippet(html)}")
+        else:
+            print(f"{field.capitalize()} not found for {store.name}.")
+
+    title = fields["title"] or "Title not found"
+    price = fields["price"] or "Price not found"
+
+    return Item(store=store, title=title, price=price)
 
-    if price_element:
-        print(f"Found Price for {store.name}: {price_element.text(strip=True)}")
+def scrape_urls(urls, registry, headers, cache=None, use_async=False, concurrency=32, per_host=4):
+    """
+    Fetch and parse urls; returns one Item per URL (None if the page failed
+    to load, a PermanentFailure if no store matches it).
+    """
+    matched = [(url, registry.match(url)) for url in urls]
+    to_fetch = [(url, store) for url, store in matched if store]
+    if use_async:
+        pages = asyncio.run(fetch_pages([url for url, _ in to_fetch], headers, max_concurrency=concurrency,
+                                        per_host=per_host, cache=cache, ttls=[store.cache_ttl for _, store in to_fetch]))
     else:
-        print(f"Price not found for {store.name}. Raw HTML snippet: {html.text()[:500]}")
+        with httpx.Client(headers=headers) as client:
+            pages = [load_page(client, url, cache=cache, ttl=store.cache_ttl) for url, store in to_fetch]
+    fetched = dict(zip([url for url, _ in to_fetch], pages))
 
-    title = title_element.text(strip=True) if title_element else "Title not found"
-    price = price_element.text(strip=True) if price_element else "Price not found"
+    items = []
+    for url, store in matched:
+        item = None
+        if store:  # Check if store is found
+            html = fetched[url]
+            if html:  # Check if page was successfully loaded
+                item = parse(store, html)
+                print(item)
+            else:
+                print(f"Failed to load page for {url}")
+        else:
+            print(f"Store not found for URL: {url}")
+            item = PermanentFailure("no store matches this URL")
+        items.append(item)
+    return items
 
-    return Item(store=store, title=title, price=price)
+class _DelayedPageHandler(BaseHTTPRequestHandler):
+    """
+    Serves a small product page after a fixed delay, standing in for a slow store.
+
+    A `delay` query parameter overrides the delay for one request, and paths under
+    /fail/ drop the connection without a response. The server records the most
+    requests it handled at once, overall and per Host header.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        host = self.headers.get("Host", "").rsplit(":", 1)[0]
+        with self.server.lock:
+            self.server.active[host] += 1
+            self.server.max_active = max(self.server.max_active, sum(self.server.active.values()))
+            self.server.max_active_per_host[host] = max(self.server.max_active_per_host[host],
+                                                        self.server.active[host])
+        self._host = host
+        try:
+            self._respond()
+        finally:
+            self._end_request()
+
+    def _end_request(self):
+        # Called before the response is written: once the client has it, it may send the next request
+        if self._host is not None:
+            with self.server.lock:
+                self.server.active[self._host] -= 1
+            self._host = None
+
+    def _respond(self):
+        url = urlsplit(self.path)
+        time.sleep(float(parse_qs(url.query).get("delay", [self.server.delay])[0]))
+        self._end_request()
+        if url.path.startswith("/fail/"):
+            self.close_connection = True
+            return
+        etag = f'"{abs(hash(self.path))}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        padding = "<p>Product description.</p>" * 200  # Pad the page to a realistic-ish size
+        body = f"<html><body><span class='base'>Product {url.path}</span><span class='price'>9.99</span>{padding}</body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
 
-def store_selector(stores, url):
-    for store in stores:
-        if store.url in url:
-            return store
-    return None
+    def log_message(self, format, *args):
+        pass
+
+def start_delayed_server(delay):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DelayedPageHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.active = defaultdict(int)
+    server.max_active = 0
+    server.max_active_per_host = defaultdict(int)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def benchmark(num_urls=100, delay=0.2, max_concurrency=32):
+    """Compare the sequential fetch loop with fetch_pages against a local server that adds `delay` per page."""
+    server = start_delayed_server(delay)
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/product/{i}" for i in range(num_urls)]
+    try:
+        start = time.perf_counter()
+        with httpx.Client() as client:
+            sequential = [load_page(client, url) for url in urls]
+        sequential_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = asyncio.run(fetch_pages(urls, {}, max_concurrency=max_concurrency, per_host=max_concurrency))
+        async_s = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Pages that failed to load come back as None; they are counted, not checked
+    in_order = all(html.css_first("span.base").text() == f"Product /product/{i}"
+                   for i, html in enumerate(concurrent) if html is not None)
+    sequential_failed = sum(h is None for h in sequential)
+    async_failed = sum(h is None for h in concurrent)
+    print(f"sequential: {sequential_s:.2f}s for {num_urls - sequential_failed} pages ({sequential_failed} failed)")
+    print(f"async:      {async_s:.2f}s for {num_urls - async_failed} pages ({async_failed} failed) "
+          f"({sequential_s / async_s:.1f}x faster, order preserved: {in_order})")
+    return {"sequential_s": sequential_s, "async_s": async_s,
+            "sequential_failed": sequential_failed, "async_failed": async_failed}
+
+def benchmark_cache(cache_dir, num_urls=50, delay=0.05):
+    """Crawl a local ETag-aware server twice through the response cache and compare the runs."""
+    server = start_delayed_server(delay)
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/product/{i}" for i in range(num_urls)]
+    try:
+        with httpx.Client() as client:
+            for label in ("cold", "repeat"):
+                cache = HttpCache(cache_dir)
+                start = time.perf_counter()
+                for url in urls:
+                    load_page(client, url, cache=cache, ttl=0)
+                print(f"{label:>6}: {time.perf_counter() - start:.2f}s, {cache.stats}")
+    finally:
+        server.shutdown()
+        server.server_close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Scrape product titles and prices from static store pages.")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Fetch all URLs concurrently with httpx.AsyncClient.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight (async mode).")
+    parser.add_argument("--per-host", type=int, default=4, help="Maximum requests in flight per host (async mode).")
+    parser.add_argument("--benchmark", action="store_true", help="Compare sequential and async fetching against a local delayed server.")
+    parser.add_argument("--cache", action="store_true", help="Revalidate pages through the on-disk HTTP response cache instead of always downloading them in full.")
+    parser.add_argument("--cache-dir", default="http_cache", help="Directory of the on-disk HTTP response cache.")
+    parser.add_argument("--output", help="Stream items to this .csv, .jsonl or .parquet file as they are scraped.")
+    parser.add_argument("--fresh", action="store_true", help="Discard earlier output and checkpoint instead of resuming.")
+    parser.add_argument("--frontier", metavar="DB", help="Queue the URLs in a shared SQLite crawl frontier and work through it.")
+    parser.add_argument("--host-delay", type=float, default=2.0, help="Seconds between requests to one host (frontier mode).")
+    parser.add_argument("--batch", type=int, default=16, help="URLs claimed from the frontier at a time.")
+    parser.add_argument("--benchmark-cache", action="store_true", help="Compare a cold and a repeat crawl through the response cache.")
+    parser.add_argument("--benchmark-lookup", action="store_true", help="Time store lookup for 1M URLs over 10k stores.")
+    parser.add_argument("--benchmark-parse", metavar="FIXTURE_DIR", help="Report pages/sec of field extraction over saved HTML pages named <store>.html.")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(max_concurrency=args.concurrency)
+        return
+    if args.benchmark_cache:
+        benchmark_cache(Path(args.cache_dir) / "benchmark")
+        return
+    if args.benchmark_lookup:
+        benchmark_store_lookup()
+        return
+    if args.benchmark_parse:
+        benchmark_extraction(args.benchmark_parse, load_stores())
+        return
+
     stores = load_stores()
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
     }
-    client = httpx.Client(headers=headers)
 
     urls = [
         "https://rab.equipment/uk/womens-khroma-converge-gore-tex-jacket?queryID=d5d922264afc1239fde27abfad462b09&objectID=68805&indexName=rab_live_uk_products&_gl=1*1bct61x*_up*MQ..*_ga*MTkwNTI1OTUxMy4xNzM1ODMxMDYw*_ga_GH01DCFF89*MTczNTgzMTA1Ny4xLjAuMTczNTgzMTA1Ny4wLjAuODg2NDQ0NDky",
@@ -69,17 +283,39 @@ def main():
         "https://www.amazon.co.uk/Magnifying-Illuminated-Cosmetic-Standing-Portable/dp/B06Y2MZH39?ref_=Oct_d_omg_d_10745681_5&pd_rd_w=c3kqA&content-id=amzn1.sym.ec8f623a-d4f7-4017-b387-58abf6ea18ca&pf_rd_p=ec8f623a-d4f7-4017-b387-58abf6ea18ca&pf_rd_r=M891588420BJRM6CDQJS&pd_rd_wg=x52Dr&pd_rd_r=9f674943-60cc-47b4-9bb1-12855621a074&pd_rd_i=B06Y2MZH39"
     ]
 
-    for url in urls:
-        store = store_selector(stores, url)
-        if store:  # Check if store is found
-            html = load_page(client, url)
-            if html:  # Check if page was successfully loaded
-                item = parse(store, html)
-                print(item)
-            else:
-                print(f"Failed to load page for {url}")
-        else:
-            print(f"Store not found for URL: {url}")
+    if args.frontier:
+        urls = [normalize_url(url) for url in urls]  # The frontier queues, and the sink checkpoints, normalized URLs
+    sink = open_sink(args.output, ITEM_FIELDS, resume=not args.fresh) if args.output else None
+    if sink:
+        urls = [url for url in urls if url not in sink.checkpoint]  # Already saved by an earlier run
+
+    registry = StoreRegistry(stores)
+    cache = HttpCache(args.cache_dir) if args.cache else None
+
+    def scrape_batch(batch):
+        return scrape_urls(batch, registry, headers, cache=cache, use_async=args.use_async,
+                           concurrency=args.concurrency, per_host=args.per_host)
+
+    def save(url, item):
+        if item and sink:
+            sink.write(item_record(url, item))
+            sink.mark_done(url)
+
+    if args.frontier:
+        with CrawlFrontier(args.frontier, default_delay=args.host_delay) as frontier:
+            frontier.add_many(urls)
+            for url, item in drain(frontier, args.batch, scrape_batch):
+                save(url, item)
+            print(f"Frontier: {frontier.stats()}")
+    else:
+        for url, item in zip(urls, scrape_batch(urls)):
+            save(url, item)
+
+    if cache:
+        print(f"Response cache: {cache.stats}")
+    if sink:
+        sink.close()
+        print(f"Saved {sink.written} items to {sink.path}")
 
 if __name__ == "__main__": 
     main()
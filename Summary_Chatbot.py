@@ -4,21 +4,31 @@ import requests
 from bs4 import BeautifulSoup
 from transformers import pipeline
 import os
+from http_cache import HttpCache
 
 # Initialize the summarization pipeline
 summarizer = pipeline("summarization")
 
-# Function to extract text from PDF files
-def extract_text_from_pdf(pdf_file):
+# Function to stream text from PDF files one page at a time
+def iter_pdf_pages(pdf_file):
     reader = PdfReader(pdf_file)
-    text = ""
     for page in reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+        yield page.extract_text() or ""  # Image-only pages have no text layer
+
+# Function to extract text from PDF files
+def extract_text_from_pdf(pdf_file):
+    return "\n".join(iter_pdf_pages(pdf_file))
+
+# Optional on-disk page cache, off unless PAGE_CACHE_DIR is set. Streamlit reruns the script on every
+# click; PAGE_CACHE_TTL is how many seconds a cached page is shown without asking the site (0 = always revalidate)
+page_cache = (
+    HttpCache(os.environ["PAGE_CACHE_DIR"], default_ttl=float(os.getenv("PAGE_CACHE_TTL", "0")))
+    if os.getenv("PAGE_CACHE_DIR") else None
+)
 
 # Function to extract text from web pages
 def extract_text_from_url(url):
-    response = requests.get(url)
+    response = page_cache.get(requests, url) if page_cache else requests.get(url)
     soup = BeautifulSoup(response.content, 'html.parser')
     return ' '.join([p.get_text() for p in soup.find_all('p')])
 
@@ -59,6 +69,8 @@ def main():
         try:
             text = extract_text_from_url(url)
             st.subheader("Extracted Text from URL")
+            if page_cache:
+                st.caption(f"Page cache: {page_cache.stats}")
             st.text_area("Text", text, height=300)
 
             if st.button("Summarize URL"):
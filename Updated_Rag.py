@@ -1,124 +1,367 @@
-import subprocess
 import json
+import argparse
+import time
+import sys
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import httpx
 import numpy as np
-from sklearn.preprocessing import normalize
-import torch
-from transformers import AutoTokenizer, AutoModel
-import os
-import pdfplumber
+from pdf_ingest import iter_pdf_pages
 import faiss
-
-# Silence Hugging Face symlink warning
-os.environ['HF_HUB_DISABLE_SYMLINKS_WARNING'] = '1'
+from answer_cache import SemanticAnswerCache
+from chunking import MAX_CHUNK_TOKENS, SENTENCE_BOUNDARY, ChunkView, benchmark_chunking, chunk_corpus
+from embedders import (EMBEDDER_BACKENDS, benchmark_embedding_batch_sizes, generate_embeddings, get_embedder,
+                       model_name, set_embedder)
+from index_store import (INDEX_TYPES, IndexStore, benchmark_index_types, build_index, file_fingerprint,
+                         make_search_params)
+from ollama_client import OllamaClient, benchmark_ollama, get_ollama_client, send_query_to_ollama
 
 # Load Q&A data from JSON
-file_path = Path('qa_data.json')
-with open(file_path, 'r') as file:
-    qa_data = json.load(file)
-
-documents = [
-    {"question": entry["question"], "answer": entry["answer"]}
-    for entry in qa_data['qa_data']
-]
-print(f"Loaded {len(documents)} Q&A pairs.")
-
-# Chunk text into smaller parts (500 characters max, with overlap)
-def chunk_text(text: str, max_length: int = 500, overlap: int = 50) -> List[str]:
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + max_length, len(text))
-        chunks.append(text[start:end])
-        start += max_length - overlap
-    return chunks
-
-document_chunks = []
-for entry in documents:
-    question_chunks = chunk_text(entry['question'])
-    answer_chunks = chunk_text(entry['answer'])
-    document_chunks.extend(question_chunks)
-    document_chunks.extend(answer_chunks)
-print(f"Created {len(document_chunks)} chunks from the Q&A data.")
+def load_qa_documents(file_path: Path) -> List[dict]:
+    """Load the question/answer pairs from the Q&A JSON file."""
+    with open(file_path, 'r') as file:
+        qa_data = json.load(file)
+    return [
+        {"question": entry["question"], "answer": entry["answer"]}
+        for entry in qa_data['qa_data']
+    ]
 
 # Extract text from PDF using pdfplumber
 def extract_text_from_pdf(pdf_path: str) -> str:
     """Extract text from a PDF file."""
-    with pdfplumber.open(pdf_path) as pdf:
-        text = ''
-        for page in pdf.pages:
-            text += page.extract_text()
-    return text
-
-# Load the PDF file (update the file name here)
-pdf_files = ['qa_data.pdf']  # Pointing to your specific PDF file
-pdf_texts = [extract_text_from_pdf(pdf) for pdf in pdf_files]
-
-# Add PDF texts to document chunks
-for pdf_text in pdf_texts:
-    pdf_chunks = chunk_text(pdf_text)
-    document_chunks.extend(pdf_chunks)
-
-# Initialize Hugging Face model and tokenizer for embeddings
-model_name = 'bert-base-uncased'
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModel.from_pretrained(model_name)
-
-# Generate embeddings for a given text
-def generate_embedding(text: str) -> np.ndarray:
-    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    embeddings = outputs.last_hidden_state.mean(dim=1)  # Average pooling
-    return embeddings.squeeze().cpu().numpy()
-
-# Generate embeddings for all document chunks
-embeddings = []
-for chunk in document_chunks:
-    embedding = generate_embedding(chunk)
-    embeddings.append(embedding)
-
-# Normalize embeddings for similarity search
-embeddings = normalize(embeddings)
-
-# Create FAISS index
-embedding_dim = len(embeddings[0])
-index = faiss.IndexFlatL2(embedding_dim)
-embedding_matrix = np.array(embeddings).astype(np.float32)
-index.add(embedding_matrix)
-
-# Function to send a query to Ollama model (Mistral)
-def send_query_to_ollama(query: str) -> str:
-    command = ["ollama", "run", "mistral", query]
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"Error running Ollama command: {e}")
-        return "Error communicating with the model."
+    return '\n'.join(iter_pdf_pages(pdf_path))
+
+# Stream every source document: each Q&A question/answer and each PDF page is one document
+def iter_corpus(qa_path: Path, pdf_files: Sequence[str], pdf_workers: int = 1) -> Iterator[Tuple[str, str, dict]]:
+    """Yield (doc_id, text, metadata) one document at a time; PDF pages are read as they are consumed."""
+    qa_pairs = load_qa_documents(qa_path)
+    print(f"Loaded {len(qa_pairs)} Q&A pairs.")
+    for pair_id, entry in enumerate(qa_pairs):
+        for field in ("question", "answer"):
+            yield f"qa:{pair_id}:{field}", entry[field], {"source": str(qa_path), "pair_id": pair_id, "field": field}
+
+    for pdf in pdf_files:
+        for page_number, page_text in enumerate(iter_pdf_pages(pdf, workers=pdf_workers), start=1):
+            yield f"{pdf}#page={page_number}", page_text, {"source": str(pdf), "page": page_number}
+
+# Load the whole corpus into memory (for the benchmarks)
+def build_corpus(qa_path: Path, pdf_files: Sequence[str], pdf_workers: int = 1) -> Tuple[Dict[str, str], Dict[str, dict]]:
+    """Return document texts and per-document metadata, both keyed by document id."""
+    documents = {}
+    doc_metadata = {}
+    for doc_id, text, metadata in iter_corpus(qa_path, pdf_files, pdf_workers=pdf_workers):
+        documents[doc_id] = text
+        doc_metadata[doc_id] = metadata
+    return documents, doc_metadata
+
+# Compare the embedding backends against the PyTorch fp32 reference
+def benchmark_embedders(texts: Sequence[str], backends: Sequence[str] = ("torch", "int8", "onnx"),
+                        batch_size: int = 32, num_queries: int = 100, k: int = 10, seed: int = 0) -> dict:
+    """
+    Print, per backend: model size, median single-query latency, batch throughput,
+    mean cosine similarity to the fp32 embeddings and top-k retrieval overlap
+    with fp32 (queries are the first sentence of randomly chosen chunks).
+    """
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(texts), size=min(num_queries, len(texts)), replace=False)
+    queries = [SENTENCE_BOUNDARY.split(texts[i].strip())[0] or texts[i] for i in picks]
+    k = min(k, len(texts))
+
+    results = {}
+    reference = None
+    for backend in backends:
+        try:
+            embedder = EMBEDDER_BACKENDS[backend]()
+        except (ImportError, RuntimeError) as e:
+            print(f"{backend:<6}: unavailable ({e})")
+            continue
+        embedder.embed(texts[:batch_size], batch_size=batch_size)  # Warm-up pass
+
+        latencies = []
+        for query in queries[:50]:
+            start = time.perf_counter()
+            embedder.embed([query], batch_size=1)
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        doc_vectors = embedder.embed(texts, batch_size=batch_size)
+        throughput = len(texts) / (time.perf_counter() - start)
+        query_vectors = embedder.embed(queries, batch_size=batch_size)
+        faiss.normalize_L2(doc_vectors)
+        faiss.normalize_L2(query_vectors)
+        _, found = build_index(doc_vectors).search(query_vectors, k)
+
+        if reference is None:
+            reference = (doc_vectors, found)
+        cosine = float(np.mean(np.sum(doc_vectors * reference[0], axis=1)))
+        overlap = float(np.mean([len(set(f) & set(r)) / k for f, r in zip(found, reference[1])]))
+        results[backend] = {
+            "model_mb": embedder.model_size_bytes() / (1024 * 1024),
+            "p50_ms": 1000 * float(np.median(latencies)),
+            "chunks_per_s": throughput,
+            "cosine_vs_ref": cosine,
+            "overlap_at_k": overlap,
+        }
+
+    print(f"{'backend':<8} {'model MB':>9} {'p50 ms':>8} {'chunks/s':>9} {'cos vs ref':>11} {f'top-{k} overlap':>14}")
+    for backend, row in results.items():
+        print(f"{backend:<8} {row['model_mb']:>9.1f} {row['p50_ms']:>8.2f} {row['chunks_per_s']:>9.1f} "
+              f"{row['cosine_vs_ref']:>11.4f} {row['overlap_at_k']:>14.3f}")
+    return results
+
+@dataclass
+class RetrievedChunk:
+    chunk_id: int
+    text: str
+    score: float  # Cosine similarity of the normalized query and chunk embeddings
+
+# Retrieve the top-k chunks for many queries with one embedding batch and one index search
+def retrieve(queries: Sequence[str], index: faiss.Index, document_chunks: Sequence[str], k: int = 5,
+             nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+             batch_size: int = 32) -> List[List[RetrievedChunk]]:
+    """
+    Return, for each query, up to k chunks ordered from most to least similar.
+
+    All queries are embedded together and searched with a single `index.search`
+    call over the whole query matrix.
+    """
+    if not queries:
+        return []
+    query_matrix = generate_embeddings(queries, batch_size=batch_size)
+    faiss.normalize_L2(query_matrix)  # Match the normalized document embeddings
+    return search_embeddings(query_matrix, index, document_chunks, k=k, nprobe=nprobe, ef_search=ef_search)
+
+# Search already-normalized query embeddings, one row per query
+def search_embeddings(query_matrix: np.ndarray, index: faiss.Index, document_chunks: Sequence[str], k: int = 5,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> List[List[RetrievedChunk]]:
+    params = make_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    distances, indices = index.search(query_matrix, k, params=params)
+    results = []
+    for row_distances, row_indices in zip(distances, indices):
+        # Squared L2 between unit vectors is 2 - 2*cos
+        results.append([
+            RetrievedChunk(chunk_id=int(idx), text=document_chunks[idx], score=1.0 - float(dist) / 2)
+            for dist, idx in zip(row_distances, row_indices)
+            if idx != -1
+        ])
+    return results
+
+# Drop chunks whose text repeats a higher-ranked chunk (ignoring case and whitespace)
+def deduplicate_chunks(hits: List[RetrievedChunk]) -> List[RetrievedChunk]:
+    seen = set()
+    unique = []
+    for hit in hits:
+        key = " ".join(hit.text.lower().split())
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(hit)
+    return unique
+
+# Fill a token budget with the best chunks, skipping any that no longer fit
+def pack_context(hits: List[RetrievedChunk], max_tokens: int = 1500) -> List[RetrievedChunk]:
+    """Token counts use the embedding tokenizer, which is close enough to budget the prompt."""
+    tokenizer = get_embedder().tokenizer
+    packed = []
+    used = 0
+    for hit in sorted(hits, key=lambda h: h.score, reverse=True):
+        tokens = len(tokenizer.encode(hit.text, add_special_tokens=False))
+        if used + tokens > max_tokens:
+            continue
+        packed.append(hit)
+        used += tokens
+    return packed
 
 # Find most relevant document chunk using FAISS
-def faiss_query(query: str, index: faiss.Index, document_chunks: List[str], k: int = 1) -> str:
-    query_embedding = generate_embedding(query)
-    query_embedding = np.array([query_embedding], dtype=np.float32)
-    distances, indices = index.search(query_embedding, k)
-    most_similar_idx = indices[0][0]
-    return document_chunks[most_similar_idx], indices[0][0]
+def faiss_query(query: str, index: faiss.Index, document_chunks: Sequence[str], k: int = 1,
+                nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> str:
+    hits = retrieve([query], index, document_chunks, k=k, nprobe=nprobe, ef_search=ef_search)[0]
+    if not hits:
+        return None, None
+    return hits[0].text, hits[0].chunk_id
+
+# Build the prompt sent to the model for a query and its retrieved context
+def build_prompt(query: str, document_chunk: str) -> str:
+    context = f"Context: {document_chunk}\n\n"
+    return f"{context}Question: {query}\nAnswer:"
+
+# Answer a question end to end: embed, retrieve, pack context, then the cache or the LLM
+def answer_query(query: str, store: IndexStore, answer_cache: Optional[SemanticAnswerCache] = None,
+                 k: int = 5, context_tokens: int = 1500, nprobe: Optional[int] = None,
+                 ef_search: Optional[int] = None,
+                 on_token: Optional[Callable[[str], None]] = None) -> Tuple[str, List[RetrievedChunk], bool]:
+    """
+    Return (answer, context chunks, whether the answer came from the cache).
+
+    Tokens of a freshly generated answer are passed to `on_token` as they stream in.
+    """
+    query_vector = generate_embeddings([query], batch_size=1)
+    faiss.normalize_L2(query_vector)
+    hits = search_embeddings(query_vector, store.index, store.chunks, k=k, nprobe=nprobe, ef_search=ef_search)[0]
+    hits = pack_context(deduplicate_chunks(hits), max_tokens=context_tokens)
+    if not hits:
+        return "No relevant information found.", [], False
+
+    chunk_ids = [hit.chunk_id for hit in hits]
+    if answer_cache is not None:
+        cached = answer_cache.lookup(query_vector[0], chunk_ids)
+        if cached is not None:
+            return cached, hits, True
+
+    prompt = build_prompt(query, "\n\n".join(hit.text for hit in hits))
+    tokens = []
+    try:
+        for token in get_ollama_client().stream(prompt):
+            tokens.append(token)
+            if on_token:
+                on_token(token)
+    except (httpx.HTTPError, RuntimeError) as e:
+        print(f"Error calling the Ollama API: {e}")
+        return "Error communicating with the model.", hits, False
+    answer = "".join(tokens).strip()
+    if answer_cache is not None:
+        answer_cache.store(query_vector[0], chunk_ids, answer)
+    return answer, hits, False
 
 # Generate contextual answer using Ollama
 def generate_contextual_answer(query: str, document_chunk: str, source_idx: int) -> str:
-    context = f"Context: {document_chunk}\n\n"
-    prompt = f"{context}Question: {query}\nAnswer:"
-    response = send_query_to_ollama(prompt)
+    response = send_query_to_ollama(build_prompt(query, document_chunk))
     return response, source_idx
 
-# Example query
-query = "Who painted the Mona Lisa?"
-response, source_idx = faiss_query(query, index, document_chunks)
+def main():
+    parser = argparse.ArgumentParser(description="Answer questions over the Q&A data with FAISS + Ollama.")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks per embedding forward pass.")
+    parser.add_argument("--benchmark", action="store_true", help="Report embedding chunks/sec for batch sizes 1, 8, 32 and 128.")
+    parser.add_argument("--embedder", choices=sorted(EMBEDDER_BACKENDS), default="torch", help="Embedding backend: PyTorch fp32, dynamic int8 or ONNX Runtime.")
+    parser.add_argument("--benchmark-embedders", action="store_true", help="Compare latency, throughput, model size and retrieval agreement of the embedding backends.")
+    parser.add_argument("--benchmark-chunking", action="store_true", help="Report chunking throughput of the character and token chunkers on a ~20 MB corpus.")
+    parser.add_argument("--max-chunk-tokens", type=int, default=MAX_CHUNK_TOKENS, help="Largest chunk, in embedder tokens.")
+    parser.add_argument("--overlap-tokens", type=int, default=32, help="Tokens of trailing sentences repeated at the start of the next chunk.")
+    parser.add_argument("--index-dir", type=Path, default=Path("rag_index"), help="Where the FAISS index and embedding cache are saved.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index from the source files from scratch (cached embeddings are still reused).")
+    parser.add_argument("--upsert", type=Path, default=None, help="JSON object of {doc_id: text} to add or replace in the saved index.")
+    parser.add_argument("--delete", action="append", default=[], metavar="DOC_ID", help="Remove a document from the saved index (repeatable).")
+    parser.add_argument("--pdf-workers", type=int, default=1, help="Processes used to extract PDF pages in parallel.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat", help="FAISS index: exact flat, or approximate IVF-Flat, HNSW or IVF-PQ.")
+    parser.add_argument("--nlist", type=int, default=None, help="Inverted lists for the IVF index types (default ~4*sqrt(n)).")
+    parser.add_argument("--nprobe", type=int, default=None, help="Inverted lists visited per query (IVF index types).")
+    parser.add_argument("--ef-search", type=int, default=None, help="Candidate list size per query (HNSW).")
+    parser.add_argument("--benchmark-index", action="store_true", help="Report recall@10 vs. latency of each index type against the flat index.")
+    parser.add_argument("--top-k", type=int, default=5, help="Chunks retrieved per query.")
+    parser.add_argument("--context-tokens", type=int, default=1500, help="Token budget for the retrieved context in the prompt.")
+    parser.add_argument("--ollama-concurrency", type=int, default=4, help="Maximum Ollama requests in flight at once.")
+    parser.add_argument("--benchmark-ollama", action="store_true", help="Report time-to-first-token and throughput of the Ollama client against a fake local server.")
+    parser.add_argument("--cache-threshold", type=float, default=0.95, help="Cosine similarity at which a cached answer is reused.")
+    parser.add_argument("--cache-ttl", type=float, default=3600.0, help="Seconds a cached answer stays valid.")
+    parser.add_argument("--interactive", action="store_true", help="Answer questions read from stdin, reusing cached answers for near-duplicates.")
+    parser.add_argument("--queries-file", type=Path, default=None, help="Retrieve for every line of this file and print JSON lines instead of answering.")
+    args = parser.parse_args()
+
+    if args.benchmark_ollama:
+        benchmark_ollama()
+        return
+
+    global _ollama_client
+    _ollama_client = OllamaClient(max_concurrency=args.ollama_concurrency)
+
+    qa_path = Path('qa_data.json')
+    # Load the PDF file (update the file name here)
+    pdf_files = ['qa_data.pdf']  # Pointing to your specific PDF file
+
+    set_embedder(args.embedder)
+
+    if args.benchmark or args.benchmark_chunking or args.benchmark_embedders:
+        documents, _ = build_corpus(qa_path, pdf_files, pdf_workers=args.pdf_workers)
+        if args.benchmark_embedders:
+            spans = chunk_corpus(documents, max_tokens=args.max_chunk_tokens, overlap_tokens=args.overlap_tokens)
+            benchmark_embedders(list(ChunkView(documents, spans)), batch_size=args.batch_size)
+        if args.benchmark_chunking:
+            benchmark_chunking(documents)
+        if args.benchmark:
+            spans = chunk_corpus(documents, max_tokens=args.max_chunk_tokens, overlap_tokens=args.overlap_tokens)
+            benchmark_embedding_batch_sizes(ChunkView(documents, spans))
+        return
+
+    sources = {str(path): file_fingerprint(path) for path in [qa_path, *pdf_files]}
+    config = {
+        "model_name": model_name,
+        "embedder": args.embedder,
+        "chunking": {"max_tokens": args.max_chunk_tokens, "overlap_tokens": args.overlap_tokens},
+        "index": {"index_type": args.index_type, "nlist": args.nlist},
+    }
+
+    store = IndexStore(args.index_dir)
+    loaded = store.load() and not args.rebuild
+    if loaded and store.is_current(sources, config):
+        print(f"Loaded index with {store.index.ntotal} chunks from {args.index_dir}.")
+    elif loaded and store.config == config:
+        # Only the source files changed: update just the documents that differ
+        store.sync(iter_corpus(qa_path, pdf_files, pdf_workers=args.pdf_workers), sources, batch_size=args.batch_size)
+        print(f"Updated index to {store.index.ntotal} chunks in {args.index_dir}.")
+    else:
+        store.rebuild(iter_corpus(qa_path, pdf_files, pdf_workers=args.pdf_workers), sources, config,
+                      batch_size=args.batch_size)
+        print(f"Saved index with {store.index.ntotal} chunks to {args.index_dir}.")
+
+    if args.upsert or args.delete:
+        if args.upsert:
+            with open(args.upsert, 'r', encoding='utf-8') as f:
+                store.upsert_documents(json.load(f), batch_size=args.batch_size)
+        if args.delete:
+            print(f"Deleted {store.delete_documents(args.delete)} chunks.")
+        store.save()
+    index, document_chunks = store.index, store.chunks
+
+    if args.benchmark_index:
+        benchmark_index_types(store.embeddings)
+        return
+
+    if args.queries_file:
+        with open(args.queries_file, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+        all_hits = retrieve(queries, index, document_chunks, k=args.top_k, nprobe=args.nprobe,
+                            ef_search=args.ef_search, batch_size=args.batch_size)
+        for query, hits in zip(queries, all_hits):
+            hits = deduplicate_chunks(hits)
+            print(json.dumps({"query": query, "hits": [
+                {"chunk_id": h.chunk_id, "score": h.score, "doc_id": store.spans[h.chunk_id].doc_id,
+                 "start": store.spans[h.chunk_id].start, "end": store.spans[h.chunk_id].end}
+                for h in hits
+            ]}))
+        return
+
+    answer_cache = SemanticAnswerCache(threshold=args.cache_threshold, ttl=args.cache_ttl)
+    store.removal_listeners.append(answer_cache.invalidate_chunks)
+
+    def ask(query: str):
+        print("Final Response: ", end="", flush=True)
+        streamed = []
+        answer, hits, cached = answer_query(
+            query, store, answer_cache, k=args.top_k, context_tokens=args.context_tokens,
+            nprobe=args.nprobe, ef_search=args.ef_search,
+            on_token=lambda token: (streamed.append(token), print(token, end="", flush=True)),
+        )
+        if cached:
+            print(f"{answer} (cached)")
+        elif not streamed:
+            print(answer)  # No context found, or the model call failed before any token arrived
+        else:
+            print()
+        for hit in hits:
+            span = store.spans[hit.chunk_id]
+            print(f"Source: {span.doc_id} [{span.start}:{span.end}] (score {hit.score:.3f})")
+
+    if args.interactive:
+        print("Ask a question (empty line to quit).")
+        for line in sys.stdin:
+            if not line.strip():
+                break
+            ask(line.strip())
+        print(f"Answer cache: {answer_cache.stats()}")
+        return
+
+    # Example query
+    ask("Who painted the Mona Lisa?")
 
-if response:
-    final_response, source_idx = generate_contextual_answer(query, response, source_idx)
-    print(f"Final Response: {final_response}")
-else:
-    print("No relevant information found.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+# Answers cached by query embedding, invalidated when their source chunks change.
+
+@dataclass
+class _CachedAnswer:
+    query_vector: np.ndarray
+    chunk_ids: frozenset
+    answer: str
+    created: float
+
+class SemanticAnswerCache:
+    """
+    LLM answers keyed by the normalized query embedding and the chunks used as context.
+
+    A lookup hits when an earlier query with cosine similarity >= `threshold`
+    was answered from exactly the same set of chunks. Entries are evicted
+    least-recently-used beyond `max_entries` and expire after `ttl` seconds;
+    `invalidate_chunks` drops every answer that used a changed chunk.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1024, ttl: Optional[float] = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, _CachedAnswer]" = OrderedDict()
+        self._by_chunks: Dict[frozenset, set] = {}
+        self._by_chunk_id: Dict[int, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, query_vector: np.ndarray, chunk_ids: Iterable[int]) -> Optional[str]:
+        key = frozenset(chunk_ids)
+        now = time.monotonic()
+        with self._lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_chunks.get(key, ())):
+                entry = self._entries[entry_id]
+                if self.ttl is not None and now - entry.created > self.ttl:
+                    self._remove(entry_id)
+                    self.evictions += 1
+                    continue
+                score = float(np.dot(entry.query_vector, query_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].answer
+
+    def store(self, query_vector: np.ndarray, chunk_ids: Iterable[int], answer: str):
+        key = frozenset(chunk_ids)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _CachedAnswer(np.array(query_vector, dtype=np.float32), key, answer, time.monotonic())
+            self._by_chunks.setdefault(key, set()).add(entry_id)
+            for chunk_id in key:
+                self._by_chunk_id.setdefault(chunk_id, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_chunks(self, chunk_ids: Iterable[int]) -> int:
+        """Drop every answer generated from any of these chunks; returns how many were dropped."""
+        with self._lock:
+            stale = set()
+            for chunk_id in chunk_ids:
+                stale |= self._by_chunk_id.get(chunk_id, set())
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        group = self._by_chunks[entry.chunk_ids]
+        group.discard(entry_id)
+        if not group:
+            del self._by_chunks[entry.chunk_ids]
+        for chunk_id in entry.chunk_ids:
+            ids = self._by_chunk_id[chunk_id]
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_chunk_id[chunk_id]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
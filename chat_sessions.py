@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List
+from gemini_client import turn
+
+# Per-user chat state for the chatbots. Each session keeps its own history,
+# bounded by a token budget: once a session goes over it, the oldest
+# exchanges are dropped (and, if enabled, folded into a running summary), so
+# the prompt sent to the model stops growing. Idle sessions expire after
+# idle_ttl seconds and the least recently used ones are evicted beyond
+# max_sessions.
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below between a patient and a medical assistant in at most {words} words. "
+    "Keep every medically relevant fact (patient details, symptoms, durations, medications, answers given "
+    "and advice already offered) and leave out everything else.\n\n"
+    "{previous}{conversation}"
+)
+
+# Function to estimate tokens without a model call (about 4 characters per token for English)
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def _deep_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_deep_size(item) for item in obj)
+    return size
+
+@dataclass
+class ChatSession:
+    session_id: str
+    history: List[Dict] = field(default_factory=list)
+    summary: str = ""
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    async_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def contents(self, text: str) -> List[Dict]:
+        """The turns to send for a new user message: summary, kept history, then the message."""
+        prefix = []
+        if self.summary:
+            prefix = [turn("user", f"Summary of our conversation so far: {self.summary}"), turn("model", "Understood.")]
+        return prefix + self.history + [turn("user", text)]
+
+    def record(self, text: str, reply: str):
+        self.history += [turn("user", text), turn("model", reply)]
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(t["parts"][0]["text"]) for t in self.history)
+
+    def memory_bytes(self) -> int:
+        return _deep_size(self.history) + sys.getsizeof(self.summary)
+
+class SessionManager:
+    """
+    Chat sessions keyed by session id, in least-recently-used order.
+
+    A session over token_budget drops its oldest exchanges until it is back
+    under token_budget * compact_to (the most recent exchange is always
+    kept). With summarize=True the dropped exchanges are folded into the
+    session summary with one extra model call, made in the background after
+    the reply has been returned; otherwise they are discarded.
+
+    Session ids are only ever issued here, so an id is what authorizes access
+    to its chat; report() therefore lists no ids.
+    """
+
+    def __init__(self, max_sessions=1000, idle_ttl=1800.0, token_budget=3000, compact_to=0.5, summarize=True,
+                 summary_words=150):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_budget = token_budget
+        self.compact_to = compact_to
+        self.summarize = summarize
+        self.summary_words = summary_words
+        self.sessions = OrderedDict()
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._tasks = set()  # Background summaries, referenced until they finish
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id=None) -> ChatSession:
+        """
+        Return the session with this id. No id, or an unknown or expired one,
+        starts a new session under a fresh id (ids chosen by clients are never
+        adopted), so callers must carry on with the returned session's id.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self.sessions.get(session_id) if session_id else None
+            if session is None:
+                session = ChatSession(self.new_id())
+                self.sessions[session.session_id] = session
+            else:
+                self.sessions.move_to_end(session_id)
+            session.last_used = now
+            self._evict(now)
+            return session
+
+    def end(self, session_id) -> bool:
+        with self._lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def _evict(self, now):
+        # Sessions are kept in last-used order, so expired ones are at the front
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if now - oldest.last_used <= self.idle_ttl and len(self.sessions) <= self.max_sessions:
+                break
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+
+    def compact(self, session: ChatSession) -> List[Dict]:
+        """Drop the oldest exchanges of an over-budget session; returns the dropped turns."""
+        if session.tokens() <= self.token_budget:
+            return []
+        target = self.token_budget * self.compact_to
+        dropped = []
+        while len(session.history) > 2 and session.tokens() > target:
+            dropped += session.history[:2]
+            session.history = session.history[2:]
+        return dropped
+
+    def summary_request(self, session: ChatSession, dropped: List[Dict]) -> str:
+        previous = f"Earlier summary: {session.summary}\n\n" if session.summary else ""
+        conversation = "\n".join(f"{t['role']}: {t['parts'][0]['text']}" for t in dropped)
+        return SUMMARY_PROMPT.format(words=self.summary_words, previous=previous, conversation=conversation)
+
+    def send(self, session: ChatSession, text: str, generate, summary_generate=None) -> str:
+        """
+        Send a message in a session from get() with a blocking
+        generate(contents) -> str (Streamlit apps). Dropped turns are summarized
+        in a background thread, with summary_generate if given (e.g. to bypass
+        a response cache).
+        """
+        with session.lock:
+            reply = generate(session.contents(text))
+            session.record(text, reply)
+            dropped = self.compact(session)
+        if dropped and self.summarize:
+            threading.Thread(target=self._summarize, args=(session, dropped, summary_generate or generate),
+                             daemon=True).start()
+        return reply
+
+    def _summarize(self, session: ChatSession, dropped: List[Dict], generate):
+        try:
+            with session.lock:
+                session.summary = generate(self.summary_request(session, dropped)).strip()
+        except Exception as e:
+            print(f"[Error] Failed to summarize session {session.session_id}, older turns dropped: {e}")
+
+    async def send_async(self, session: ChatSession, text: str, generate, summary_generate=None) -> str:
+        """
+        Send a message in a session from get() with an async
+        generate(contents) -> str (FastAPI services). Dropped turns are
+        summarized in a background task, with summary_generate if given.
+        """
+        async with session.async_lock:
+            reply = await generate(session.contents(text))
+            session.record(text, reply)
+            dropped = self.compact(session)
+        if dropped and self.summarize:
+            self._summarize_later(session, dropped, summary_generate or generate)
+        return reply
+
+    def stream(self, session: ChatSession, text: str, stream, summary_generate=None):
+        """
+        Like send(), but with stream(contents) yielding text chunks, which are
+        passed on as they arrive. The exchange is recorded once the answer is
+        complete and the generator ends right there; dropped turns are then
+        summarized in a background thread with the blocking
+        summary_generate(contents) -> str, or by joining stream() if none is given.
+
+        The session lock is not held while chunks are yielded, so a reader that
+        stops early leaves the session unlocked (and the exchange unrecorded).
+        """
+        with session.lock:
+            contents = session.contents(text)
+        parts = []
+        for chunk in stream(contents):
+            parts.append(chunk)
+            yield chunk
+        with session.lock:
+            session.record(text, "".join(parts).strip())
+            dropped = self.compact(session)
+        if dropped and self.summarize:
+            generate = summary_generate or (lambda contents: "".join(stream(contents)))
+            threading.Thread(target=self._summarize, args=(session, dropped, generate), daemon=True).start()
+
+    async def stream_async(self, session: ChatSession, text: str, stream, summary_generate=None):
+        """
+        Async version of stream(). Summarizing dropped turns runs as a
+        background task, so the response can end as soon as the answer does;
+        summary_generate is an async generate(contents) -> str.
+        """
+        async with session.async_lock:
+            contents = session.contents(text)
+        parts = []
+        async for chunk in stream(contents):
+            parts.append(chunk)
+            yield chunk
+        async with session.async_lock:
+            session.record(text, "".join(parts).strip())
+            dropped = self.compact(session)
+        if dropped and self.summarize:
+            async def generate(contents):
+                return "".join([chunk async for chunk in stream(contents)])
+            self._summarize_later(session, dropped, summary_generate or generate)
+
+    def _summarize_later(self, session: ChatSession, dropped: List[Dict], generate):
+        task = asyncio.create_task(self._summarize_async(session, dropped, generate))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarize_async(self, session: ChatSession, dropped: List[Dict], generate):
+        try:
+            async with session.async_lock:
+                session.summary = (await generate(self.summary_request(session, dropped))).strip()
+        except Exception as e:
+            print(f"[Error] Failed to summarize session {session.session_id}, older turns dropped: {e}")
+
+    def report(self):
+        """Totals over the live sessions (no session ids: holding an id is what grants access to a chat)."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            live = list(self.sessions.values())
+            tokens = [s.tokens() for s in live]
+            return {
+                "sessions": len(live),
+                "evicted": self.evicted,
+                "summarized": sum(bool(s.summary) for s in live),
+                "total_turns": sum(len(s.history) for s in live),
+                "total_tokens": sum(tokens),
+                "max_tokens": max(tokens, default=0),
+                "total_memory_bytes": sum(s.memory_bytes() for s in live),
+                "oldest_idle_seconds": round(now - live[0].last_used, 1) if live else 0.0,
+            }
+
+_shared_managers: Dict[tuple, SessionManager] = {}
+_shared_managers_lock = threading.Lock()
+
+# Function to get the SessionManager shared by every browser session of a Streamlit app
+def shared_sessions(**settings) -> SessionManager:
+    """
+    One manager per settings for the whole process. Streamlit re-runs the app
+    script on every interaction but imports this module once, so the
+    sessions outlive the reruns, as with st.cache_resource.
+    """
+    key = tuple(sorted(settings.items()))
+    with _shared_managers_lock:
+        if key not in _shared_managers:
+            _shared_managers[key] = SessionManager(**settings)
+        return _shared_managers[key]
+
+# Function to show text chunks in one Streamlit placeholder as they arrive; returns the full text
+def render_stream(chunks):
+    import streamlit as st  # Imported here so the FastAPI services never need Streamlit
+    placeholder = st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(text + " ▌")
+    placeholder.markdown(text)
+    return text
+
+def simulate_prompt_growth(turns=200, token_budget=3000, summarize=True, answer_chars=1200):
+    """Chat `turns` times in one session with a stand-in model; prints prompt size bounded vs unbounded."""
+    question = "I have had a dry cough and a mild fever for three days, what could it be? "
+
+    def generate(contents):
+        if isinstance(contents, str):  # Summary request
+            return "Patient reports dry cough and mild fever for several days; advised rest and fluids. " * 4
+        return "Possible causes include a viral infection. " * (answer_chars // 43)
+
+    def count(contents):
+        return sum(estimate_tokens(t["parts"][0]["text"]) for t in contents)
+
+    manager = SessionManager(token_budget=token_budget, summarize=summarize)
+    session = manager.get()
+    unbounded = ChatSession("unbounded")
+    print(f"{'turn':>5} {'bounded prompt tokens':>22} {'unbounded prompt tokens':>24}")
+    for i in range(1, turns + 1):
+        text = f"{question}({i})"
+        bounded_prompt = session.contents(text)
+        unbounded_prompt = unbounded.contents(text)
+        manager.send(session, text, generate)
+        unbounded.record(text, generate(unbounded_prompt))
+        if i in (1, 10, 50, 100, turns):
+            print(f"{i:>5} {count(bounded_prompt):>22} {count(unbounded_prompt):>24}")
+    print(f"Session memory: {session.memory_bytes() / 1024:.1f} KiB bounded, "
+          f"{unbounded.memory_bytes() / 1024:.1f} KiB unbounded")
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the session token budget keeps prompts flat.")
+    parser.add_argument("--turns", type=int, default=200, help="Messages to send in one simulated session.")
+    parser.add_argument("--token-budget", type=int, default=3000, help="Token budget per session.")
+    parser.add_argument("--truncate", action="store_true", help="Drop old turns instead of summarizing them.")
+    args = parser.parse_args()
+    simulate_prompt_growth(args.turns, args.token_budget, summarize=not args.truncate)
+
+if __name__ == "__main__":
+    main()
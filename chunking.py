@@ -0,0 +1,179 @@
+import re
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from embedders import get_embedder
+
+# Splitting documents into chunks: fixed character windows, and token-bounded
+# chunks on sentence boundaries that are kept as spans into their documents.
+
+# Chunk a stream of text pieces (e.g. PDF pages) without joining them first
+def chunk_stream(pieces: Iterable[str], max_length: int = 500, overlap: int = 50) -> Iterator[str]:
+    """
+    Yield overlapping windows of at most max_length characters over the pieces
+    joined with newlines, holding at most one window plus one piece in memory.
+    A trailing window is skipped if it lies entirely inside the previous one.
+    """
+    if not 0 <= overlap < max_length:
+        raise ValueError("overlap must be at least 0 and smaller than max_length")
+    step = max_length - overlap
+    buffer = ''
+    start = 0  # Where the next window begins; the buffer is only trimmed when a piece is appended
+    unseen = 0  # Characters at the end of the buffer not yet part of any chunk
+    started = False
+    for piece in pieces:
+        if started:
+            piece = '\n' + piece
+        started = True
+        buffer = buffer[start:] + piece
+        start = 0
+        unseen += len(piece)
+        while len(buffer) - start >= max_length:
+            yield buffer[start:start + max_length]
+            unseen = len(buffer) - start - max_length
+            start += step
+    if unseen:
+        yield buffer[start:]
+
+# Chunk text into smaller parts (500 characters max, with overlap)
+def chunk_text(text: str, max_length: int = 500, overlap: int = 50) -> List[str]:
+    return list(chunk_stream([text], max_length=max_length, overlap=overlap))
+
+# Largest chunk the embedder sees in full: 512 positions minus [CLS] and [SEP]
+MAX_CHUNK_TOKENS = 510
+
+# Paragraph breaks, and whitespace following sentence-ending punctuation
+SENTENCE_BOUNDARY = re.compile(r'\n\s*\n|(?<=[.!?])\s+')
+
+@dataclass(frozen=True)
+class ChunkSpan:
+    doc_id: str
+    start: int
+    end: int
+
+class ChunkView(Sequence):
+    """
+    List-like access to chunk texts, sliced from the source documents on demand.
+
+    `spans` is either a list of spans or a dict of spans keyed by chunk id; in
+    both cases `view[i]` is the text of chunk i.
+    """
+
+    def __init__(self, documents: Dict[str, str], spans):
+        self.documents = documents
+        self.spans = spans
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        span = self.spans[i]
+        return self.documents[span.doc_id][span.start:span.end]
+
+    def __iter__(self):
+        spans = self.spans.values() if isinstance(self.spans, dict) else self.spans
+        for span in spans:
+            yield self.documents[span.doc_id][span.start:span.end]
+
+# Character offsets of the embedder's tokens in each text (no special tokens, no truncation)
+def token_offsets(texts: List[str]) -> List[List[Tuple[int, int]]]:
+    encoding = get_embedder().tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                         return_attention_mask=False, return_token_type_ids=False, verbose=False)
+    return encoding["offset_mapping"]
+
+# Split one document into token-bounded chunks on sentence and paragraph boundaries
+def chunk_document(doc_id: str, text: str, max_tokens: int = MAX_CHUNK_TOKENS,
+                   overlap_tokens: int = 32, offsets: Optional[List[Tuple[int, int]]] = None) -> List[ChunkSpan]:
+    """
+    Return (doc_id, start, end) character spans of at most max_tokens embedder tokens.
+
+    Whole sentences are packed greedily; consecutive chunks share trailing
+    sentences worth up to overlap_tokens. A sentence longer than max_tokens is
+    split on token boundaries. `offsets` are the token character offsets of
+    `text`, if the caller has already tokenized it.
+    """
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be at least 0 and smaller than max_tokens")
+    if offsets is None:
+        offsets = token_offsets([text])[0]
+    if not offsets:
+        return []
+    token_starts = [start for start, _ in offsets]
+
+    def count_tokens(start: int, end: int) -> int:
+        return bisect_left(token_starts, end) - bisect_left(token_starts, start)
+
+    sentences = []
+    position = 0
+    for boundary in SENTENCE_BOUNDARY.finditer(text):
+        if boundary.start() > position:
+            sentences.append((position, boundary.start()))
+        position = boundary.end()
+    if position < len(text):
+        sentences.append((position, len(text)))
+    sentences = [(start, end) for start, end in sentences if count_tokens(start, end)]
+
+    spans = []
+    i = 0
+    while i < len(sentences):
+        chunk_start = sentences[i][0]
+        j = i
+        while j < len(sentences) and count_tokens(chunk_start, sentences[j][1]) <= max_tokens:
+            j += 1
+        if j == i:
+            # A single over-long sentence: fall back to fixed token windows
+            first = bisect_left(token_starts, sentences[i][0])
+            last = bisect_left(token_starts, sentences[i][1])
+            for t in range(first, last, max_tokens - overlap_tokens):
+                window_end = min(t + max_tokens, last)
+                spans.append(ChunkSpan(doc_id, offsets[t][0], offsets[window_end - 1][1]))
+                if window_end == last:
+                    break
+            i += 1
+            continue
+        chunk_end = sentences[j - 1][1]
+        spans.append(ChunkSpan(doc_id, chunk_start, chunk_end))
+        if j == len(sentences):
+            break
+        # Start the next chunk on the trailing sentences that fit in the overlap
+        k = j
+        while k - 1 > i and count_tokens(sentences[k - 1][0], chunk_end) <= overlap_tokens:
+            k -= 1
+        i = k
+    return spans
+
+# Chunk every document of the corpus, tokenizing documents in batches
+def chunk_corpus(documents: Dict[str, str], max_tokens: int = MAX_CHUNK_TOKENS,
+                 overlap_tokens: int = 32, batch_size: int = 64) -> List[ChunkSpan]:
+    spans = []
+    items = list(documents.items())
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        for (doc_id, text), offsets in zip(batch, token_offsets([text for _, text in batch])):
+            spans.extend(chunk_document(doc_id, text, max_tokens=max_tokens,
+                                        overlap_tokens=overlap_tokens, offsets=offsets))
+    return spans
+
+# Compare chunking throughput of the character chunker and the token-aware chunker
+def benchmark_chunking(documents: Dict[str, str], target_mb: float = 20.0) -> dict:
+    """Repeat the corpus up to about target_mb of text and report MB/s and chunks/s."""
+    corpus_bytes = sum(len(text.encode('utf-8')) for text in documents.values()) or 1
+    repeats = max(1, int(target_mb * 1024 * 1024 / corpus_bytes))
+    large = {f"{doc_id}#copy={r}": text for r in range(repeats) for doc_id, text in documents.items()}
+    size_mb = corpus_bytes * repeats / (1024 * 1024)
+
+    results = {}
+    for name, run in (
+        ("chars", lambda: [chunk for text in large.values() for chunk in chunk_text(text)]),
+        ("tokens", lambda: chunk_corpus(large)),
+    ):
+        start = time.perf_counter()
+        chunks = run()
+        elapsed = time.perf_counter() - start
+        results[name] = {"mb_per_s": size_mb / elapsed, "chunks_per_s": len(chunks) / elapsed}
+        print(f"{name:<6}: {size_mb:.1f} MB in {elapsed:.2f}s = {size_mb / elapsed:6.2f} MB/s, "
+              f"{len(chunks) / elapsed:9.1f} chunks/s ({len(chunks)} chunks)")
+    return results
@@ -0,0 +1,356 @@
+import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import re
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# A crawl frontier shared by scraper processes on one machine. URLs are
+# normalized and deduplicated, handed out by priority, and spaced per host;
+# all state lives in one SQLite database (WAL mode), so any number of worker
+# processes can claim from it without fetching the same page twice.
+
+# amazon.com, www.amazon.co.uk, smile.amazon.de, ...
+AMAZON_HOST = re.compile(r"(?:^|\.)amazon\.(?:com|[a-z]{2}|co\.[a-z]{2}|com\.[a-z]{2})$")
+
+# Query parameters that only track where a click came from, on any site
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "dclid", "yclid", "mc_cid", "mc_eid", "_gl", "_ga"}
+TRACKING_PREFIXES = ("utm_", "hsa_")
+
+# Tracking parameters of particular sites, keyed by a pattern their host must match. Names such as
+# tag, ref or sr select content elsewhere, so they are only dropped on these hosts.
+SITE_TRACKING_PARAMS = [
+    (AMAZON_HOST, {
+        "ref", "ref_", "tag", "content-id", "sp_csd", "psc", "smid", "spla", "sr", "qid", "crid", "sprefix",
+        "dib", "dib_tag",
+    }, ("pd_rd_", "pf_rd_")),
+    (re.compile(r"(?:^|\.)rab\.equipment$"), {"queryid", "objectid", "indexname"}, ()),  # Search click-through
+    (re.compile(r"(?:^|\.)fjallraven\.com$"), set(), ("_t_",)),  # Search hit tracking
+]
+
+# Amazon product URLs: /<slug>/dp/<ASIN>/ref=... -> /dp/<ASIN>
+AMAZON_PRODUCT = re.compile(r"^(?:/[^/]+)?/(?:dp|gp/product)/([A-Z0-9]{10})(?:[/?]|$)")
+
+def normalize_url(url):
+    """
+    Canonical form of a URL for deduplication: lower-case scheme and host,
+    no default port, no fragment, no tracking parameters (site-specific ones
+    only on their own site), remaining query parameters sorted, and Amazon
+    product paths reduced to /dp/<ASIN>.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    path = parts.path or "/"
+    params, prefixes = set(TRACKING_PARAMS), TRACKING_PREFIXES
+    for pattern, site_params, site_prefixes in SITE_TRACKING_PARAMS:
+        if pattern.search(parts.hostname or ""):
+            params |= site_params
+            prefixes += site_prefixes
+    if AMAZON_HOST.search(parts.hostname or ""):
+        match = AMAZON_PRODUCT.match(path)
+        if match:
+            path = f"/dp/{match.group(1)}"
+        # Path segments like /ref=sspa_dk_detail_0 are tracking too
+        path = "/".join(segment for segment in path.split("/") if not segment.startswith("ref=")) or "/"
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in params and not key.lower().startswith(prefixes)
+    ]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ""))
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings, sized for `capacity` items at `error_rate` false positives."""
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    host TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending, in_progress, done, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    claimed_at REAL,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_pending ON urls (state, priority DESC, id);
+CREATE TABLE IF NOT EXISTS hosts (
+    host TEXT PRIMARY KEY,
+    next_allowed REAL NOT NULL
+);
+"""
+
+class CrawlFrontier:
+    """
+    The SQLite-backed queue of URLs to crawl.
+
+    The UNIQUE url column is what guarantees each page is fetched once
+    across processes; the in-process Bloom filter just keeps known
+    duplicates away from the database. Claiming a URL and pushing back its
+    host's next allowed fetch time happen in one write transaction, so two
+    processes never hit the same host inside its politeness delay.
+    """
+
+    def __init__(self, path="frontier.db", default_delay=2.0, host_delays=None, max_attempts=3,
+                 bloom_capacity=1_000_000, bloom_error_rate=0.001, exact_dedup=False):
+        self.path = path
+        self.default_delay = default_delay
+        self.host_delays = dict(host_delays or {})
+        self.max_attempts = max_attempts
+        self.exact_dedup = exact_dedup
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.db = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        for (url,) in self.db.execute("SELECT url FROM urls"):
+            self.bloom.add(url)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, url, priority=0) -> bool:
+        """Queue url unless an equivalent URL was seen before; returns True if it was new."""
+        return self.add_many([url], priority) == 1
+
+    def add_many(self, urls: Iterable[str], priority=0) -> int:
+        """Queue new URLs in one transaction; returns how many were new."""
+        rows = []
+        for url in urls:
+            url = normalize_url(url)
+            # A Bloom hit may be a false positive; exact_dedup settles it in the database instead of skipping
+            if url in self.bloom and not self.exact_dedup:
+                continue
+            self.bloom.add(url)
+            rows.append((url, urlsplit(url).hostname or "", priority, time.time()))
+        if not rows:
+            return 0
+        with self._write():
+            before = self.db.total_changes
+            self.db.executemany(
+                "INSERT OR IGNORE INTO urls (url, host, priority, added_at) VALUES (?, ?, ?, ?)", rows
+            )
+            return self.db.total_changes - before
+
+    @contextmanager
+    def _write(self):
+        """A write transaction that takes the database lock up front (BEGIN IMMEDIATE)."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def claim(self) -> Optional[Tuple[int, str]]:
+        """Claim the highest-priority pending URL whose host may be fetched now; returns (id, url) or None."""
+        with self._write():
+            now = time.time()  # Read after the lock is held, or a waiting process would use a stale clock
+            row = self.db.execute(
+                """
+                SELECT u.id, u.url, u.host FROM urls u LEFT JOIN hosts h ON h.host = u.host
+                WHERE u.state = 'pending' AND (h.next_allowed IS NULL OR h.next_allowed <= ?)
+                ORDER BY u.priority DESC, u.id LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            url_id, url, host = row
+            self.db.execute(
+                "UPDATE urls SET state = 'in_progress', claimed_by = ?, claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (self.worker_id, now, url_id),
+            )
+            self.db.execute(
+                "INSERT INTO hosts (host, next_allowed) VALUES (?, ?) "
+                "ON CONFLICT(host) DO UPDATE SET next_allowed = excluded.next_allowed",
+                (host, now + self.host_delays.get(host, self.default_delay)),
+            )
+        return url_id, url
+
+    def claim_batch(self, limit) -> List[Tuple[int, str]]:
+        """Claim up to limit URLs that are ready now (at most one per host, given the politeness delay)."""
+        batch = []
+        while len(batch) < limit:
+            claimed = self.claim()
+            if claimed is None:
+                break
+            batch.append(claimed)
+        return batch
+
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until some pending URL's host becomes available, or None when nothing is pending."""
+        row = self.db.execute(
+            """
+            SELECT MIN(COALESCE(h.next_allowed, 0)) FROM urls u LEFT JOIN hosts h ON h.host = u.host
+            WHERE u.state = 'pending'
+            """
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(row[0] - time.time(), 0.0)
+
+    def complete(self, url_id):
+        with self._write():
+            self.db.execute("UPDATE urls SET state = 'done' WHERE id = ?", (url_id,))
+
+    def fail(self, url_id, retry=True):
+        """Put a failed URL back in the queue, or give up on it after max_attempts claims (at once without retry)."""
+        with self._write():
+            self.db.execute(
+                "UPDATE urls SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END WHERE id = ?",
+                (self.max_attempts if retry else 0, url_id),
+            )
+
+    def requeue_stale(self, timeout=600.0) -> int:
+        """Return URLs claimed more than timeout seconds ago (by a worker that died) to the queue."""
+        with self._write():
+            cursor = self.db.execute(
+                "UPDATE urls SET state = 'pending' WHERE state = 'in_progress' AND claimed_at < ?",
+                (time.time() - timeout,),
+            )
+            return cursor.rowcount
+
+    def stats(self):
+        counts = dict(self.db.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+        return {state: counts.get(state, 0) for state in ("pending", "in_progress", "done", "failed")}
+
+class PermanentFailure:
+    """
+    A falsy scrape result for a URL that no retry can fix (e.g. no store
+    matches it); drain marks the URL failed without requeueing it.
+    """
+
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return f"PermanentFailure({self.reason!r})"
+
+def drain(frontier, batch_size, scrape_batch: Callable[[List[str]], Sequence], max_wait=5.0) -> Iterator[Tuple[str, object]]:
+    """
+    Claim URLs batch by batch until nothing is pending and scrape each batch
+    with scrape_batch(urls), which returns one result per URL (falsy when the
+    page failed, a PermanentFailure when it should not be retried). Each URL
+    is marked done or failed, then (url, result) is yielded. Several
+    processes can drain the same frontier.
+    """
+    while True:
+        batch = frontier.claim_batch(batch_size)
+        if not batch:
+            wait = frontier.next_ready_in()
+            if wait is None:
+                return
+            time.sleep(min(wait, max_wait))
+            continue
+        results = scrape_batch([url for _, url in batch])
+        for (url_id, url), result in zip(batch, results):
+            if result:
+                frontier.complete(url_id)
+            else:
+                frontier.fail(url_id, retry=not isinstance(result, PermanentFailure))
+            yield url, result
+
+# Function run by each simulated worker process: claim, "fetch", complete
+def _simulated_worker(path, fetch_seconds, result_queue):
+    claimed = []
+    with CrawlFrontier(path, default_delay=0.05) as frontier:
+        while True:
+            item = frontier.claim()
+            if item is None:
+                wait = frontier.next_ready_in()
+                if wait is None:
+                    break
+                time.sleep(min(wait, 0.05))
+                continue
+            time.sleep(fetch_seconds)
+            frontier.complete(item[0])
+            claimed.append(item[1])
+    result_queue.put(claimed)
+
+def simulate_workers(path, processes=4, hosts=20, urls_per_host=25, fetch_seconds=0.01):
+    """Seed a frontier with duplicate-laden URLs and drain it with several processes; checks nothing is fetched twice."""
+    if os.path.exists(path):
+        os.remove(path)
+    seeds = []
+    for h in range(hosts):
+        for i in range(urls_per_host):
+            seeds.append(f"https://shop{h}.example.com/item/{i}?utm_source=mail")
+            seeds.append(f"https://SHOP{h}.example.com:443/item/{i}?gclid=abc#reviews")  # Same page again
+    with CrawlFrontier(path) as frontier:
+        added = frontier.add_many(seeds)
+    print(f"seeded {len(seeds)} URLs, {added} unique after normalization")
+
+    result_queue = multiprocessing.Queue()
+    start = time.perf_counter()
+    workers = [multiprocessing.Process(target=_simulated_worker, args=(path, fetch_seconds, result_queue))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    claimed = [url for _ in workers for url in result_queue.get()]
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    print(f"{processes} processes fetched {len(claimed)} pages in {elapsed:.1f}s; "
+          f"duplicates: {len(claimed) - len(set(claimed))}")
+    return claimed
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or seed a shared crawl frontier.")
+    parser.add_argument("--db", default="frontier.db", help="Frontier database file.")
+    parser.add_argument("--add", nargs="*", default=[], help="URLs to queue.")
+    parser.add_argument("--priority", type=int, default=0, help="Priority of the queued URLs (higher first).")
+    parser.add_argument("--requeue-stale", type=float, metavar="SECONDS", help="Requeue URLs claimed longer ago than this.")
+    parser.add_argument("--simulate", type=int, metavar="PROCESSES", help="Drain a synthetic frontier with N worker processes.")
+    args = parser.parse_args()
+
+    if args.simulate:
+        simulate_workers("frontier_simulation.db", processes=args.simulate)
+        return
+    with CrawlFrontier(args.db) as frontier:
+        if args.add:
+            print(f"Queued {frontier.add_many(args.add, args.priority)} new URLs.")
+        if args.requeue_stale is not None:
+            print(f"Requeued {frontier.requeue_stale(args.requeue_stale)} stale URLs.")
+        print(frontier.stats())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import time
+from pathlib import Path
+from typing import Optional, Sequence
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoTokenizer, AutoModel
+
+# Sentence embedders for the RAG pipeline: one tokenizer and mean pooling,
+# with interchangeable PyTorch fp32, dynamic int8 and ONNX Runtime backends.
+
+# Silence Hugging Face symlink warning
+os.environ['HF_HUB_DISABLE_SYMLINKS_WARNING'] = '1'
+
+# Hugging Face model used for embeddings
+model_name = 'bert-base-uncased'
+
+# Average token embeddings, ignoring the padding positions of each row
+def mean_pool(last_hidden_state: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    mask = attention_mask.unsqueeze(-1).to(last_hidden_state.dtype)
+    summed = (last_hidden_state * mask).sum(dim=1)
+    counts = mask.sum(dim=1).clamp(min=1e-9)
+    return summed / counts
+
+class _PooledEncoder(torch.nn.Module):
+    """Encoder plus mean pooling as one module, so it can be exported to ONNX as a whole."""
+
+    def __init__(self, encoder: torch.nn.Module):
+        super().__init__()
+        self.encoder = encoder
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        outputs = self.encoder(input_ids=input_ids, attention_mask=attention_mask)
+        return mean_pool(outputs.last_hidden_state, attention_mask)
+
+class Embedder:
+    """
+    Turns texts into mean-pooled embeddings with the tokenizer of `model_name`.
+
+    Subclasses only implement `_encode`, which maps one padded batch of token
+    ids and attention mask to pooled float32 vectors.
+    """
+    backend = None
+
+    def __init__(self, model_name: str = model_name):
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.dim = AutoConfig.from_pretrained(model_name).hidden_size
+        self.encoder = self._load_encoder()
+
+    def _load_encoder(self) -> Optional[torch.nn.Module]:
+        return _PooledEncoder(AutoModel.from_pretrained(self.model_name)).eval()
+
+    def _encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def model_size_bytes(self) -> int:
+        """Bytes of weights this backend runs (quantized layers keep packed (weight, bias) tuples)."""
+        total = 0
+        for value in self.encoder.state_dict().values():
+            for tensor in value if isinstance(value, tuple) else (value,):
+                if isinstance(tensor, torch.Tensor):
+                    total += tensor.numel() * tensor.element_size()
+        return total
+
+    def embed(self, texts: Sequence[str], batch_size: int = 32) -> np.ndarray:
+        """
+        Embed texts in batches and return a (len(texts), dim) float32 matrix.
+
+        Texts are sorted by length before batching so every batch pads to a similar
+        size; the rows are written back in their original order.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            inputs = self.tokenizer(
+                [texts[i] for i in batch_idx],
+                return_tensors="np", padding=True, truncation=True, max_length=512,
+                return_token_type_ids=False,
+            )
+            embeddings[batch_idx] = self._encode(inputs["input_ids"], inputs["attention_mask"])
+        return embeddings
+
+class TorchEmbedder(Embedder):
+    """Full-precision PyTorch model."""
+    backend = "torch"
+
+    def _encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            pooled = self.encoder(torch.from_numpy(input_ids), torch.from_numpy(attention_mask))
+        return pooled.float().cpu().numpy()
+
+class QuantizedTorchEmbedder(TorchEmbedder):
+    """PyTorch model with its Linear layers dynamically quantized to int8."""
+    backend = "int8"
+
+    def __init__(self, model_name: str = model_name):
+        super().__init__(model_name)
+        self.encoder = torch.ao.quantization.quantize_dynamic(self.encoder, {torch.nn.Linear}, dtype=torch.qint8)
+
+class OnnxEmbedder(Embedder):
+    """
+    ONNX Runtime session over the exported encoder (pooling included).
+
+    The model is exported once to `onnx_dir` and reused on later runs; the
+    PyTorch weights are only loaded when that export has to happen.
+    """
+    backend = "onnx"
+
+    def __init__(self, model_name: str = model_name, onnx_dir: Path = Path("onnx_models")):
+        super().__init__(model_name)
+        import onnxruntime  # Only needed for this backend
+        self.onnx_path = Path(onnx_dir) / f"{model_name.replace('/', '__')}.onnx"
+        if not self.onnx_path.exists():
+            self._export()
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(str(self.onnx_path), options, providers=["CPUExecutionProvider"])
+
+    def _load_encoder(self) -> Optional[torch.nn.Module]:
+        return None  # Loaded by _export() if there is no exported model yet
+
+    def _export(self):
+        encoder = super()._load_encoder()
+        self.onnx_path.parent.mkdir(parents=True, exist_ok=True)
+        example = self.tokenizer(["export example"], return_tensors="pt", return_token_type_ids=False)
+        tmp_path = self.onnx_path.with_suffix(".onnx.tmp")
+        torch.onnx.export(
+            encoder, (example["input_ids"], example["attention_mask"]), str(tmp_path),
+            input_names=["input_ids", "attention_mask"], output_names=["embedding"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"},
+                          "embedding": {0: "batch"}},
+            opset_version=17, dynamo=False,
+        )
+        os.replace(tmp_path, self.onnx_path)
+
+    def model_size_bytes(self) -> int:
+        return self.onnx_path.stat().st_size
+
+    def _encode(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        (pooled,) = self.session.run(None, {"input_ids": input_ids.astype(np.int64),
+                                            "attention_mask": attention_mask.astype(np.int64)})
+        return pooled
+
+EMBEDDER_BACKENDS = {cls.backend: cls for cls in (TorchEmbedder, QuantizedTorchEmbedder, OnnxEmbedder)}
+
+_embedder: Optional[Embedder] = None
+
+# The embedder shared by indexing and querying (PyTorch fp32 unless set_embedder was called)
+def get_embedder() -> Embedder:
+    global _embedder
+    if _embedder is None:
+        _embedder = TorchEmbedder()
+    return _embedder
+
+def set_embedder(backend: str) -> Embedder:
+    global _embedder
+    _embedder = EMBEDDER_BACKENDS[backend]()
+    return _embedder
+
+# Generate embeddings for many texts in padded batches
+def generate_embeddings(texts: Sequence[str], batch_size: int = 32) -> np.ndarray:
+    return get_embedder().embed(texts, batch_size=batch_size)
+
+# Generate embeddings for a given text
+def generate_embedding(text: str) -> np.ndarray:
+    return generate_embeddings([text], batch_size=1)[0]
+
+# Report embedding throughput for several batch sizes
+def benchmark_embedding_batch_sizes(texts: Sequence[str], batch_sizes: Sequence[int] = (1, 8, 32, 128)) -> dict:
+    """Embed the same texts at each batch size and print chunks/sec."""
+    generate_embeddings(texts[:min(len(texts), 8)], batch_size=8)  # Warm-up pass
+    results = {}
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        generate_embeddings(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        results[batch_size] = len(texts) / elapsed if elapsed > 0 else float("inf")
+        print(f"batch_size={batch_size:>4}: {results[batch_size]:8.1f} chunks/sec ({elapsed:.2f}s for {len(texts)} chunks)")
+    return results
@@ -0,0 +1,211 @@
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Optional
+from selectolax.parser import HTMLParser
+
+# Field extraction shared by the static and dynamic scrapers. Each store's
+# selectors from stores.json are compiled once into an ExtractionPlan, which
+# pulls the fields out of a page with one grouped CSS query instead of one
+# query per field.
+
+# tag#id.class1.class2 with every part optional -- the shape of all selectors in stores.json
+SIMPLE_SELECTOR = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*)?(?P<id>#[\w-]+)?(?P<classes>(?:\.[\w-]+)*)$")
+
+# Log a debug snippet for the first miss per store and field, then for every Nth one
+SNIPPET_SAMPLE_EVERY = 50
+
+class _SimpleMatcher:
+    """Checks a node against a compound selector without another tree walk."""
+
+    def __init__(self, tag, id_, classes):
+        self.tag = tag
+        self.id = id_
+        self.classes = classes
+
+    def matches(self, node):
+        if self.tag and node.tag != self.tag:
+            return False
+        attrs = node.attributes
+        if self.id and attrs.get("id") != self.id:
+            return False
+        return not self.classes or self.classes.issubset((attrs.get("class") or "").split())
+
+def compile_selector(selector) -> Optional[_SimpleMatcher]:
+    """Return a matcher for a simple compound selector, or None for anything more complex."""
+    match = SIMPLE_SELECTOR.match(selector.strip())
+    if not match or not any(match.groups()):
+        return None
+    classes = frozenset(c for c in match.group("classes").split(".") if c)
+    tag = match.group("tag").lower() if match.group("tag") else None
+    return _SimpleMatcher(tag, match.group("id")[1:] if match.group("id") else None, classes)
+
+class ExtractionPlan:
+    """
+    The compiled selectors of one store.
+
+    Simple selectors are merged into one selector group, so a page takes one
+    css() call instead of one per field, and each hit is assigned to its field
+    in Python. selectolax returns a group's matches selector by selector (each
+    node once), not in document order, so a hit that also matches an earlier
+    selector of the group may not be the field's first match; such fields are
+    re-queried with css_first(). Selectors with combinators or attributes
+    always get their own css_first() query.
+    """
+
+    def __init__(self, fields: Dict[str, str]):
+        self.fields = dict(fields)
+        self.matchers = {}
+        self.fallback = {}
+        for name, selector in self.fields.items():
+            matcher = compile_selector(selector)
+            if matcher:
+                self.matchers[name] = matcher
+            else:
+                self.fallback[name] = selector
+        selectors = list(dict.fromkeys(self.fields[name] for name in self.matchers))
+        self.group = ", ".join(selectors)
+        # Matchers of the selectors before each field's own in the group
+        self.earlier = {
+            name: [compile_selector(selector) for selector in selectors[:selectors.index(self.fields[name])]]
+            for name in self.matchers
+        }
+
+    def extract(self, html) -> Dict[str, Optional[str]]:
+        """Return {field: stripped text or None} for every field of the plan."""
+        found = {}
+        requery = dict(self.fallback)
+        if self.group:
+            pending = dict(self.matchers)
+            for node in html.css(self.group):
+                for name, matcher in list(pending.items()):
+                    if matcher.matches(node):
+                        if any(earlier.matches(node) for earlier in self.earlier[name]):
+                            requery[name] = self.fields[name]  # Listed under another selector, order unknown
+                        else:
+                            found[name] = node.text(strip=True)
+                        del pending[name]
+                if not pending:
+                    break
+        for name, selector in requery.items():
+            node = html.css_first(selector)
+            if node:
+                found[name] = node.text(strip=True)
+        return {name: found.get(name) for name in self.fields}
+
+_plans = {}
+
+def plan_for(store, **extra_fields) -> ExtractionPlan:
+    """Return the compiled plan for a store (title, price and any extra fields), compiling it on first use."""
+    fields = {"title": store.title, "price": store.price, **extra_fields}
+    key = (store.name, tuple(fields.items()))
+    plan = _plans.get(key)
+    if plan is None:
+        plan = _plans[key] = ExtractionPlan(fields)
+    return plan
+
+def debug_snippet(html, limit=500):
+    """The first `limit` characters of page text, read node by node instead of serializing the whole document."""
+    parts = []
+    size = 0
+    root = html.body or html.root
+    if root is None:
+        return ""
+    for node in root.traverse(include_text=True):
+        if node.tag == "-text":
+            text = node.text_content
+            if text and text.strip():
+                parts.append(text)
+                size += len(text)
+                if size >= limit:
+                    break
+    return "".join(parts)[:limit]
+
+_misses = defaultdict(int)
+
+def should_log_snippet(store_name, field):
+    """Sample debug snippets: the first miss for a store's field, then one in every SNIPPET_SAMPLE_EVERY."""
+    _misses[(store_name, field)] += 1
+    return _misses[(store_name, field)] % SNIPPET_SAMPLE_EVERY == 1
+
+# Function to write synthetic product pages for stores that have no saved fixtures yet
+def write_synthetic_fixtures(fixture_dir, stores, cards=400):
+    fixture_dir = Path(fixture_dir)
+    fixture_dir.mkdir(parents=True, exist_ok=True)
+    for store in stores:
+        filler = "".join(
+            f"<div class='card'><a href='/p/{i}'><span class='name'>Related item {i}</span></a>"
+            f"<span class='old-price'>{i}.00</span><p>Lorem ipsum dolor sit amet {i}</p></div>"
+            for i in range(cards)
+        )
+        title = _element_for(store.title, f"{store.name} test jacket")
+        price = _element_for(store.price, "199.95")
+        page = (f"<html><head><title>{store.name}</title><script>window.state = {{}};</script></head>"
+                f"<body><header><nav>{'<a href=/>Link</a>' * 40}</nav></header>"
+                f"<main>{filler}{title}<div class='buy'>{price}</div></main></body></html>")
+        (fixture_dir / f"{store.name}.html").write_text(page, encoding="utf-8")
+        # A page where neither selector matches, to exercise the miss path
+        (fixture_dir / f"{store.name}.miss.html").write_text(page.replace(title, "").replace(price, ""), encoding="utf-8")
+
+def _element_for(selector, text):
+    match = SIMPLE_SELECTOR.match(selector)
+    tag = match.group("tag") or "div"
+    id_attr = f" id='{match.group('id')[1:]}'" if match.group("id") else ""
+    classes = " ".join(c for c in match.group("classes").split(".") if c)
+    return f"<{tag}{id_attr} class='{classes}'>{text}</{tag}>"
+
+def benchmark_extraction(fixture_dir, stores, rounds=20):
+    """
+    Report pages/sec for per-field css_first() with full-text snippets on a
+    miss (the old parse) against compiled plans with sampled snippets.
+
+    Fixtures are saved pages named <store name>[.anything].html; synthetic
+    ones are written first if the directory has none.
+    """
+    fixture_dir = Path(fixture_dir)
+    if not list(fixture_dir.glob("*.html")):
+        write_synthetic_fixtures(fixture_dir, stores)
+    by_name = {store.name: store for store in stores}
+    pages = []
+    for path in sorted(fixture_dir.glob("*.html")):
+        store = by_name.get(path.name.split(".")[0])
+        if store:
+            pages.append((store, path.read_text(encoding="utf-8", errors="replace")))
+    if not pages:
+        print(f"No fixtures in {fixture_dir} match a store name.")
+        return {}
+
+    start = time.perf_counter()
+    trees = [(store, HTMLParser(text)) for _ in range(rounds) for store, text in pages]
+    parse_s = time.perf_counter() - start
+
+    def legacy(store, html):
+        fields = {}
+        for name, selector in (("title", store.title), ("price", store.price)):
+            node = html.css_first(selector)
+            fields[name] = node.text(strip=True) if node else None
+            if node is None:
+                html.text()[:500]
+        return fields
+
+    def planned(store, html):
+        fields = plan_for(store).extract(html)
+        for name, value in fields.items():
+            if value is None and should_log_snippet(store.name, name):
+                debug_snippet(html)
+        return fields
+
+    results = {"html_parse": len(trees) / parse_s}
+    outputs = {}
+    for label, extract in (("per-field css_first", legacy), ("compiled plan", planned)):
+        start = time.perf_counter()
+        outputs[label] = [extract(store, html) for store, html in trees]
+        results[label] = len(trees) / (time.perf_counter() - start)
+
+    print(f"{len(pages)} fixtures x {rounds} rounds")
+    print(f"HTML parsing:        {results['html_parse']:10.0f} pages/sec")
+    for label in ("per-field css_first", "compiled plan"):
+        print(f"{label + ':':<20} {results[label]:10.0f} pages/sec")
+    print(f"same fields extracted: {outputs['per-field css_first'] == outputs['compiled plan']}")
+    return results
@@ -0,0 +1,287 @@
+import asyncio
+import json
+import os
+from collections import Counter
+from typing import AsyncIterator, Dict, Iterator, List, Union
+import httpx
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+# Async access to Gemini for the FastAPI services. Calls never block the event
+# loop, at most max_concurrency run upstream at once, at most max_waiting
+# more queue for a slot (beyond that callers get GeminiOverloaded, which the
+# services turn into a 503), and each upstream call has a timeout. Streamed
+# calls hold their slot until the last chunk, and the timeout applies to the
+# wait for each chunk. ChatService holds the endpoint plumbing the services
+# share; SyncSdkModel is the blocking client the Streamlit apps use.
+
+class GeminiError(Exception):
+    pass
+
+class GeminiOverloaded(GeminiError):
+    """Raised instead of queueing when too many requests are already waiting."""
+
+class GeminiTimeout(GeminiError):
+    pass
+
+# A conversation turn in the shape both backends accept: {"role": "user" | "model", "parts": [{"text": ...}]}
+def turn(role, text) -> Dict:
+    return {"role": role, "parts": [{"text": text}]}
+
+Contents = Union[str, List[Dict]]
+
+def _as_turns(contents: Contents) -> List[Dict]:
+    return [turn("user", contents)] if isinstance(contents, str) else contents
+
+# Function to pull the text out of an SDK response
+def response_text(response) -> str:
+    if not response or not response.candidates:
+        raise GeminiError(f"No valid response received from the model. Response: {response}")
+    parts = response.candidates[0].content.parts
+    if not parts:
+        raise GeminiError(f"Invalid response structure: missing content. Response: {response}")
+    return "".join(part.text for part in parts).strip()
+
+class SdkBackend:
+    """google.generativeai's async API (genai.configure() must have been called)."""
+
+    def __init__(self, model_name="gemini-pro"):
+        import google.generativeai as genai
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, contents: Contents) -> str:
+        response = await self.model.generate_content_async(_as_turns(contents))
+        return response_text(response)
+
+    async def stream(self, contents: Contents) -> AsyncIterator[str]:
+        response = await self.model.generate_content_async(_as_turns(contents), stream=True)
+        async for chunk in response:
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield "".join(part.text for part in chunk.candidates[0].content.parts)
+
+    async def close(self):
+        pass
+
+class SyncSdkModel:
+    """Blocking google.generativeai calls for the Streamlit apps (genai.configure() must have been called)."""
+
+    def __init__(self, model_name="gemini-pro"):
+        import google.generativeai as genai
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, contents: Contents) -> str:
+        return response_text(self.model.generate_content(_as_turns(contents)))
+
+    def generate_stream(self, contents: Contents) -> Iterator[str]:
+        for chunk in self.model.generate_content(_as_turns(contents), stream=True):
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield "".join(part.text for part in chunk.candidates[0].content.parts)
+
+class RestBackend:
+    """
+    The Gemini REST generateContent endpoint over one pooled httpx.AsyncClient.
+    base_url can point at a local stand-in server for load tests.
+    """
+
+    def __init__(self, model_name="gemini-pro", api_key=None, base_url="https://generativelanguage.googleapis.com",
+                 max_connections=100):
+        self.model_name = model_name
+        self.api_key = api_key or os.getenv("GOOGLE_API_KEY", "")
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=None,  # AsyncGeminiClient applies the deadline
+        )
+
+    async def generate(self, contents: Contents) -> str:
+        resp = await self.client.post(
+            f"/v1beta/models/{self.model_name}:generateContent",
+            params={"key": self.api_key},
+            json={"contents": _as_turns(contents)},
+        )
+        if resp.status_code != 200:
+            raise GeminiError(f"Gemini returned HTTP {resp.status_code}: {resp.text[:200]}")
+        candidates = resp.json().get("candidates") or []
+        if not candidates:
+            raise GeminiError(f"No valid response received from the model. Response: {resp.text[:200]}")
+        return "".join(part.get("text", "") for part in candidates[0]["content"]["parts"]).strip()
+
+    async def stream(self, contents: Contents) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST",
+            f"/v1beta/models/{self.model_name}:streamGenerateContent",
+            params={"key": self.api_key, "alt": "sse"},
+            json={"contents": _as_turns(contents)},
+        ) as resp:
+            if resp.status_code != 200:
+                await resp.aread()
+                raise GeminiError(f"Gemini returned HTTP {resp.status_code}: {resp.text[:200]}")
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                candidates = json.loads(line[5:]).get("candidates") or []
+                if candidates and candidates[0].get("content"):
+                    yield "".join(part.get("text", "") for part in candidates[0]["content"]["parts"])
+
+    async def close(self):
+        await self.client.aclose()
+
+class AsyncGeminiClient:
+    """Bounded-concurrency front for a backend, with a queue limit and per-call timeout."""
+
+    def __init__(self, backend, max_concurrency=8, max_waiting=64, timeout=60.0):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.waiting = 0
+        self.in_flight = 0
+        self.stats = Counter()
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    def overloaded(self) -> bool:
+        return self.waiting >= self.max_waiting
+
+    async def _acquire(self):
+        if self.overloaded():
+            self.stats["rejected"] += 1
+            raise GeminiOverloaded(f"{self.waiting} requests already waiting for the model")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def generate(self, contents: Contents) -> str:
+        await self._acquire()
+        try:
+            text = await asyncio.wait_for(self.backend.generate(contents), self.timeout)
+            self.stats["completed"] += 1
+            return text
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise GeminiTimeout(f"The model did not answer within {self.timeout:.0f}s")
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self._release()
+
+    async def generate_stream(self, contents: Contents) -> AsyncIterator[str]:
+        """Yield the answer's text chunks as the model produces them."""
+        await self._acquire()
+        chunks = self.backend.stream(contents)
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.stats["timeouts"] += 1
+                    raise GeminiTimeout(f"The model sent nothing for {self.timeout:.0f}s")
+                yield chunk
+            self.stats["completed"] += 1
+        except GeminiTimeout:
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            try:
+                await chunks.aclose()  # Ends the upstream request if the caller stopped reading early
+            finally:
+                self._release()
+
+    def status(self):
+        return {"in_flight": self.in_flight, "waiting": self.waiting, **self.stats}
+
+    async def close(self):
+        await self.backend.close()
+
+# Function to format one server-sent event
+def sse_event(data: Dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+class ChatService:
+    """
+    Endpoint plumbing shared by the chat services: overload and timeout
+    errors as 503/504, answers streamed as server-sent events, and a router
+    with the model status and session endpoints (app.include_router(chat.router)).
+    """
+
+    def __init__(self, llm: AsyncGeminiClient, sessions):
+        self.llm = llm
+        self.sessions = sessions
+        self.router = APIRouter()
+        self.router.add_api_route("/api/llm_status", self.llm_status, methods=["GET"])
+        self.router.add_api_route("/api/sessions", self.session_report, methods=["GET"])
+        self.router.add_api_route("/api/sessions/{session_id}", self.end_session, methods=["DELETE"])
+
+    @staticmethod
+    async def answer_or_http_error(get_response):
+        """Await an answer, turning backpressure and timeouts into HTTP errors."""
+        try:
+            return await get_response
+        except GeminiOverloaded as e:
+            raise HTTPException(status_code=503, detail=f"The service is busy, please retry shortly. {e}", headers={"Retry-After": "1"})
+        except GeminiTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+
+    async def stream_events(self, session, prompt: str, stream, summary_generate=None):
+        """Server-sent events for one answer: session, one event per text chunk, then done or error."""
+        yield sse_event({"session_id": session.session_id}, event="session")
+        try:
+            async for chunk in self.sessions.stream_async(session, prompt, stream, summary_generate=summary_generate):
+                yield sse_event({"text": chunk})
+        except Exception as e:
+            # The status line has already gone out, so errors are reported in the stream
+            print(f"Error in stream_events: {e}")
+            yield sse_event({"detail": f"An error occurred while processing your query: {e}"}, event="error")
+            return
+        yield sse_event({"session_id": session.session_id}, event="done")
+
+    def event_stream_response(self, session, prompt: str, stream, summary_generate=None) -> StreamingResponse:
+        if self.llm.overloaded():
+            raise HTTPException(status_code=503, detail="The service is busy, please retry shortly.", headers={"Retry-After": "1"})
+        return StreamingResponse(self.stream_events(session, prompt, stream, summary_generate=summary_generate),
+                                 media_type="text/event-stream", headers=SSE_HEADERS)
+
+    async def llm_status(self):
+        """Requests in flight and queued for the model, plus completed/rejected/timed-out counts."""
+        return self.llm.status()
+
+    async def session_report(self):
+        """Number, size and memory use of the live sessions, in total (session ids are never listed)."""
+        return self.sessions.report()
+
+    async def end_session(self, session_id: str):
+        """Forget a session's history; only a client holding the session's id can end it."""
+        if not self.sessions.end(session_id):
+            raise HTTPException(status_code=404, detail="Session not found.")
+        return {"message": "Session ended."}
+
+def client_from_env(model_name="gemini-pro") -> AsyncGeminiClient:
+    """
+    Build the client the services use. GEMINI_BASE_URL switches to the REST
+    backend at that address; GEMINI_MAX_CONCURRENCY, GEMINI_MAX_WAITING and
+    GEMINI_TIMEOUT tune the limits.
+    """
+    base_url = os.getenv("GEMINI_BASE_URL")
+    backend = RestBackend(model_name, base_url=base_url) if base_url else SdkBackend(model_name)
+    return AsyncGeminiClient(
+        backend,
+        max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+        max_waiting=int(os.getenv("GEMINI_MAX_WAITING", "64")),
+        timeout=float(os.getenv("GEMINI_TIMEOUT", "60")),
+    )
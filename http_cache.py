@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+# On-disk HTTP response cache shared by the scrapers and the summarizer.
+# Works with any client whose get(url, headers=..., timeout=...) returns an
+# object with status_code, headers and content (httpx, requests).
+
+@dataclass
+class CachedResponse:
+    url: str
+    status_code: int
+    content: bytes
+    encoding: str
+    cache_status: str  # "fresh" (no request sent), "revalidated" (304) or "miss" (full download)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+@dataclass
+class CacheStats:
+    fresh: int = 0
+    revalidated: int = 0
+    misses: int = 0
+    bytes_downloaded: int = 0
+    bytes_saved: int = 0
+
+    def __str__(self):
+        return (f"{self.fresh} fresh, {self.revalidated} revalidated (304), {self.misses} downloaded; "
+                f"{self.bytes_downloaded / 1e3:.1f} kB downloaded, {self.bytes_saved / 1e3:.1f} kB saved")
+
+@dataclass
+class _Entry:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    encoding: str
+    fetched_at: float
+    size: int
+
+class HttpCache:
+    """
+    Keeps the last 200 response for each URL on disk, next to its ETag and
+    Last-Modified validators.
+
+    A cached page younger than `ttl` seconds is returned without touching the
+    network. Older pages are revalidated with If-None-Match/If-Modified-Since,
+    so an unchanged page costs a 304 instead of a full download.
+    """
+
+    def __init__(self, directory="http_cache", default_ttl: float = 0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.default_ttl = default_ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    def _load(self, url) -> Optional[_Entry]:
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as f:
+                entry = _Entry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        return entry if body_path.exists() else None
+
+    def _read_body(self, url) -> bytes:
+        return self._paths(url)[1].read_bytes()
+
+    # Write to a temporary file first so a crash never leaves a half-written entry
+    def _write(self, path, data: bytes):
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _save(self, url, entry: _Entry, content: Optional[bytes] = None):
+        meta_path, body_path = self._paths(url)
+        if content is not None:
+            self._write(body_path, content)
+        self._write(meta_path, json.dumps(entry.__dict__).encode("utf-8"))
+
+    def _count(self, name, downloaded=0, saved=0):
+        with self._lock:
+            setattr(self.stats, name, getattr(self.stats, name) + 1)
+            self.stats.bytes_downloaded += downloaded
+            self.stats.bytes_saved += saved
+
+    def _prepare(self, url, ttl):
+        """Return (entry, fresh cached response or None, request headers)."""
+        ttl = self.default_ttl if ttl is None else ttl
+        entry = self._load(url)
+        if entry is None:
+            return None, None, {}
+        if time.time() - entry.fetched_at < ttl:
+            self._count("fresh", saved=entry.size)
+            return entry, CachedResponse(url, 200, self._read_body(url), entry.encoding, "fresh"), {}
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return entry, None, headers
+
+    def _finish(self, url, entry: Optional[_Entry], resp) -> CachedResponse:
+        if resp.status_code == 304 and entry is not None:
+            entry.fetched_at = time.time()
+            self._save(url, entry)
+            self._count("revalidated", saved=entry.size)
+            return CachedResponse(url, 200, self._read_body(url), entry.encoding, "revalidated")
+
+        content = resp.content
+        encoding = getattr(resp, "encoding", None) or "utf-8"
+        self._count("misses", downloaded=len(content))
+        if resp.status_code == 200 and "no-store" not in resp.headers.get("cache-control", ""):
+            entry = _Entry(
+                etag=resp.headers.get("etag"),
+                last_modified=resp.headers.get("last-modified"),
+                encoding=encoding,
+                fetched_at=time.time(),
+                size=len(content),
+            )
+            self._save(url, entry, content)
+        return CachedResponse(url, resp.status_code, content, encoding, "miss")
+
+    def get(self, client, url, ttl: Optional[float] = None, timeout: float = 30.0) -> CachedResponse:
+        """Fetch url through the cache with a blocking client (httpx.Client, requests or a Session)."""
+        entry, cached, headers = self._prepare(url, ttl)
+        if cached:
+            return cached
+        resp = client.get(url, headers=headers, timeout=timeout)
+        return self._finish(url, entry, resp)
+
+    async def get_async(self, client, url, ttl: Optional[float] = None, timeout: float = 30.0) -> CachedResponse:
+        """Same as get() for an httpx.AsyncClient; cache files are read and written in a worker thread."""
+        entry, cached, headers = await asyncio.to_thread(self._prepare, url, ttl)
+        if cached:
+            return cached
+        resp = await client.get(url, headers=headers, timeout=timeout)
+        return await asyncio.to_thread(self._finish, url, entry, resp)
@@ -0,0 +1,559 @@
+import hashlib
+import json
+import mmap
+import os
+import time
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from chunking import ChunkSpan, ChunkView, chunk_corpus
+from embedders import generate_embeddings, get_embedder
+
+# FAISS index construction and the on-disk store of documents, chunk spans and
+# embeddings that the index is built from and kept in sync with.
+
+# Supported FAISS index types: exact search plus three approximate ones
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+def build_index(embeddings: np.ndarray, index_type: str = "flat", nlist: Optional[int] = None,
+                hnsw_m: int = 32, pq_m: int = 64, train_size: int = 100_000, seed: int = 0,
+                ids: Optional[np.ndarray] = None) -> faiss.Index:
+    """
+    Build a FAISS index of the given type over normalized float32 embeddings.
+
+    IVF-based indexes are trained on a random sample of at most `train_size`
+    rows. `nlist` defaults to roughly 4 * sqrt(n) inverted lists; for IVF-PQ,
+    `pq_m` is lowered to the nearest divisor of the dimension. With `ids`, the
+    vectors are stored under those int64 ids (flat and HNSW get an IndexIDMap2)
+    and search results are ids instead of row numbers.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    n, dim = embeddings.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.index_factory(dim, f"HNSW{hnsw_m},Flat")
+    if index_type in ("flat", "hnsw"):
+        if ids is not None:
+            index = faiss.IndexIDMap2(index)
+    else:
+        nlist = nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        if index_type == "ivf":
+            index = faiss.index_factory(dim, f"IVF{nlist},Flat")
+        else:
+            pq_m = max(m for m in range(1, min(pq_m, dim) + 1) if dim % m == 0)
+            # 8-bit codes need at least 256 training points per sub-quantizer
+            nbits = 8 if n >= 256 else max(1, int(np.log2(n)))
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{pq_m}x{nbits}")
+        sample = embeddings
+        if n > train_size:
+            rows = np.random.default_rng(seed).choice(n, size=train_size, replace=False)
+            sample = embeddings[np.sort(rows)]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    if ids is None:
+        index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    else:
+        index.add_with_ids(np.ascontiguousarray(embeddings, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+    return index
+
+# The index that does the actual search, looking through any IndexIDMap wrapper
+def base_index(index: faiss.Index) -> faiss.Index:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    return index
+
+# Per-query search settings: nprobe for IVF indexes, efSearch for HNSW
+def make_search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                       ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+    index = base_index(index)
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    if ef_search is not None and isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    return None
+
+# Measure recall@k and latency of each index type against exact flat search
+def benchmark_index_types(embeddings: np.ndarray, num_queries: int = 1000, k: int = 10,
+                          sweeps: Optional[dict] = None, seed: int = 0) -> List[dict]:
+    """
+    Use a random sample of the corpus vectors as queries and print one row per
+    (index type, nprobe/efSearch) setting with build time, ms/query and recall@k.
+    """
+    sweeps = sweeps or {
+        "ivf": [("nprobe", p) for p in (1, 4, 16, 64)],
+        "hnsw": [("ef_search", ef) for ef in (16, 32, 64, 128)],
+        "ivfpq": [("nprobe", p) for p in (1, 4, 16, 64)],
+    }
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    queries = embeddings[rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)]
+    k = min(k, len(embeddings))
+
+    flat = build_index(embeddings, "flat")
+    start = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    results = [{"index_type": "flat", "setting": "-", "build_s": 0.0, "ms_per_query": flat_ms, "recall": 1.0}]
+
+    for index_type, settings in sweeps.items():
+        start = time.perf_counter()
+        index = build_index(embeddings, index_type)
+        build_s = time.perf_counter() - start
+        for name, value in settings:
+            params = make_search_params(index, **{name: value})
+            start = time.perf_counter()
+            _, found = index.search(queries, k, params=params)
+            ms_per_query = (time.perf_counter() - start) * 1000 / len(queries)
+            recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+            results.append({"index_type": index_type, "setting": f"{name}={value}", "build_s": build_s,
+                            "ms_per_query": ms_per_query, "recall": float(recall)})
+
+    print(f"{'index':<7} {'setting':<14} {'build s':>8} {'ms/query':>9} {f'recall@{k}':>10}")
+    for row in results:
+        print(f"{row['index_type']:<7} {row['setting']:<14} {row['build_s']:>8.2f} "
+              f"{row['ms_per_query']:>9.3f} {row['recall']:>10.3f}")
+    return results
+
+# Key embeddings by chunk content so unchanged chunks are never re-embedded
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+# Cheap change detection for source files (size + modification time)
+def file_fingerprint(path) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+class DocumentTexts(MutableMapping):
+    """
+    Document texts by id, kept in a JSON-lines file and read back on demand.
+
+    Each line of the file is one JSON-encoded text and `offsets` maps a
+    document id to the byte offset and length of its line; the file is
+    memory-mapped, so loading a store does not read any text. Documents set
+    since the last write() or flush() are held in memory until then; flush()
+    appends them to the file and write() rewrites it without replaced texts.
+    """
+
+    def __init__(self, path: Path, offsets: Optional[Dict[str, List[int]]] = None):
+        self.path = Path(path)
+        self.offsets: Dict[str, List[int]] = dict(offsets or {})
+        self.pending: Dict[str, str] = {}
+        self._map: Optional[mmap.mmap] = None
+        self._last: Tuple[Optional[str], str] = (None, "")  # Chunks of one document are usually read in a row
+        if self.offsets:
+            self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._last = (None, "")
+
+    def __getitem__(self, doc_id: str) -> str:
+        if doc_id in self.pending:
+            return self.pending[doc_id]
+        last_id, last_text = self._last
+        if last_id == doc_id:
+            return last_text
+        offset, length = self.offsets[doc_id]
+        text = json.loads(self._map[offset:offset + length])
+        self._last = (doc_id, text)
+        return text
+
+    def __setitem__(self, doc_id: str, text: str):
+        self.offsets.pop(doc_id, None)
+        self.pending[doc_id] = text
+        if self._last[0] == doc_id:
+            self._last = (None, "")
+
+    def __delitem__(self, doc_id: str):
+        if doc_id in self.pending:
+            del self.pending[doc_id]
+        else:
+            del self.offsets[doc_id]
+        if self._last[0] == doc_id:
+            self._last = (None, "")
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self.pending or doc_id in self.offsets
+
+    def __iter__(self):
+        yield from list(self.offsets)
+        yield from list(self.pending)
+
+    def __len__(self) -> int:
+        return len(self.offsets) + len(self.pending)
+
+    def clear(self):
+        self.offsets, self.pending = {}, {}
+        self._last = (None, "")
+
+    def flush(self):
+        """Append the pending documents to the end of the file and map them from there."""
+        if not self.pending:
+            return
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            for doc_id, text in self.pending.items():
+                line = json.dumps(text).encode('utf-8') + b'\n'
+                self.offsets[doc_id] = [f.tell(), len(line) - 1]
+                f.write(line)
+        self.pending = {}
+        self._open()
+
+    def write(self) -> Dict[str, List[int]]:
+        """Write every document to a temporary file, swap it in, and return the new offsets."""
+        tmp_path = self.path.with_suffix(".jsonl.tmp")
+        offsets = {}
+        with open(tmp_path, 'wb') as f:
+            for doc_id in self:
+                line = json.dumps(self[doc_id]).encode('utf-8') + b'\n'
+                offsets[doc_id] = [f.tell(), len(line) - 1]
+                f.write(line)
+        self.close()  # The old file cannot be replaced while it is mapped on Windows
+        os.replace(tmp_path, self.path)
+        self.offsets, self.pending = offsets, {}
+        self._open()
+        return offsets
+
+class IndexStore:
+    """
+    FAISS index plus the documents, chunk spans and embeddings behind it, saved under one directory.
+
+    Every chunk has a stable integer id, which is also its id in the ID-mapped
+    FAISS index, and every document keeps the list of its chunk ids. Documents
+    can therefore be added, replaced or deleted in a live index. Embeddings are
+    cached by the SHA-256 of their chunk text, so only new or changed chunks are
+    ever embedded. Loading reads the FAISS index and memory-maps both the
+    embedding cache and the document texts (documents.jsonl) instead of reading
+    them; only metadata and chunk spans are held in memory.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.index: Optional[faiss.Index] = None
+        self.documents = DocumentTexts(self.documents_path)
+        self.doc_metadata: Dict[str, dict] = {}
+        self.spans: Dict[int, ChunkSpan] = {}
+        self.chunk_hashes: Dict[int, str] = {}
+        self.doc_chunks: Dict[str, List[int]] = {}
+        self.next_chunk_id = 0
+        self.manifest: dict = {}
+        # Embedding cache: saved rows (memory-mapped after load) plus vectors embedded since
+        self.embeddings: Optional[np.ndarray] = None
+        self.cache_hashes: List[str] = []
+        self._cache_rows: Dict[str, int] = {}
+        self._new_vectors: Dict[str, np.ndarray] = {}
+        # Called with the ids of chunks that are removed or replaced (e.g. to invalidate cached answers)
+        self.removal_listeners: List[Callable[[List[int]], None]] = []
+
+    @property
+    def config(self) -> dict:
+        return self.manifest.get("config", {})
+
+    @property
+    def chunks(self) -> ChunkView:
+        """Chunk texts by chunk id, sliced from the documents rather than stored as copies."""
+        return ChunkView(self.documents, self.spans)
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / "index.faiss"
+
+    @property
+    def corpus_path(self) -> Path:
+        return self.directory / "corpus.json"
+
+    @property
+    def documents_path(self) -> Path:
+        return self.directory / "documents.jsonl"
+
+    @property
+    def embeddings_path(self) -> Path:
+        return self.directory / "embeddings.npy"
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    def load(self) -> bool:
+        """Load a previously saved store. Returns False if there is none or it is unreadable."""
+        if not self.manifest_path.exists():
+            return False
+        try:
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            with open(self.corpus_path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            index = faiss.read_index(str(self.index_path))
+            embeddings = np.load(self.embeddings_path, mmap_mode='r')
+            documents = DocumentTexts(self.documents_path, stored["document_offsets"])
+        except (OSError, KeyError, ValueError, RuntimeError) as e:
+            print(f"Failed to load index store from {self.directory}: {e}")
+            return False
+        if len(stored["chunks"]) != index.ntotal or len(stored["cache_hashes"]) != embeddings.shape[0]:
+            print(f"Index store in {self.directory} is inconsistent, ignoring it.")
+            return False
+        self.manifest = manifest
+        self.index = index
+        self.documents.close()
+        self.documents = documents
+        self.doc_metadata = stored["doc_metadata"]
+        self.spans = {}
+        self.chunk_hashes = {}
+        self.doc_chunks = {doc_id: [] for doc_id in self.documents}
+        for chunk_id, doc_id, start, end, h in stored["chunks"]:
+            self.spans[chunk_id] = ChunkSpan(doc_id, start, end)
+            self.chunk_hashes[chunk_id] = h
+            self.doc_chunks[doc_id].append(chunk_id)
+        self.next_chunk_id = stored["next_chunk_id"]
+        self.embeddings = embeddings
+        self.cache_hashes = stored["cache_hashes"]
+        self._cache_rows = {h: row for row, h in enumerate(self.cache_hashes)}
+        self._new_vectors = {}
+        return True
+
+    def is_current(self, sources: dict, config: dict) -> bool:
+        """True if the loaded store was built from these exact source files and settings."""
+        return (
+            self.index is not None
+            and self.manifest.get("sources") == sources
+            and self.config == config
+        )
+
+    def _embed_missing(self, texts_by_hash: Dict[str, str], batch_size: int) -> int:
+        """Embed the texts whose hash is not cached yet; returns how many were embedded."""
+        missing = [h for h in texts_by_hash if h not in self._cache_rows and h not in self._new_vectors]
+        if missing:
+            fresh = generate_embeddings([texts_by_hash[h] for h in missing], batch_size=batch_size)
+            faiss.normalize_L2(fresh)
+            self._new_vectors.update(zip(missing, fresh))
+        return len(missing)
+
+    def _vector(self, h: str) -> np.ndarray:
+        if h in self._new_vectors:
+            return self._new_vectors[h]
+        return self.embeddings[self._cache_rows[h]]
+
+    def _vectors(self, chunk_ids: Sequence[int]) -> np.ndarray:
+        vectors = np.empty((len(chunk_ids), get_embedder().dim), dtype=np.float32)
+        for row, chunk_id in enumerate(chunk_ids):
+            vectors[row] = self._vector(self.chunk_hashes[chunk_id])
+        return vectors
+
+    def _rebuild_index(self):
+        chunk_ids = np.array(sorted(self.spans), dtype=np.int64)
+        self.index = build_index(self._vectors(chunk_ids), ids=chunk_ids, **self.config.get("index", {}))
+
+    def rebuild(self, corpus: Iterable[Tuple[str, str, dict]], sources: dict, config: dict, batch_size: int = 32):
+        """Re-chunk every document and rebuild the index from scratch, reusing cached embeddings, and save it."""
+        embedding_settings = ("model_name", "embedder")
+        if any(self.config.get(key) != config.get(key) for key in embedding_settings):
+            self.embeddings, self.cache_hashes, self._cache_rows, self._new_vectors = None, [], {}, {}
+        self.manifest = {"sources": sources, "config": config}
+        self._notify_removed(list(self.spans))  # Chunk ids are reassigned from 0
+        self.documents.clear()
+        self.doc_metadata = {}
+        self.spans, self.chunk_hashes, self.doc_chunks = {}, {}, {}
+        self.next_chunk_id = 0
+        self.index = None
+        self._upsert(corpus, batch_size=batch_size)
+        self.save()
+
+    def upsert_documents(self, documents: Dict[str, str], doc_metadata: Optional[Dict[str, dict]] = None,
+                         batch_size: int = 32) -> dict:
+        """
+        Add new documents or replace existing ones by id.
+
+        A replaced document keeps the ids (and vectors) of chunks whose text is
+        unchanged; only chunks with new text are embedded and added to the index,
+        and chunks that no longer exist are removed from it.
+        """
+        doc_metadata = doc_metadata or {}
+        return self._upsert(((doc_id, text, doc_metadata.get(doc_id)) for doc_id, text in documents.items()),
+                            batch_size=batch_size)
+
+    def _upsert(self, corpus: Iterable[Tuple[str, str, Optional[dict]]], batch_size: int = 32,
+                group_size: int = 64) -> dict:
+        """
+        Upsert (doc_id, text, metadata) items, `group_size` documents at a time.
+
+        Each group is chunked, embedded and written out to documents.jsonl before
+        the next one is read, so only one group of texts is held in memory. The
+        index itself is updated once at the end. Metadata of None keeps the
+        document's current metadata.
+        """
+        totals = {"documents": 0, "kept": 0, "embedded": 0}
+        added, removed = [], []
+        group = []
+        for item in corpus:
+            group.append(item)
+            if len(group) == group_size:
+                self._upsert_group(group, added, removed, totals, batch_size)
+                group = []
+        if group:
+            self._upsert_group(group, added, removed, totals, batch_size)
+
+        self._forget_chunks(removed)
+        self._update_index(added, removed)
+        print(f"Upserted {totals['documents']} documents: kept {totals['kept']} chunks, added {len(added)} "
+              f"({totals['embedded']} newly embedded), removed {len(removed)}.")
+        return {"kept": totals["kept"], "added": len(added), "removed": len(removed), "embedded": totals["embedded"]}
+
+    def _upsert_group(self, group: List[Tuple[str, str, Optional[dict]]], added: List[int], removed: List[int],
+                      totals: dict, batch_size: int):
+        documents = {doc_id: text for doc_id, text, _ in group}
+        chunking = self.config.get("chunking", {})
+        new_spans = chunk_corpus(documents, **chunking)
+        new_hashes = [content_hash(text) for text in ChunkView(documents, new_spans)]
+        totals["embedded"] += self._embed_missing(
+            {h: documents[span.doc_id][span.start:span.end] for span, h in zip(new_spans, new_hashes)},
+            batch_size=batch_size,
+        )
+
+        spans_by_doc: Dict[str, List[Tuple[ChunkSpan, str]]] = {doc_id: [] for doc_id in documents}
+        for span, h in zip(new_spans, new_hashes):
+            spans_by_doc[span.doc_id].append((span, h))
+
+        for doc_id, doc_spans in spans_by_doc.items():
+            old_by_hash: Dict[str, List[int]] = {}
+            for chunk_id in self.doc_chunks.get(doc_id, []):
+                old_by_hash.setdefault(self.chunk_hashes[chunk_id], []).append(chunk_id)
+            chunk_ids = []
+            for span, h in doc_spans:
+                if old_by_hash.get(h):
+                    chunk_id = old_by_hash[h].pop()  # Same text, possibly at a new offset
+                    totals["kept"] += 1
+                else:
+                    chunk_id = self.next_chunk_id
+                    self.next_chunk_id += 1
+                    self.chunk_hashes[chunk_id] = h
+                    added.append(chunk_id)
+                self.spans[chunk_id] = span
+                chunk_ids.append(chunk_id)
+            for stale_ids in old_by_hash.values():
+                removed.extend(stale_ids)
+            self.documents[doc_id] = documents[doc_id]
+            self.doc_chunks[doc_id] = chunk_ids
+        for doc_id, _, metadata in group:
+            self.doc_metadata[doc_id] = metadata if metadata is not None else self.doc_metadata.get(doc_id, {})
+        totals["documents"] += len(documents)
+        self.documents.flush()
+
+    def delete_documents(self, doc_ids: Iterable[str]) -> int:
+        """Remove documents and all their chunks; returns the number of chunks removed."""
+        removed = []
+        for doc_id in doc_ids:
+            if doc_id not in self.documents:
+                continue
+            removed.extend(self.doc_chunks.pop(doc_id))
+            del self.documents[doc_id]
+            self.doc_metadata.pop(doc_id, None)
+        self._forget_chunks(removed)
+        self._update_index([], removed)
+        return len(removed)
+
+    def sync(self, corpus: Iterable[Tuple[str, str, dict]], sources: dict, batch_size: int = 32) -> dict:
+        """
+        Bring the store in line with freshly loaded source files and save it.
+
+        Only documents whose text changed are upserted; documents that came from
+        one of `sources` but are no longer there are deleted. Documents added
+        through `upsert_documents` from elsewhere are left alone.
+        """
+        seen = set()
+
+        def changed():
+            for doc_id, text, metadata in corpus:
+                seen.add(doc_id)
+                if self.documents.get(doc_id) != text:
+                    yield doc_id, text, metadata
+                else:
+                    self.doc_metadata[doc_id] = metadata
+
+        stats = self._upsert(changed(), batch_size=batch_size)
+        gone = [
+            doc_id for doc_id, meta in self.doc_metadata.items()
+            if meta.get("source") in sources and doc_id not in seen
+        ]
+        stats["deleted_chunks"] = self.delete_documents(gone)
+        self.manifest["sources"] = sources
+        self.save()
+        return stats
+
+    def _forget_chunks(self, chunk_ids: List[int]):
+        for chunk_id in chunk_ids:
+            del self.spans[chunk_id]
+            del self.chunk_hashes[chunk_id]
+        self._notify_removed(chunk_ids)
+
+    def _notify_removed(self, chunk_ids: List[int]):
+        if chunk_ids:
+            for listener in self.removal_listeners:
+                listener(chunk_ids)
+
+    def _update_index(self, added: List[int], removed: List[int]):
+        if self.index is None or (removed and isinstance(base_index(self.index), faiss.IndexHNSW)):
+            # First build, or HNSW, which cannot remove vectors: build from the cached embeddings
+            self._rebuild_index()
+            return
+        if removed:
+            self.index.remove_ids(np.array(removed, dtype=np.int64))
+        if added:
+            self.index.add_with_ids(self._vectors(added), np.array(added, dtype=np.int64))
+
+    def save(self):
+        """
+        Write every file to a temporary name first; the manifest is replaced last.
+
+        The embedding cache is compacted to the vectors of live chunks.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        tmp_index = self.index_path.with_suffix(".faiss.tmp")
+        faiss.write_index(self.index, str(tmp_index))
+        os.replace(tmp_index, self.index_path)
+
+        live_hashes = list(dict.fromkeys(self.chunk_hashes[chunk_id] for chunk_id in sorted(self.chunk_hashes)))
+        embeddings = np.empty((len(live_hashes), get_embedder().dim), dtype=np.float32)
+        for row, h in enumerate(live_hashes):
+            embeddings[row] = self._vector(h)
+        self.embeddings = None  # Drop the old memory-map before its file is replaced
+        tmp_embeddings = self.embeddings_path.with_suffix(".tmp.npy")
+        np.save(tmp_embeddings, embeddings)
+        os.replace(tmp_embeddings, self.embeddings_path)
+        self.embeddings = embeddings
+        self.cache_hashes = live_hashes
+        self._cache_rows = {h: row for row, h in enumerate(live_hashes)}
+        self._new_vectors = {}
+
+        document_offsets = self.documents.write()
+        tmp_corpus = self.corpus_path.with_suffix(".json.tmp")
+        with open(tmp_corpus, 'w', encoding='utf-8') as f:
+            json.dump({
+                "document_offsets": document_offsets,
+                "doc_metadata": self.doc_metadata,
+                "chunks": [
+                    [chunk_id, span.doc_id, span.start, span.end, self.chunk_hashes[chunk_id]]
+                    for chunk_id, span in sorted(self.spans.items())
+                ],
+                "next_chunk_id": self.next_chunk_id,
+                "cache_hashes": self.cache_hashes,
+            }, f)
+        os.replace(tmp_corpus, self.corpus_path)
+
+        tmp_manifest = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_manifest, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_manifest, self.manifest_path)
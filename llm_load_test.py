@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import socket
+import statistics
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import uvicorn
+
+# Load test for the FastAPI chatbot services. A local stand-in for the Gemini
+# REST API answers after a configurable delay, the service under test points
+# at it through GEMINI_BASE_URL, and a pool of async clients fires requests
+# at the service while latency and throughput are recorded. With --stream
+# the SSE endpoints are used and time to the first text chunk is reported too.
+
+class _FakeGeminiHandler(BaseHTTPRequestHandler):
+    """
+    Answers generateContent calls after server.latency (+/- jitter) seconds.
+    streamGenerateContent calls get the same answer as server.chunks SSE
+    events spread over that time, like a model generating tokens.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            delay = max(server.latency + server.random.uniform(-server.jitter, server.jitter), 0)
+        turns = payload.get("contents", [])
+        question = turns[-1]["parts"][0]["text"] if turns else ""
+        if ":streamGenerateContent" in self.path:
+            self._stream_answer(question, delay)
+            return
+        time.sleep(delay)
+        body = json.dumps({"candidates": [{"content": {"role": "model", "parts": [
+            {"text": f"Stand-in answer to: {question[-80:]}"}
+        ]}}]}).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The service gave up on this call (timeout)
+
+    def _stream_answer(self, question, delay):
+        words = f"Stand-in answer to: {question[-80:]}".split(" ")
+        chunks = self.server.chunks
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(chunks):
+                time.sleep(delay / chunks)
+                text = " ".join(words[i * len(words) // chunks:(i + 1) * len(words) // chunks]) + " "
+                event = f"data: {json.dumps({'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]})}\r\n\r\n"
+                data = event.encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def start_fake_gemini(latency=0.5, jitter=0.1, seed=0, chunks=10):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeGeminiHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.latency = latency
+    server.jitter = jitter
+    server.random = random.Random(seed)
+    server.lock = threading.Lock()
+    server.calls = 0
+    server.chunks = chunks
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Function to run an ASGI app under uvicorn in a background thread
+def serve_app(app):
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=2048))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+def blocking_app(gemini_url):
+    """The services' old request path: a synchronous Gemini call made inside an async endpoint."""
+    from fastapi import FastAPI
+    from pydantic import BaseModel
+    from gemini_client import turn
+
+    app = FastAPI()
+    client = httpx.Client(base_url=gemini_url, timeout=60)
+    history = []
+
+    class QuestionRequest(BaseModel):
+        question: str
+
+    @app.post("/api/ask")
+    async def ask_question(request: QuestionRequest):
+        resp = client.post("/v1beta/models/gemini-pro:generateContent",
+                           json={"contents": history + [turn("user", request.question)]})
+        text = resp.json()["candidates"][0]["content"]["parts"][0]["text"]
+        history.extend([turn("user", request.question), turn("model", text)])
+        return {"response": text}
+
+    return app
+
+# The endpoint and a request body for each service
+TARGETS = {
+    "medical_query_chatbot_api": ("/api/ask", lambda i: {"question": f"What are the symptoms of flu? ({i})"}),
+    "AI_Based_Diagnostic_Assistant_Chatbot_API": ("/api/get_diagnosis", lambda i: {
+        "name": f"Patient {i}", "symptoms": "fever, cough", "age": 30 + i % 40,
+        "answers": ["Three days", "No travel", "Mild headache"],
+    }),
+}
+
+async def _post_stream(client, path, body):
+    """POST to an SSE endpoint and read it to the end; returns status, seconds to the first text chunk and total."""
+    start = time.perf_counter()
+    first_chunk = None
+    async with client.stream("POST", path, json=body) as resp:
+        async for line in resp.aiter_lines():
+            if first_chunk is None and line.startswith('data: {"text"'):
+                first_chunk = time.perf_counter() - start
+            if line.startswith("event: error"):
+                return "stream error", first_chunk, time.perf_counter() - start
+    return resp.status_code, first_chunk, time.perf_counter() - start
+
+async def fire_requests(base_url, path, make_body, num_requests, concurrency, stream=False):
+    """
+    Send num_requests POSTs with `concurrency` clients; returns latencies of
+    200s, status counts, seconds, and times to first chunk when streaming.
+    """
+    latencies, statuses, first_chunks = [], Counter(), []
+    next_index = iter(range(num_requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            for i in next_index:
+                start = time.perf_counter()
+                try:
+                    if stream:
+                        status, first_chunk, total = await _post_stream(client, path, make_body(i))
+                        statuses[status] += 1
+                        if status == 200:
+                            latencies.append(total)
+                            first_chunks.append(first_chunk)
+                        continue
+                    resp = await client.post(path, json=make_body(i))
+                    statuses[resp.status_code] += 1
+                    if resp.status_code == 200:
+                        latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, statuses, elapsed, first_chunks
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+def report(label, latencies, statuses, elapsed, first_chunks=()):
+    ok = statuses.get(200, 0)
+    result = {
+        "requests_per_sec": ok / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else float("nan"),
+        "statuses": dict(statuses),
+    }
+    print(f"{label:<28} {ok} OK in {elapsed:.1f}s  {result['requests_per_sec']:.1f} req/s  "
+          f"p50 {result['p50'] * 1000:.0f} ms  p99 {result['p99'] * 1000:.0f} ms  statuses {dict(statuses)}")
+    if first_chunks:
+        result["first_chunk_p50"] = percentile(first_chunks, 50)
+        result["first_chunk_p99"] = percentile(first_chunks, 99)
+        print(f"{'':<28} first chunk p50 {result['first_chunk_p50'] * 1000:.0f} ms  p99 {result['first_chunk_p99'] * 1000:.0f} ms")
+    return result
+
+def run_load_test(service="medical_query_chatbot_api", num_requests=200, concurrency=50, latency=0.5,
+                  jitter=0.1, max_concurrency=32, max_waiting=256, timeout=30.0, compare_blocking=True, stream=False):
+    """
+    Load-test one service against the stand-in Gemini server, optionally next
+    to the blocking baseline. With stream=True the non-streaming and SSE
+    endpoints are both measured.
+    """
+    gemini = start_fake_gemini(latency=latency, jitter=jitter)
+    gemini_url = f"http://127.0.0.1:{gemini.server_address[1]}"
+    path, make_body = TARGETS[service]
+    results = {}
+    try:
+        if compare_blocking and service == "medical_query_chatbot_api":
+            server, base_url = serve_app(blocking_app(gemini_url))
+            try:
+                results["blocking"] = report("blocking send_message", *asyncio.run(
+                    fire_requests(base_url, path, make_body, num_requests, concurrency)))
+            finally:
+                server.should_exit = True
+
+        os.environ.update({
+            "GEMINI_BASE_URL": gemini_url,
+            "GEMINI_MAX_CONCURRENCY": str(max_concurrency),
+            "GEMINI_MAX_WAITING": str(max_waiting),
+            "GEMINI_TIMEOUT": str(timeout),
+        })
+        module = importlib.import_module(service)
+        server, base_url = serve_app(module.app)
+        try:
+            results["async"] = report(f"async client ({max_concurrency} slots)", *asyncio.run(
+                fire_requests(base_url, path, make_body, num_requests, concurrency)))
+            if stream:
+                results["stream"] = report("SSE streaming", *asyncio.run(
+                    fire_requests(base_url, path + "/stream", make_body, num_requests, concurrency, stream=True)))
+            print(f"Model calls: {module.llm.status()}")
+        finally:
+            server.should_exit = True
+        return results
+    finally:
+        gemini.shutdown()
+        gemini.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a chatbot API against a local stand-in for Gemini.")
+    parser.add_argument("--service", choices=sorted(TARGETS), default="medical_query_chatbot_api", help="Service module to test.")
+    parser.add_argument("--requests", type=int, default=200, help="Total requests to send.")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the stand-in model takes per answer.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- seconds added to each answer.")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="Model calls the service runs at once.")
+    parser.add_argument("--max-waiting", type=int, default=256, help="Requests queued for the model before the service answers 503.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a model call is abandoned (504).")
+    parser.add_argument("--no-baseline", action="store_true", help="Skip the blocking baseline run.")
+    parser.add_argument("--stream", action="store_true", help="Also load-test the SSE streaming endpoint.")
+    args = parser.parse_args()
+
+    run_load_test(args.service, args.requests, args.concurrency, args.latency, args.jitter, args.max_concurrency,
+                  args.max_waiting, args.timeout, compare_blocking=not args.no_baseline, stream=args.stream)
+
+if __name__ == "__main__":
+    main()
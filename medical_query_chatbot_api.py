@@ -4,6 +4,10 @@ from dotenv import load_dotenv
 import google.generativeai as genai
 import os
 import uvicorn
+from typing import Optional
+from chat_sessions import ChatSession, SessionManager
+from response_cache import cache_from_env
+from gemini_client import ChatService, GeminiOverloaded, GeminiTimeout, client_from_env
 
 # Load environment variables from .env file
 load_dotenv()
@@ -11,47 +15,61 @@ load_dotenv()
 # Configure the Generative AI with the API key
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-# Load Gemini Pro model and initialize a chat session
-model = genai.GenerativeModel("gemini-pro")
-chat = model.start_chat(history=[])
+# Async Gemini Pro client (bounded concurrency and queue, per-call timeout)
+llm = client_from_env("gemini-pro")
+
+# One chat history per session id, bounded by a token budget; idle sessions expire after 30 minutes
+sessions = SessionManager(max_sessions=1000, idle_ttl=1800, token_budget=3000)
+
+# Strict medical-response instructions sent ahead of every question
+MEDICAL_INSTRUCTIONS = (
+    "You are a highly knowledgeable medical assistant. "
+    "Answer the following question strictly with medically relevant information only. "
+    "Avoid providing unrelated or generic information."
+)
+
+# Answers cached on model, instructions and normalized conversation; identical concurrent questions share one call.
+# Session summaries are one-off prompts and go to llm.generate directly.
+response_cache = cache_from_env("gemini-pro")
+cached_generate = response_cache.wrap(llm.generate, system_prompt=MEDICAL_INSTRUCTIONS)
+cached_generate_stream = response_cache.wrap_stream(llm.generate_stream, system_prompt=MEDICAL_INSTRUCTIONS)
+
+# Function to wrap a question in the strict medical-response prompt
+def build_medical_prompt(question: str) -> str:
+    return f"{MEDICAL_INSTRUCTIONS}\n\nQuestion: {question}"
 
 # Function to send query to the Gemini model and retrieve a response
-def get_gemini_response(question: str) -> str:
+async def get_gemini_response(question: str, session: ChatSession) -> str:
     """
     Sends a query to the Gemini API and retrieves the response text.
     
     Args:
         question (str): User's input question.
+        session (ChatSession): Chat session whose history is sent with the question.
     
     Returns:
         str: The text response from the Gemini model.
+
+    Raises:
+        GeminiOverloaded, GeminiTimeout: Passed on so the endpoint can answer 503/504.
     """
     try:
-        # Strict medical-response prompt
-        medical_prompt = (
-            "You are a highly knowledgeable medical assistant. "
-            "Answer the following question strictly with medically relevant information only. "
-            "Avoid providing unrelated or generic information.\n\n"
-            f"Question: {question}"
-        )
-        response = chat.send_message(medical_prompt, stream=False)
-
-        # Extract the text content from the response object
-        if response and response.candidates:
-            # Access the first candidate's content directly
-            text_response = response.candidates[0].content.parts[0].text
-            return text_response.strip()
-        else:
-            return "No valid response received from the model."
+        return await sessions.send_async(session, build_medical_prompt(question), cached_generate,
+                                         summary_generate=llm.generate)
+    except (GeminiOverloaded, GeminiTimeout):
+        raise
     except Exception as e:
         return f"An error occurred while processing your query: {e}"
 
-# FastAPI app initialization
+# FastAPI app initialization; the model status and session endpoints come from the shared router
 app = FastAPI()
+chat = ChatService(llm, sessions)
+app.include_router(chat.router)
 
 # Request model for the question input
 class QuestionRequest(BaseModel):
     question: str
+    session_id: Optional[str] = None  # Omit to start a new session
 
 @app.post("/api/ask")
 async def ask_question(request: QuestionRequest):
@@ -64,9 +82,29 @@ async def ask_question(request: QuestionRequest):
     if not user_question:
         raise HTTPException(status_code=400, detail="Please provide a valid question.")
 
-    response = get_gemini_response(user_question)
+    session = sessions.get(request.session_id)  # A new session if the id is unknown or expired
+    response = await chat.answer_or_http_error(get_gemini_response(user_question, session))
+
+    return {"response": response, "session_id": session.session_id}
+
+@app.post("/api/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Streaming variant of /api/ask: the answer arrives as server-sent events
+    while it is generated ("session", then "message" events carrying {"text": ...},
+    then "done" or "error").
+    """
+    if not request.question:
+        raise HTTPException(status_code=400, detail="Please provide a valid question.")
+
+    session = sessions.get(request.session_id)  # A new session if the id is unknown or expired
+    return chat.event_stream_response(session, build_medical_prompt(request.question), cached_generate_stream,
+                                      summary_generate=llm.generate)
 
-    return {"response": response}
+@app.get("/api/cache_metrics")
+async def cache_metrics():
+    """Response cache hits, misses, coalesced requests and upstream calls saved."""
+    return await response_cache.metrics_async()
 
 # Run the FastAPI app
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List, Optional, Sequence
+import httpx
+import numpy as np
+
+# Client for a local Ollama server, plus a stand-in server for benchmarks and tests.
+
+# Local Ollama HTTP API (override with the OLLAMA_URL environment variable)
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+
+class OllamaClient:
+    """
+    Client for the Ollama /api/generate endpoint that keeps its HTTP connections open.
+
+    At most `max_concurrency` requests are in flight at once; callers beyond that
+    wait for a free slot.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, model: str = "mistral",
+                 max_concurrency: int = 4, timeout: float = 300.0):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._client = httpx.Client(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response tokens as the server produces them."""
+        payload = {"model": self.model, "prompt": prompt, "stream": True}
+        with self._slots:
+            with self._client.stream("POST", "/api/generate", json=payload) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if "error" in data:
+                        raise RuntimeError(data["error"])
+                    if data.get("response"):
+                        yield data["response"]
+                    if data.get("done"):
+                        break
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt)).strip()
+
+    def generate_many(self, prompts: Sequence[str]) -> List[str]:
+        """Generate answers for many prompts concurrently, in input order."""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(self.generate, prompts))
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+_ollama_client: Optional[OllamaClient] = None
+
+def get_ollama_client() -> OllamaClient:
+    global _ollama_client
+    if _ollama_client is None:
+        _ollama_client = OllamaClient()
+    return _ollama_client
+
+# Function to send a query to Ollama model (Mistral)
+def send_query_to_ollama(query: str) -> str:
+    try:
+        return get_ollama_client().generate(query)
+    except (httpx.HTTPError, RuntimeError) as e:
+        print(f"Error calling the Ollama API: {e}")
+        return "Error communicating with the model."
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Streams canned tokens in Ollama's NDJSON format, with configurable delays."""
+    protocol_version = "HTTP/1.1"
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client stopped reading, e.g. after the first token
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        self._counted = True
+        try:
+            self._respond()
+        finally:
+            self._end_request()
+
+    def _end_request(self):
+        # Called before the final write: a client sees the request end there and may start the next one
+        if self._counted:
+            self._counted = False
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _respond(self):
+        time.sleep(self.server.first_token_delay)
+        if self.server.status != 200:
+            self._end_request()
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(self.server.num_tokens):
+            if i:
+                time.sleep(self.server.token_delay)
+            self._write_chunk({"response": f"tok{i} ", "done": False})
+        self._end_request()
+        if self.server.error:
+            self._write_chunk({"error": self.server.error})
+        else:
+            self._write_chunk({"response": "", "done": True})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data: dict):
+        body = (json.dumps(data) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(body):X}\r\n".encode("ascii") + body + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+# Start a stand-in Ollama server on a free local port (for benchmarks and tests without a real model)
+def start_fake_ollama_server(num_tokens: int = 32, first_token_delay: float = 0.2,
+                             token_delay: float = 0.01, status: int = 200,
+                             error: Optional[str] = None) -> ThreadingHTTPServer:
+    """
+    `status` other than 200 answers every request with that HTTP status; `error` ends
+    each stream with an Ollama error line instead of `done`. `max_active` records the
+    most requests the server was handling at once.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllamaHandler)
+    server.daemon_threads = True
+    server.num_tokens = num_tokens
+    server.first_token_delay = first_token_delay
+    server.token_delay = token_delay
+    server.status = status
+    server.error = error
+    server.lock = threading.Lock()
+    server.active = 0
+    server.max_active = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Measure time-to-first-token and throughput of the Ollama client
+def benchmark_ollama(base_url: Optional[str] = None, num_requests: int = 32,
+                     concurrency_levels: Sequence[int] = (1, 4, 8)) -> dict:
+    """Runs against a fake local server unless `base_url` points at a real Ollama."""
+    server = None
+    if base_url is None:
+        server = start_fake_ollama_server()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    prompts = [f"Question {i}: Who painted the Mona Lisa?" for i in range(num_requests)]
+    results = {}
+    try:
+        with OllamaClient(base_url=base_url, max_concurrency=1) as client:
+            first_token_times = []
+            for prompt in prompts[:8]:
+                start = time.perf_counter()
+                for _ in client.stream(prompt):
+                    first_token_times.append(time.perf_counter() - start)
+                    break
+            results["ttft_ms"] = 1000 * float(np.median(first_token_times))
+            print(f"time to first token: {results['ttft_ms']:.1f} ms (median of {len(first_token_times)})")
+
+        for concurrency in concurrency_levels:
+            with OllamaClient(base_url=base_url, max_concurrency=concurrency) as client:
+                start = time.perf_counter()
+                answers = client.generate_many(prompts)
+                elapsed = time.perf_counter() - start
+            tokens = sum(len(answer.split()) for answer in answers)
+            results[concurrency] = {"requests_per_s": num_requests / elapsed, "tokens_per_s": tokens / elapsed}
+            print(f"concurrency={concurrency:>2}: {num_requests / elapsed:6.1f} requests/s, {tokens / elapsed:8.1f} tokens/s")
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    return results
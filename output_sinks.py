@@ -0,0 +1,210 @@
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+# Streaming output for scraped records. Records are buffered and written in
+# batches as they arrive, and a checkpoint file lists the pages/URLs whose
+# records are safely on disk, so a restarted crawl can skip them.
+#
+# Keys are appended to the checkpoint only after their records are flushed.
+# A crash can therefore lose at most the unflushed batch (those pages are
+# scraped again), and at worst repeat the records of one batch.
+
+class Checkpoint:
+    """An append-only file of finished keys (page URLs, product URLs), one per line."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.done = set()
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, keys: Iterable[str]):
+        keys = [key for key in keys if key not in self.done]
+        if not keys:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(keys)
+
+    def clear(self):
+        self.done = set()
+        if self.path.exists():
+            self.path.unlink()
+
+class RecordSink:
+    """
+    Base class of the batched sinks. Subclasses implement _write_batch() and
+    optionally _close().
+    """
+
+    def __init__(self, path, fieldnames: List[str], batch_size=100, checkpoint: Checkpoint = None):
+        self.path = Path(path)
+        self.fieldnames = list(fieldnames)
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.buffer = []
+        self.pending_keys = []
+        self.written = 0
+
+    def write(self, record: Dict):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[Dict]):
+        for record in records:
+            self.write(record)
+
+    def mark_done(self, key):
+        """Checkpoint key once everything written so far is flushed."""
+        self.pending_keys.append(key)
+        if not self.buffer:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self._write_batch(self.buffer)
+            self.written += len(self.buffer)
+            self.buffer = []
+        if self.checkpoint is not None and self.pending_keys:
+            self.checkpoint.add(self.pending_keys)
+        self.pending_keys = []
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class CsvSink(RecordSink):
+    def __init__(self, path, fieldnames, batch_size=100, checkpoint=None, append=True):
+        super().__init__(path, fieldnames, batch_size, checkpoint)
+        new_file = not append or not self.path.exists() or self.path.stat().st_size == 0
+        self.file = open(self.path, "w" if not append else "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction="ignore")
+        if new_file:
+            self.writer.writeheader()
+
+    def _write_batch(self, records):
+        self.writer.writerows(records)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _close(self):
+        self.file.close()
+
+class JsonlSink(RecordSink):
+    def __init__(self, path, fieldnames, batch_size=100, checkpoint=None, append=True):
+        super().__init__(path, fieldnames, batch_size, checkpoint)
+        self.file = open(self.path, "a" if append else "w", encoding="utf-8")
+
+    def _write_batch(self, records):
+        self.file.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _close(self):
+        self.file.close()
+
+class ParquetSink(RecordSink):
+    """
+    Writes each batch as its own complete Parquet file: products.parquet, then
+    products-1.parquet, products-2.parquet, ...; read them together as one
+    dataset. Parquet only becomes readable once its footer is written, so every
+    part is written to a temporary name and renamed when closed, before the
+    batch's keys are checkpointed. A crash never leaves a checkpointed part
+    unreadable. With append=False the earlier parts are deleted.
+    """
+
+    def __init__(self, path, fieldnames, batch_size=1000, checkpoint=None, append=True):
+        super().__init__(path, fieldnames, batch_size, checkpoint)
+        import pyarrow  # Only needed for this sink
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([(name, pyarrow.string()) for name in self.fieldnames])
+        parts = self.part_paths()
+        if not append:
+            for part_path in parts.values():
+                part_path.unlink()
+            parts = {}
+        self.next_part = max(parts, default=-1) + 1
+
+    def _part_path(self, part):
+        base = self.path
+        return base if part == 0 else base.with_name(f"{base.stem}-{part}{base.suffix}")
+
+    def part_paths(self) -> Dict[int, Path]:
+        """Existing part files by part number (0 is the base path itself)."""
+        base = self.path
+        parts = {0: base} if base.exists() else {}
+        for candidate in base.parent.glob(f"{base.stem}-*{base.suffix}"):
+            number = candidate.name[len(base.stem) + 1:-len(base.suffix) or None]
+            if number.isdigit():
+                parts[int(number)] = candidate
+        return parts
+
+    def _write_batch(self, records):
+        columns = {
+            name: [None if record.get(name) is None else str(record.get(name)) for record in records]
+            for name in self.fieldnames
+        }
+        part_path = self._part_path(self.next_part)
+        tmp_path = part_path.with_name(part_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            self.pa.parquet.write_table(self.pa.table(columns, schema=self.schema), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, part_path)
+        self.next_part += 1
+
+SINKS = {".csv": CsvSink, ".jsonl": JsonlSink, ".parquet": ParquetSink}
+
+def open_sink(path, fieldnames, batch_size=100, resume=True):
+    """
+    Open a sink chosen by file extension (.csv, .jsonl or .parquet) with a
+    checkpoint at <path>.checkpoint. With resume=False any earlier output
+    and checkpoint are discarded.
+    """
+    path = Path(path)
+    sink_class = SINKS.get(path.suffix.lower())
+    if sink_class is None:
+        raise ValueError(f"Unsupported output format {path.suffix!r}; use one of {', '.join(SINKS)}")
+    checkpoint = Checkpoint(path.with_name(path.name + ".checkpoint"))
+    if not resume:
+        checkpoint.clear()
+    return sink_class(path, fieldnames, batch_size=batch_size, checkpoint=checkpoint, append=resume)
+
+ITEM_FIELDS = ["url", "store", "title", "price", "scraped_at"]
+
+def item_record(url, item) -> Dict:
+    """Flatten a scraper Item into a sink record."""
+    return {
+        "url": url,
+        "store": item.store.name,
+        "title": item.title,
+        "price": item.price,
+        "scraped_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
@@ -0,0 +1,46 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List
+import pdfplumber
+
+# Extraction lives in its own small module so process-pool workers can import it
+# without loading the embedding model or any other pipeline state.
+
+# Extract the text of pages [start, stop) (runs inside a worker process)
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(page.extract_text() or '')
+            page.close()
+    return texts
+
+def count_pdf_pages(pdf_path: str) -> int:
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+# Stream a PDF's text one page at a time
+def iter_pdf_pages(pdf_path: str, workers: int = 1, pages_per_task: int = 16) -> Iterator[str]:
+    """
+    Yield the text of each page in order; pages without a text layer yield ''.
+
+    With workers > 1, page ranges are extracted in a process pool. Only about
+    2 * workers ranges are in flight at once, so memory stays bounded however
+    long the document is.
+    """
+    if workers <= 1:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page in pdf.pages:
+                yield page.extract_text() or ''
+                page.close()  # Free the page's cached layout objects
+        return
+
+    num_pages = count_pdf_pages(pdf_path)
+    ranges = deque((start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while ranges or pending:
+            while ranges and len(pending) < 2 * workers:
+                start, stop = ranges.popleft()
+                pending.append(pool.submit(_extract_page_range, str(pdf_path), start, stop))
+            yield from pending.popleft().result()
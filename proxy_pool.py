@@ -0,0 +1,253 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+import httpx
+
+# Health-scored proxy rotation for the scrapers. Every request reports back
+# its latency and outcome; proxies are chosen with probability proportional
+# to their health, and failing ones sit out a quarantine that doubles with
+# each consecutive failure.
+
+# Markers of Amazon's robot check and similar block pages
+BAN_MARKERS = (
+    "Enter the characters you see below",
+    "/errors/validateCaptcha",
+    "Robot Check",
+    "To discuss automated access to Amazon data",
+)
+BAN_STATUS_CODES = (403, 429, 503)
+
+def looks_banned(page_source: str, status_code: Optional[int] = None) -> bool:
+    """True when a response looks like a captcha or block page rather than content."""
+    if status_code in BAN_STATUS_CODES:
+        return True
+    return any(marker in page_source for marker in BAN_MARKERS)
+
+class NoProxyAvailable(RuntimeError):
+    """Every proxy is quarantined for longer than the pool is willing to wait."""
+
+def parse_proxy(address: str) -> Tuple[str, int]:
+    """Split a "host:port" string, raising ValueError with the offending entry if it is malformed."""
+    host, sep, port = address.strip().rpartition(":")
+    if not sep or not host or "/" in host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"invalid proxy {address.strip()!r}, expected host:port")
+    return host, int(port)
+
+@dataclass
+class ProxyStats:
+    host: str
+    port: int
+    successes: int = 0
+    failures: int = 0
+    bans: int = 0
+    latency: Optional[float] = None  # Exponentially weighted moving average, seconds
+    consecutive_failures: int = 0
+    quarantined_until: float = 0.0
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    @property
+    def success_rate(self):
+        # Laplace smoothing, so a new proxy starts at 0.5 instead of 0 or 1
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+class ProxyPool:
+    """
+    A set of proxies chosen by health.
+
+    A proxy's weight is its smoothed success rate divided by (1 + latency /
+    target_latency), scaled down for each ban it has drawn. After a failure
+    a proxy is quarantined for base_quarantine * 2**(consecutive failures - 1)
+    seconds (capped at max_quarantine); a ban counts as ban_penalty failures.
+    acquire() waits at most max_wait seconds for a quarantined proxy.
+    """
+
+    def __init__(self, proxies, target_latency=2.0, base_quarantine=30.0, max_quarantine=1800.0,
+                 ban_penalty=3, latency_alpha=0.3, max_wait=60.0, seed=None):
+        self.proxies = [ProxyStats(host, int(port)) for host, port in proxies]
+        if not self.proxies:
+            raise ValueError("ProxyPool needs at least one proxy")
+        self.target_latency = target_latency
+        self.base_quarantine = base_quarantine
+        self.max_quarantine = max_quarantine
+        self.ban_penalty = ban_penalty
+        self.latency_alpha = latency_alpha
+        self.max_wait = max_wait
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_strings(cls, addresses: List[str], **kwargs):
+        """Build a pool from "host:port" strings; raises ValueError on a malformed entry."""
+        return cls([parse_proxy(address) for address in addresses if address.strip()], **kwargs)
+
+    def weight(self, proxy: ProxyStats) -> float:
+        latency = proxy.latency if proxy.latency is not None else self.target_latency
+        return proxy.success_rate / (1 + latency / self.target_latency) / (1 + proxy.bans)
+
+    def acquire(self, exclude=()) -> ProxyStats:
+        """
+        Pick a proxy that is not quarantined, weighted by health.
+
+        If every proxy is quarantined, this sleeps until the first one is
+        released, or raises NoProxyAvailable if that is more than max_wait
+        seconds away. Proxies in `exclude` are only used when nothing else is left.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                available = [p for p in self.proxies if p.quarantined_until <= now]
+                preferred = [p for p in available if p.address not in exclude] or available
+                if preferred:
+                    return self._random.choices(preferred, weights=[self.weight(p) for p in preferred])[0]
+                wait = min(p.quarantined_until for p in self.proxies) - now
+            if wait > self.max_wait:
+                raise NoProxyAvailable(f"all {len(self.proxies)} proxies are quarantined for at least {wait:.0f}s")
+            if wait >= 1:
+                print(f"All {len(self.proxies)} proxies are quarantined, waiting {wait:.0f}s for the next one.")
+            time.sleep(max(wait, 0.01))
+
+    def report(self, proxy: ProxyStats, ok: bool, latency: Optional[float] = None, banned: bool = False):
+        """Record the outcome of one request made through proxy."""
+        with self._lock:
+            if latency is not None:
+                if proxy.latency is None:
+                    proxy.latency = latency
+                else:
+                    proxy.latency += self.latency_alpha * (latency - proxy.latency)
+            if ok:
+                proxy.successes += 1
+                proxy.consecutive_failures = 0
+                return
+            proxy.failures += 1
+            proxy.consecutive_failures += self.ban_penalty if banned else 1
+            if banned:
+                proxy.bans += 1
+            backoff = self.base_quarantine * 2 ** (proxy.consecutive_failures - 1)
+            proxy.quarantined_until = time.monotonic() + min(backoff, self.max_quarantine)
+
+    def summary(self):
+        now = time.monotonic()
+        rows = []
+        for p in sorted(self.proxies, key=self.weight, reverse=True):
+            rows.append({
+                "Proxy": p.address,
+                "OK": p.successes,
+                "Failed": p.failures,
+                "Bans": p.bans,
+                "Latency (s)": f"{p.latency:.2f}" if p.latency is not None else "-",
+                "Weight": f"{self.weight(p):.3f}",
+                "Quarantined (s)": f"{max(p.quarantined_until - now, 0):.0f}",
+            })
+        return rows
+
+class _StandInProxyHandler(BaseHTTPRequestHandler):
+    """
+    A local stand-in for an HTTP proxy: answers absolute-URI GETs itself
+    after `latency` seconds, failing with `fail_rate` and serving a captcha
+    page with `ban_rate`.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+        roll = server.random.random()
+        if roll < server.fail_rate:
+            self.send_response(502)
+            body = b"Bad gateway"
+        elif roll < server.fail_rate + server.ban_rate:
+            self.send_response(200)
+            body = b"<html><body><h4>Enter the characters you see below</h4></body></html>"
+        else:
+            self.send_response(200)
+            body = f"<html><body><div class='s-result-item'>{self.path}</div></body></html>".encode()
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stand_in_proxy(latency=0.05, fail_rate=0.0, ban_rate=0.0, seed=0):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInProxyHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.ban_rate = ban_rate
+    server.random = random.Random(seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# One pooled client per proxy, so connections to it are reused across requests
+def client_for(proxy: ProxyStats, timeout=10.0) -> httpx.Client:
+    with _clients_lock:
+        client = _clients.get(proxy.address)
+        if client is None:
+            client = _clients[proxy.address] = httpx.Client(proxy=f"http://{proxy.address}", timeout=timeout)
+        return client
+
+def fetch_through_pool(pool: ProxyPool, url, max_attempts=4, timeout=10.0):
+    """GET url through the pool, retrying on other proxies; returns the page text or None."""
+    tried = set()
+    for _ in range(max_attempts):
+        proxy = pool.acquire(exclude=tried)
+        tried.add(proxy.address)
+        start = time.perf_counter()
+        try:
+            resp = client_for(proxy, timeout).get(url)
+        except httpx.HTTPError:
+            pool.report(proxy, ok=False, latency=time.perf_counter() - start)
+            continue
+        latency = time.perf_counter() - start
+        if looks_banned(resp.text, resp.status_code):
+            pool.report(proxy, ok=False, latency=latency, banned=True)
+        elif resp.status_code >= 400:
+            pool.report(proxy, ok=False, latency=latency)
+        else:
+            pool.report(proxy, ok=True, latency=latency)
+            return resp.text
+    return None
+
+def benchmark_proxy_pool(num_pages=200, workers=8):
+    """Crawl through local stand-in proxies of mixed quality, first via one proxy and then via the pool."""
+    profiles = [
+        dict(latency=0.40, fail_rate=0.30, ban_rate=0.20),  # The proxy a single-proxy run happened to get
+        dict(latency=0.05, fail_rate=0.02, ban_rate=0.0),
+        dict(latency=0.10, fail_rate=0.05, ban_rate=0.02),
+        dict(latency=0.30, fail_rate=0.10, ban_rate=0.0),
+        dict(latency=0.05, fail_rate=0.60, ban_rate=0.10),
+    ]
+    servers = [start_stand_in_proxy(seed=i, **profile) for i, profile in enumerate(profiles)]
+    addresses = [("127.0.0.1", s.server_address[1]) for s in servers]
+    urls = [f"http://www.amazon.example/s?k=yarn&page={i}" for i in range(num_pages)]
+    try:
+        results = {}
+        for label, pool in (
+            ("single proxy", ProxyPool(addresses[:1], base_quarantine=0.0, seed=0)),
+            ("health-scored pool", ProxyPool(addresses, base_quarantine=0.5, max_quarantine=5.0, seed=0)),
+        ):
+            attempts = 1 if label == "single proxy" else 4
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                pages = list(executor.map(lambda url: fetch_through_pool(pool, url, max_attempts=attempts), urls))
+            elapsed = time.perf_counter() - start
+            ok = sum(page is not None for page in pages)
+            results[label] = {"seconds": elapsed, "pages_ok": ok, "pages_per_sec": ok / elapsed}
+            print(f"{label:<20} {ok}/{num_pages} pages in {elapsed:.1f}s ({ok / elapsed:.1f} good pages/sec)")
+        for row in pool.summary():
+            print("  " + ", ".join(f"{key}: {value}" for key, value in row.items()))
+        return results
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,506 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Union
+
+# A response cache in front of the Gemini calls. Answers are keyed on the
+# model, the system prompt and the normalized conversation, so "What are flu
+# symptoms?" and "what are  flu symptoms" share one entry while a follow-up
+# question (different history) does not. Identical requests that arrive while
+# the first is still waiting on the model share its upstream call
+# (single-flight) instead of each paying for one. The shared upstream call
+# runs on its own (task or thread), so it completes and is cached even if the
+# request that started it goes away.
+
+# Function to normalize prompt text for cache keys
+def normalize_prompt(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!. ")
+
+def cache_key(contents: Union[str, List[Dict]], model: str, system_prompt: str = "") -> str:
+    """SHA-256 of the model, system prompt and normalized turns."""
+    if isinstance(contents, str):
+        contents = [{"role": "user", "parts": [{"text": contents}]}]
+    turns = [[t["role"], normalize_prompt("".join(part.get("text", "") for part in t["parts"]))] for t in contents]
+    payload = json.dumps([model, normalize_prompt(system_prompt), turns], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LruBackend:
+    """In-memory backend: at most max_entries answers, least recently used evicted first."""
+    name = "lru"
+    blocking = False
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value: str, ttl: float):
+        with self._lock:
+            self.entries[key] = (value, time.time() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+class SqliteBackend:
+    """On-disk backend shared by every worker process on the host; expired rows are purged as they are met."""
+    name = "sqlite"
+    blocking = True  # Async callers run get/set in a worker thread
+
+    def __init__(self, path="response_cache.db"):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; sqlite3 connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key) -> Optional[str]:
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= time.time():
+            with conn:
+                conn.execute("DELETE FROM responses WHERE key = ? AND expires_at <= ?", (key, time.time()))
+            return None
+        return row[0]
+
+    def set(self, key, value: str, ttl: float):
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, now + ttl, now))
+
+    def purge_expired(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+class _StreamFlight:
+    """The chunks of one upstream stream so far, replayed to every request that shares it (asyncio)."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._more = asyncio.Event()
+
+    def publish(self, chunk):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, error=None):
+        self.done, self.error = True, error
+        self._wake()
+
+    def _wake(self):
+        more, self._more = self._more, asyncio.Event()
+        more.set()
+
+    async def replay(self):
+        sent = 0
+        while True:
+            while sent < len(self.chunks):
+                yield self.chunks[sent]
+                sent += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._more.wait()
+
+class _SyncStreamFlight:
+    """Same as _StreamFlight for blocking callers, filled by a producer thread."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self._changed = threading.Condition()
+
+    def publish(self, chunk):
+        with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        with self._changed:
+            self.done, self.error = True, error
+            self._changed.notify_all()
+
+    def replay(self):
+        sent = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: sent < len(self.chunks) or self.done)
+                new, done = self.chunks[sent:], self.done
+            yield from new
+            sent += len(new)
+            if done and sent == len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+class ResponseCache:
+    """
+    Cached, single-flight access to a model. wrap()/wrap_stream() turn an
+    async generate(contents) -> str or stream(contents) -> chunks into cached
+    ones; wrap_sync()/wrap_stream_sync() do the same for blocking callables.
+    Failed calls are never cached.
+
+    The first request for a key leads: its upstream call runs in a task
+    (async) or thread (streams, blocking) of its own, and identical requests
+    that arrive meanwhile follow it, streams replaying its chunks. A leader
+    that disconnects therefore neither fails its followers nor wastes the
+    answer, which is still cached.
+    """
+
+    def __init__(self, backend, model: str, ttl: float = 24 * 3600):
+        self.backend = backend
+        self.model = model
+        self.ttl = ttl
+        self.stats = Counter()
+        self._inflight = {}  # key -> asyncio.Future of the leader's answer
+        self._flights = {}  # key -> _StreamFlight of a streaming leader
+        self._tasks = set()  # Leader tasks, referenced until they finish
+        self._inflight_sync = {}  # key -> (concurrent.futures.Future, _SyncStreamFlight or None)
+        self._sync_lock = threading.Lock()
+
+    def key(self, contents, system_prompt=""):
+        return cache_key(contents, self.model, system_prompt)
+
+    def _count_lookup(self, value):
+        self.stats["hits" if value is not None else "misses"] += 1
+        return value
+
+    def _lookup(self, key):
+        return self._count_lookup(self.backend.get(key))
+
+    async def _lookup_async(self, key):
+        get = self.backend.get
+        return self._count_lookup(await asyncio.to_thread(get, key) if self.backend.blocking else get(key))
+
+    def _recheck(self, key):
+        """Cache lookup for a new leader, counted as a hit rather than a miss when it finds the answer."""
+        value = self.backend.get(key)
+        if value is not None:
+            self.stats["misses"] -= 1
+            self.stats["hits"] += 1
+        return value
+
+    async def _recheck_async(self, key):
+        if not self.backend.blocking:
+            return self._recheck(key)
+        return await asyncio.to_thread(self._recheck, key)
+
+    def _store(self, key, value):
+        self.backend.set(key, value, self.ttl)
+        self.stats["stores"] += 1
+
+    async def _store_async(self, key, value):
+        if self.backend.blocking:
+            await asyncio.to_thread(self.backend.set, key, value, self.ttl)
+        else:
+            self.backend.set(key, value, self.ttl)
+        self.stats["stores"] += 1
+
+    async def _follow(self, key):
+        """Wait for the answer of the identical request already in flight."""
+        self.stats["coalesced"] += 1
+        return await asyncio.shield(self._inflight[key])
+
+    def _lead(self, key, answer, flight=None) -> asyncio.Future:
+        """Run the awaitable `answer` as a task of its own; the returned future resolves to its text."""
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+
+        async def run():
+            try:
+                # A leader that finished while our lookup ran has stored and left _inflight: use its answer
+                value = await self._recheck_async(key)
+                if value is None:
+                    value = await answer
+                    await self._store_async(key, value)  # Stored before the key leaves _inflight, so no gap
+                else:
+                    answer.close()
+                    if flight:
+                        flight.publish(value)
+                future.set_result(value)
+                if flight:
+                    flight.finish()
+            except BaseException as e:
+                error = e if isinstance(e, Exception) else RuntimeError("Upstream call was cancelled")
+                future.set_exception(error)
+                future.exception()  # Retrieved here so an unawaited failure is not logged
+                if flight:
+                    flight.finish(error)
+                if not isinstance(e, Exception):
+                    raise
+            finally:
+                del self._inflight[key]
+                self._flights.pop(key, None)
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return future
+
+    def wrap(self, generate, system_prompt=""):
+        async def cached_generate(contents):
+            key = self.key(contents, system_prompt)
+            value = await self._lookup_async(key)
+            if value is not None:
+                return value
+            if key in self._inflight:
+                return await self._follow(key)
+            return await asyncio.shield(self._lead(key, generate(contents)))
+        return cached_generate
+
+    @staticmethod
+    async def _pump(stream, contents, flight) -> str:
+        async for chunk in stream(contents):
+            flight.publish(chunk)
+        return "".join(flight.chunks).strip()
+
+    def wrap_stream(self, stream, system_prompt=""):
+        async def cached_stream(contents):
+            key = self.key(contents, system_prompt)
+            value = await self._lookup_async(key)
+            if value is not None:
+                yield value
+                return
+            flight = self._flights.get(key)
+            if flight is None and key in self._inflight:  # A non-streaming leader: wait for its whole answer
+                yield await self._follow(key)
+                return
+            if flight is None:
+                flight = self._flights[key] = _StreamFlight()
+                self._lead(key, self._pump(stream, contents, flight), flight)
+            else:
+                self.stats["coalesced"] += 1
+            async for chunk in flight.replay():
+                yield chunk
+        return cached_stream
+
+    def _lead_or_follow_sync(self, key, flight=None):
+        """Return (future, flight of the leader, is_leader) for a blocking caller."""
+        with self._sync_lock:
+            entry = self._inflight_sync.get(key)
+            if entry is not None:
+                self.stats["coalesced"] += 1
+                return entry[0], entry[1], False
+            future = Future()
+            self._inflight_sync[key] = (future, flight)
+            return future, flight, True
+
+    def _finish_sync(self, key, future, value=None, error=None, store=True):
+        if error is None:
+            if store:
+                self._store(key, value)  # Stored before the key leaves _inflight_sync, so no gap
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+        with self._sync_lock:
+            del self._inflight_sync[key]
+
+    def wrap_sync(self, generate, system_prompt=""):
+        def cached_generate(contents):
+            key = self.key(contents, system_prompt)
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            future, _, leader = self._lead_or_follow_sync(key)
+            if not leader:
+                return future.result()
+            try:
+                value = self._recheck(key)  # A leader that finished while our lookup ran has stored and left
+                if value is not None:
+                    self._finish_sync(key, future, value, store=False)
+                    return value
+                value = generate(contents)
+            except BaseException as e:
+                # Includes a Streamlit rerun stopping the leader's script; followers must not wait forever
+                self._finish_sync(key, future, error=e if isinstance(e, Exception) else RuntimeError("Upstream call was abandoned"))
+                raise
+            self._finish_sync(key, future, value)
+            return value
+        return cached_generate
+
+    def _pump_sync(self, key, stream, contents, future, flight):
+        try:
+            value = self._recheck(key)  # A leader that finished while our lookup ran has stored and left
+            if value is not None:
+                flight.publish(value)
+                self._finish_sync(key, future, value, store=False)
+                flight.finish()
+                return
+            for chunk in stream(contents):
+                flight.publish(chunk)
+            self._finish_sync(key, future, "".join(flight.chunks).strip())
+            flight.finish()
+        except Exception as e:
+            self._finish_sync(key, future, error=e)
+            flight.finish(e)
+
+    def wrap_stream_sync(self, stream, system_prompt=""):
+        def cached_stream(contents):
+            key = self.key(contents, system_prompt)
+            value = self._lookup(key)
+            if value is not None:
+                yield value
+                return
+            future, flight, leader = self._lead_or_follow_sync(key, _SyncStreamFlight())
+            if leader:
+                threading.Thread(target=self._pump_sync, args=(key, stream, contents, future, flight), daemon=True).start()
+            if flight is None:  # A non-streaming leader: wait for its whole answer
+                yield future.result()
+                return
+            yield from flight.replay()
+        return cached_stream
+
+    def metrics(self):
+        return self._metrics(len(self.backend))
+
+    async def metrics_async(self):
+        """metrics() for the event loop: counting a SQLite cache's entries runs in a thread."""
+        entries = await asyncio.to_thread(len, self.backend) if self.backend.blocking else len(self.backend)
+        return self._metrics(entries)
+
+    def _metrics(self, entries):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "backend": self.backend.name,
+            "model": self.model,
+            "entries": entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "coalesced": self.stats["coalesced"],
+            "stores": self.stats["stores"],
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            # Hits and coalesced followers both skipped an upstream call
+            "upstream_calls_saved": self.stats["hits"] + self.stats["coalesced"],
+            "in_flight": len(self._inflight) + len(self._inflight_sync),
+        }
+
+def cache_from_env(model: str) -> ResponseCache:
+    """
+    Build the cache the services use. RESPONSE_CACHE_BACKEND picks lru
+    (default) or sqlite (file at RESPONSE_CACHE_PATH); RESPONSE_CACHE_TTL and
+    RESPONSE_CACHE_SIZE set the lifetime in seconds and the LRU capacity.
+    """
+    if os.getenv("RESPONSE_CACHE_BACKEND", "lru") == "sqlite":
+        backend = SqliteBackend(os.getenv("RESPONSE_CACHE_PATH", "response_cache.db"))
+    else:
+        backend = LruBackend(int(os.getenv("RESPONSE_CACHE_SIZE", "10000")))
+    return ResponseCache(backend, model, ttl=float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600))))
+
+COMMON_QUESTIONS = [
+    "What are flu symptoms?", "What are the symptoms of COVID-19?", "How do I treat a migraine?",
+    "What is a normal blood pressure?", "How much water should I drink a day?", "What causes heartburn?",
+    "Is a fever of 38C dangerous?", "How long does a cold last?", "What are the signs of dehydration?",
+    "When should I see a doctor for a cough?",
+]
+
+def benchmark_response_cache(num_requests=500, concurrency=50, latency=0.5, backend="lru", seed=0):
+    """
+    Replay a skewed mix of common (re-phrased) and one-off questions against a
+    stand-in model with and without the cache; reports upstream calls and time.
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(COMMON_QUESTIONS))]
+    questions = []
+    for i in range(num_requests):
+        if rng.random() < 0.2:
+            questions.append(f"Unusual question number {i} about my left elbow")
+        else:
+            question = rng.choices(COMMON_QUESTIONS, weights=weights)[0]
+            questions.append(rng.choice([question, question.lower(), question.rstrip("?"), f"  {question}  "]))
+
+    async def run(use_cache):
+        calls = Counter()
+
+        async def generate(contents):
+            calls["upstream"] += 1
+            await asyncio.sleep(latency)
+            return f"Answer to {contents[-1]['parts'][0]['text']}"
+
+        cache = None
+        if use_cache:
+            store = SqliteBackend(f"response_cache_benchmark_{os.getpid()}.db") if backend == "sqlite" else LruBackend()
+            cache = ResponseCache(store, "gemini-pro")
+            generate = cache.wrap(generate, system_prompt="You are a highly knowledgeable medical assistant.")
+        slots = asyncio.Semaphore(concurrency)
+
+        async def ask(question):
+            async with slots:
+                await generate([{"role": "user", "parts": [{"text": question}]}])
+
+        start = time.perf_counter()
+        await asyncio.gather(*(ask(q) for q in questions))
+        return time.perf_counter() - start, calls["upstream"], cache
+
+    results = {}
+    for label, use_cache in (("no cache", False), (f"{backend} cache", True)):
+        elapsed, upstream, cache = asyncio.run(run(use_cache))
+        results[label] = {"seconds": elapsed, "upstream_calls": upstream}
+        print(f"{label:<14} {num_requests} requests in {elapsed:.1f}s, {upstream} upstream model calls")
+        if cache:
+            metrics = cache.metrics()
+            print(f"  hit rate {metrics['hit_rate']:.1%}, coalesced {metrics['coalesced']}, "
+                  f"upstream calls saved {metrics['upstream_calls_saved']}")
+            if backend == "sqlite":
+                os.remove(cache.backend.path)
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(cache.backend.path + suffix):
+                        os.remove(cache.backend.path + suffix)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the LLM response cache against a stand-in model.")
+    parser.add_argument("--requests", type=int, default=500, help="Questions to replay.")
+    parser.add_argument("--concurrency", type=int, default=50, help="Questions in flight at once.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds the stand-in model takes per answer.")
+    parser.add_argument("--backend", choices=["lru", "sqlite"], default="lru", help="Cache backend to benchmark.")
+    args = parser.parse_args()
+    benchmark_response_cache(args.requests, args.concurrency, args.latency, args.backend)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import random
+import time
+from dataclasses import dataclass
+
+# Maps product URLs to their store. Stores are indexed by hostname, then by
+# a trie over path segments, so a lookup costs one dict probe plus one step
+# per path segment however many stores are registered. Only the host and
+# path of a URL are considered, never its query string or fragment.
+
+class _PathNode:
+    __slots__ = ("children", "store")
+
+    def __init__(self):
+        self.children = {}
+        self.store = None
+
+# A cut-down urlsplit: lookups run once per crawled URL, and the full parser dominated their cost
+def _split_url(url):
+    end = len(url)
+    for delimiter in "?#":
+        cut = url.find(delimiter, 0, end)
+        if cut >= 0:
+            end = cut
+    start = url.find("//", 0, end)
+    start = 0 if start < 0 else start + 2
+    slash = url.find("/", start, end)
+    netloc = url[start:end] if slash < 0 else url[start:slash]
+    path = "" if slash < 0 else url[slash:end]
+    host = netloc.rpartition("@")[2]
+    if host.startswith("["):  # IPv6 literal
+        host = host[:host.find("]") + 1]
+    else:
+        host = host.partition(":")[0]
+    return host.lower(), [segment for segment in path.split("/") if segment]
+
+class StoreRegistry:
+    """
+    Store lookup by hostname and longest matching path prefix.
+
+    A store URL such as https://www.fjallraven.com/uk/en-gb/ matches any URL
+    on www.fjallraven.com whose path starts with the segments /uk/en-gb/.
+    When several stores match, the one with the longest prefix wins. The
+    scheme and port are ignored.
+    """
+
+    def __init__(self, stores=()):
+        self._hosts = {}
+        self.size = 0
+        for store in stores:
+            self.add(store)
+
+    def add(self, store):
+        host, segments = _split_url(store.url)
+        if not host:
+            print(f"[Error] Store {store.name} has no hostname in its URL: {store.url}")
+            return
+        node = self._hosts.setdefault(host, _PathNode())
+        for segment in segments:
+            node = node.children.setdefault(segment, _PathNode())
+        if node.store is None:  # Keep the first store registered for a prefix, like the old linear scan
+            node.store = store
+            self.size += 1
+
+    def match(self, url):
+        """Return the store for url, or None."""
+        host, segments = _split_url(url)
+        node = self._hosts.get(host)
+        if node is None:
+            return None
+        best = node.store
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.store is not None:
+                best = node.store
+        return best
+
+    def __len__(self):
+        return self.size
+
+@dataclass
+class _BenchStore:
+    name: str
+    url: str
+
+# Function to time the old linear substring scan against the registry
+def benchmark_store_lookup(num_stores=10_000, num_urls=1_000_000, linear_sample=2_000, seed=0):
+    rng = random.Random(seed)
+    stores = []
+    for i in range(num_stores):
+        if i % 4 == 0:
+            url = f"https://shop{i}.example.com/"
+        else:
+            url = f"https://www.retailer{i // 4}.example.com/{rng.choice(['uk', 'us', 'de'])}/{i}/"
+        stores.append(_BenchStore(f"store{i}", url))
+    urls = []
+    for _ in range(num_urls):
+        store = stores[rng.randrange(num_stores)]
+        urls.append(f"{store.url}product/{rng.randrange(10**6)}?ref=home&utm_source=mail")
+
+    start = time.perf_counter()
+    registry = StoreRegistry(stores)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matched = sum(registry.match(url) is not None for url in urls)
+    registry_s = time.perf_counter() - start
+
+    sample = urls[:linear_sample]
+    start = time.perf_counter()
+    for url in sample:
+        next((store for store in stores if store.url in url), None)
+    linear_s = (time.perf_counter() - start) / len(sample) * num_urls
+
+    print(f"{num_stores} stores, {num_urls} URLs")
+    print(f"registry build:  {build_s:.2f}s")
+    print(f"registry lookup: {registry_s:.2f}s ({num_urls / registry_s:,.0f} URLs/sec, {matched} matched)")
+    print(f"linear scan:     {linear_s:.0f}s (extrapolated from {len(sample)} URLs), "
+          f"{linear_s / registry_s:,.0f}x slower")
+    return {"build_s": build_s, "registry_s": registry_s, "linear_s": linear_s}
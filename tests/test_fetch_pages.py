@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from Scrapper_StaticWebsites import fetch_pages, start_delayed_server
+
+
+@pytest.fixture
+def server():
+    server = start_delayed_server(0.05)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def product_names(pages):
+    return [page.css_first("span.base").text() if page is not None else None for page in pages]
+
+
+def test_results_keep_url_order(server):
+    port = server.server_address[1]
+    # Later URLs answer first, so completion order is the reverse of the input order
+    urls = [f"http://127.0.0.1:{port}/product/{i}?delay={0.02 * (10 - i)}" for i in range(10)]
+    pages = asyncio.run(fetch_pages(urls, {}, max_concurrency=10, per_host=10))
+    assert product_names(pages) == [f"Product /product/{i}" for i in range(10)]
+
+
+def test_failed_pages_come_back_as_none(server):
+    port = server.server_address[1]
+    urls = [
+        f"http://127.0.0.1:{port}/product/0",
+        f"http://127.0.0.1:{port}/fail/1",
+        f"http://127.0.0.1:{port}/product/2",
+        "http://127.0.0.1:1/product/3",  # Nothing listens on port 1
+    ]
+    pages = asyncio.run(fetch_pages(urls, {}))
+    assert product_names(pages) == ["Product /product/0", None, "Product /product/2", None]
+
+
+def test_global_limit(server):
+    port = server.server_address[1]
+    urls = [f"http://127.0.0.1:{port}/product/{i}" for i in range(20)]
+    pages = asyncio.run(fetch_pages(urls, {}, max_concurrency=3, per_host=10))
+    assert None not in pages
+    assert server.max_active == 3
+
+
+def test_per_host_limit(server):
+    port = server.server_address[1]
+    # Two host names for the same server, so the per-host limit binds before the global one
+    urls = [f"http://{host}:{port}/product/{i}" for i in range(12) for host in ("127.0.0.1", "localhost")]
+    pages = asyncio.run(fetch_pages(urls, {}, max_concurrency=10, per_host=2))
+    assert None not in pages
+    assert server.max_active_per_host == {"127.0.0.1": 2, "localhost": 2}
+    assert server.max_active <= 4
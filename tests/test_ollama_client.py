@@ -0,0 +1,84 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from ollama_client import OllamaClient, start_fake_ollama_server
+
+
+@pytest.fixture
+def fake_ollama(request):
+    """Start a fake Ollama server; tests pass its options through `indirect` params."""
+    server = start_fake_ollama_server(**getattr(request, "param", {}))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def base_url(server) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+@pytest.mark.parametrize("fake_ollama", [{"num_tokens": 5, "first_token_delay": 0.0}], indirect=True)
+def test_stream_yields_tokens_in_order(fake_ollama):
+    with OllamaClient(base_url=base_url(fake_ollama)) as client:
+        tokens = list(client.stream("hi"))
+        assert tokens == [f"tok{i} " for i in range(5)]
+        assert client.generate("hi") == "tok0 tok1 tok2 tok3 tok4"
+
+
+@pytest.mark.parametrize("fake_ollama", [{"num_tokens": 20, "first_token_delay": 0.0, "token_delay": 0.05}],
+                         indirect=True)
+def test_first_token_arrives_before_stream_ends(fake_ollama):
+    with OllamaClient(base_url=base_url(fake_ollama)) as client:
+        start = time.perf_counter()
+        stream = client.stream("hi")
+        assert next(stream) == "tok0 "
+        assert time.perf_counter() - start < 0.5  # The whole answer takes about 1 s
+        stream.close()
+
+
+@pytest.mark.parametrize("fake_ollama", [{"first_token_delay": 1.0}], indirect=True)
+def test_timeout_raises(fake_ollama):
+    with OllamaClient(base_url=base_url(fake_ollama), timeout=0.2) as client:
+        with pytest.raises(httpx.TimeoutException):
+            client.generate("hi")
+
+
+@pytest.mark.parametrize("fake_ollama", [{"first_token_delay": 0.0, "status": 500}], indirect=True)
+def test_http_error_status_raises(fake_ollama):
+    with OllamaClient(base_url=base_url(fake_ollama)) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.generate("hi")
+
+
+@pytest.mark.parametrize("fake_ollama", [{"num_tokens": 2, "first_token_delay": 0.0, "error": "model not found"}],
+                         indirect=True)
+def test_error_line_raises_after_earlier_tokens(fake_ollama):
+    with OllamaClient(base_url=base_url(fake_ollama)) as client:
+        received = []
+        with pytest.raises(RuntimeError, match="model not found"):
+            for token in client.stream("hi"):
+                received.append(token)
+        assert received == ["tok0 ", "tok1 "]
+
+
+@pytest.mark.parametrize("fake_ollama", [{"num_tokens": 3, "first_token_delay": 0.1}], indirect=True)
+def test_generate_many_respects_max_concurrency(fake_ollama):
+    prompts = [f"q{i}" for i in range(8)]
+    with OllamaClient(base_url=base_url(fake_ollama), max_concurrency=2) as client:
+        answers = client.generate_many(prompts)
+    assert answers == ["tok0 tok1 tok2"] * len(prompts)
+    assert fake_ollama.max_active == 2
+
+
+@pytest.mark.parametrize("fake_ollama", [{"num_tokens": 3, "first_token_delay": 0.1}], indirect=True)
+def test_callers_beyond_max_concurrency_wait_for_a_slot(fake_ollama):
+    with OllamaClient(base_url=base_url(fake_ollama), max_concurrency=3) as client:
+        threads = [threading.Thread(target=client.generate, args=(f"q{i}",)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert fake_ollama.max_active == 3